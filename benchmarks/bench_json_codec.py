@@ -0,0 +1,107 @@
+"""Compare the JSON codecs and the storage of large documents of `snap_saas_base.json_codec`.
+
+Builds chat ``history`` documents of about ``--size`` KB, made of turns with a role, text content
+and metadata, then measures encoding and decoding with each codec, and the size and round trip
+time of the documents through a ``JSON`` column and a `CompressedJSON` column on an in-memory
+SQLite database unless ``--url`` points to another database.
+
+    python benchmarks/bench_json_codec.py --size 100 --docs 200
+"""
+
+import argparse
+import random
+import string
+import time
+from collections.abc import Callable
+from functools import partial
+from typing import Any
+
+import sqlalchemy as sa
+
+from snap_saas_base.db.engine import create_engine
+from snap_saas_base.json_codec import get_codec
+from snap_saas_base.models.types import CompressedJSON
+
+
+def history(size: int, seed: int) -> dict[str, Any]:
+    """Return a chat history document of about ``size`` KB."""
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(400)]
+    turns: list[dict[str, Any]] = []
+    length = 0
+    while length < size * 1024:
+        content = " ".join(rng.choices(words, k=rng.randint(5, 60)))
+        turns.append(
+            {
+                "role": rng.choice(["user", "assistant"]),
+                "content": content,
+                "metadata": {
+                    "tokens": rng.randint(5, 400),
+                    "latency_ms": round(rng.uniform(50, 2000), 2),
+                    "intent": rng.choice(words),
+                    "scores": [round(rng.random(), 4) for _ in range(4)],
+                },
+            }
+        )
+        length += len(content) + 120
+    return {"turns": turns, "summary": " ".join(rng.choices(words, k=50))}
+
+
+def read_all(connection: sa.Connection, table: sa.Table) -> list[sa.Row[Any]]:
+    """Read and decode every row of a table."""
+    return list(connection.execute(sa.select(table)))
+
+
+def rate(func: Callable[[], Any], count: int) -> float:
+    """Run ``func`` once and return the documents it handled per second."""
+    start = time.perf_counter()
+    func()
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """Run the benchmark of every codec and column type."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="sqlite://")
+    parser.add_argument("--size", type=int, default=100, help="document size in KB")
+    parser.add_argument("--docs", type=int, default=200)
+    args = parser.parse_args()
+
+    docs = [history(args.size, seed) for seed in range(args.docs)]
+    encoded = get_codec("stdlib").dumps(docs[0])
+    print(f"document: {len(encoded.encode()) / 1024:.0f} KB, {len(docs[0]['turns'])} turns")
+
+    for name in ("stdlib", "orjson"):
+        codec = get_codec(name)
+        strings = [codec.dumps(doc) for doc in docs]
+        dumps = rate(partial(list, map(codec.dumps, docs)), len(docs))
+        loads = rate(partial(list, map(codec.loads, strings)), len(docs))
+        print(f"{name:>7}: dumps {dumps:8.0f} docs/s, loads {loads:8.0f} docs/s")
+
+    for name in ("stdlib", "orjson"):
+        for column_type in (sa.JSON(), CompressedJSON()):
+            engine = create_engine(args.url, json_codec=name)
+            metadata = sa.MetaData()
+            table = sa.Table(
+                "bench_documents",
+                metadata,
+                sa.Column("id", sa.Integer, primary_key=True),
+                sa.Column("body", column_type),
+            )
+            metadata.create_all(engine)
+            rows = [{"id": i, "body": doc} for i, doc in enumerate(docs)]
+            with engine.begin() as connection:
+                writes = rate(partial(connection.execute, table.insert(), rows), len(docs))
+                size = connection.scalar(sa.select(sa.func.sum(sa.func.length(table.c.body))))
+            with engine.connect() as connection:
+                reads = rate(partial(read_all, connection, table), len(docs))
+            metadata.drop_all(engine)
+            engine.dispose()
+            print(
+                f"{name:>7} {type(column_type).__name__:>14}: {writes:8.0f} writes/s "
+                f"{reads:8.0f} reads/s {size / len(docs) / 1024:6.1f} KB/doc"
+            )
+
+
+if __name__ == "__main__":
+    main()
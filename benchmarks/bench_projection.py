@@ -0,0 +1,138 @@
+"""Compare loading model instances with loading `snap_saas_base.db.projection` rows.
+
+Seeds ``--rows`` `Chat` and `WorkspaceMetric` rows, then reads them all back as ORM instances
+and as projections, and prints the load time and the memory held by the loaded rows. Runs on an
+in-memory SQLite database unless ``--url`` points to another database.
+
+    python benchmarks/bench_projection.py --rows 100000
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+import uuid6
+
+from snap_saas_base.db.projection import load_projection, projection_query
+from snap_saas_base.models.base_model import AbstractModel
+from snap_saas_base.models.chat import Chat
+from snap_saas_base.models.organization import Organization
+from snap_saas_base.models.user import User
+from snap_saas_base.models.workspace import Workspace, WorkspaceMetric
+
+
+def seed(engine: sa.Engine, rows: int) -> None:
+    """Insert ``rows`` chats and metrics in a new workspace."""
+    with so.Session(engine) as session:
+        user = User(username="bench", email="bench@domain.com", cell_phone="1", full_name="B")
+        org = Organization(name="Org", slug="org", bucket="b", created_by=user.id)
+        workspace = Workspace(name="Bench", slug="bench", org_id=org.id)
+        session.add_all([user, org, workspace])
+        session.flush()
+        now = datetime.now(UTC).replace(tzinfo=None)
+        for offset in range(0, rows, 10000):
+            batch = range(offset, min(offset + 10000, rows))
+            session.execute(
+                sa.insert(AbstractModel.metadata.tables[Chat.__tablename__]),
+                [
+                    {
+                        "id": str(uuid6.uuid7()),
+                        "workspace_id": workspace.id,
+                        "channel": "whatsapp",
+                        "channel_plugin": "twilio",
+                        "channel_id": "c1",
+                        "channel_session_id": f"s{i}",
+                        "channel_contact_uid": f"+55{i}",
+                        "subject": {"name": "John Doe"},
+                        "agi_id": "agi",
+                        "status": 1,
+                        "state": {},
+                        "contact_id": "contact",
+                        "handsoff_data": {},
+                        "slots": {},
+                        "session_metadata": {},
+                        "history": {},
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    for i in batch
+                ],
+            )
+            session.execute(
+                sa.insert(AbstractModel.metadata.tables[WorkspaceMetric.__tablename__]),
+                [
+                    {
+                        "id": str(uuid6.uuid7()),
+                        "workspace_id": workspace.id,
+                        "specversion": "1.0",
+                        "type": "tokens",
+                        "event_id": f"e{i}",
+                        "time": now + timedelta(seconds=i),
+                        "source": "bench",
+                        "subject": "chat",
+                        "data": {"value": i},
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    for i in batch
+                ],
+            )
+        session.commit()
+
+
+def measure(engine: sa.Engine, load: Callable[[so.Session], list[Any]]) -> tuple[float, float]:
+    """Return the load time of the rows and the memory held per loaded row."""
+    with so.Session(engine) as session:
+        start = time.perf_counter()
+        rows = load(session)
+        elapsed = time.perf_counter() - start
+    del rows
+    gc.collect()
+    tracemalloc.start()
+    with so.Session(engine) as session:
+        rows = load(session)
+        size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, size / len(rows)
+
+
+def main() -> None:
+    """Run the benchmark of every model."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="sqlite://")
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.url)
+    tables = [
+        AbstractModel.metadata.tables[model.__tablename__]
+        for model in (User, Organization, Workspace, Chat, WorkspaceMetric)
+    ]
+    AbstractModel.metadata.create_all(engine, tables=tables)
+    seed(engine, args.rows)
+
+    for model in (Chat, WorkspaceMetric):
+        for name, load in (
+            ("orm", lambda session, model=model: session.scalars(sa.select(model)).all()),
+            (
+                "projection",
+                lambda session, model=model: load_projection(session, projection_query(model)),
+            ),
+        ):
+            elapsed, size = measure(engine, load)
+            print(
+                f"{model.__name__:>15} {name:>10}: "
+                f"{args.rows / elapsed:10.0f} rows/s {size:8.0f} bytes/row"
+            )
+
+    AbstractModel.metadata.drop_all(engine, tables=tables)
+
+
+if __name__ == "__main__":
+    main()
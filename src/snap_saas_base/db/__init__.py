@@ -0,0 +1 @@
+"""Snap SAAS Base database helpers package."""
@@ -0,0 +1,213 @@
+"""Cold storage for old chat messages.
+
+Most messages older than a few months are never read again, yet they fill ``chats_messages``
+and its indexes. `archive_messages` and `archive_chat` move them into `ChatMessageArchive`
+segments: consecutive messages of a chat serialized as newline-delimited JSON and compressed
+with zstd, or zlib when ``zstandard`` is not installed. The segment rows without their deferred
+payload are the manifest of the archive.
+
+`list_chat_messages` reads the history of a chat from both tiers, so callers don't need to know
+which messages were archived. Archived messages are returned as read-only `ChatMessage` objects
+that are not attached to the session.
+"""
+
+from collections.abc import Sequence
+from datetime import datetime
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from snap_saas_base.db.timerange import uuid7_min
+from snap_saas_base.json_codec import compress, decompress
+from snap_saas_base.models.chat import ChatMessage, ChatMessageArchive
+from snap_saas_base.schemas.chat import ChatMessageSchema
+from snap_saas_base.schemas.common import row_to_json
+
+
+def archive_chat(
+    session: so.Session, chat_id: str, before: datetime | None = None, segment_size: int = 500
+) -> int:
+    """Move the messages of a chat into archive segments.
+
+    The caller commits, which makes the move atomic.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session.
+    chat_id : str
+        The chat, e.g. a closed one.
+    before : datetime, optional
+        Only archive the messages created before this time, based on their UUIDv7 ids.
+        Archives every message if None.
+    segment_size : int, optional
+        Maximum number of messages per segment.
+
+    Returns
+    -------
+    int
+        The number of archived messages.
+    """
+    criteria = [ChatMessage.chat_id == chat_id]
+    if before is not None:
+        criteria.append(ChatMessage.id < uuid7_min(before))
+    archived = 0
+    while True:
+        messages = session.scalars(
+            sa.select(ChatMessage).where(*criteria).order_by(ChatMessage.id).limit(segment_size)
+        ).all()
+        if not messages:
+            return archived
+        session.add(_segment(chat_id, messages))
+        session.execute(
+            sa.delete(ChatMessage).where(ChatMessage.id.in_([m.id for m in messages])),
+            execution_options={"synchronize_session": False},
+        )
+        for message in messages:
+            session.expunge(message)
+        session.flush()
+        archived += len(messages)
+
+
+async def aarchive_chat(
+    session: AsyncSession,
+    chat_id: str,
+    before: datetime | None = None,
+    segment_size: int = 500,
+) -> int:
+    """Move the messages of a chat into archive segments on an async session.
+
+    See `archive_chat`.
+    """
+    return await session.run_sync(archive_chat, chat_id, before, segment_size)
+
+
+def archive_messages(
+    session: so.Session, before: datetime, chats: int = 100, segment_size: int = 500
+) -> int:
+    """Archive every message created before a time, committing after each chat.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session.
+    before : datetime
+        Archive the messages created before this time.
+    chats : int, optional
+        Number of chats to look up at a time.
+    segment_size : int, optional
+        Maximum number of messages per segment.
+
+    Returns
+    -------
+    int
+        The number of archived messages.
+    """
+    archived = 0
+    while True:
+        chat_ids = session.scalars(
+            sa.select(ChatMessage.chat_id)
+            .where(ChatMessage.id < uuid7_min(before))
+            .distinct()
+            .limit(chats)
+        ).all()
+        if not chat_ids:
+            return archived
+        for chat_id in chat_ids:
+            archived += archive_chat(session, chat_id, before, segment_size)
+            session.commit()
+
+
+def list_chat_messages(
+    session: so.Session, chat_id: str, limit: int | None = None, before_id: str | None = None
+) -> list[ChatMessage]:
+    """Return the messages of a chat from the hot table and the archive, oldest first.
+
+    Archive segments are only decompressed when the hot messages don't fill the page.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session.
+    chat_id : str
+        The chat.
+    limit : int, optional
+        Return the newest ``limit`` messages. Returns the whole history if None.
+    before_id : str, optional
+        Only return messages older than this message id, to page back through the history.
+
+    Returns
+    -------
+    list[ChatMessage]
+        The messages. Archived messages are detached, read-only copies.
+    """
+    stmt = sa.select(ChatMessage).where(ChatMessage.chat_id == chat_id)
+    if before_id is not None:
+        stmt = stmt.where(ChatMessage.id < before_id)
+    messages = list(session.scalars(stmt.order_by(ChatMessage.id.desc()).limit(limit)))
+    if limit is None or len(messages) < limit:
+        # The payloads are loaded with the segments, not by one query per segment.
+        segments = (
+            sa.select(ChatMessageArchive)
+            .where(ChatMessageArchive.chat_id == chat_id)
+            .options(so.undefer(ChatMessageArchive.payload))
+        )
+        if before_id is not None:
+            segments = segments.where(ChatMessageArchive.first_message_id < before_id)
+        archived: list[ChatMessage] = []
+        for segment in session.scalars(
+            segments.order_by(ChatMessageArchive.last_message_id.desc())
+        ):
+            archived.extend(
+                message
+                for message in reversed(read_segment(segment))
+                if before_id is None or message.id < before_id
+            )
+            if limit is not None and len(messages) + len(archived) >= limit:
+                break
+        messages.extend(sorted(archived, key=lambda message: message.id, reverse=True))
+    return messages[:limit][::-1]
+
+
+async def alist_chat_messages(
+    session: AsyncSession, chat_id: str, limit: int | None = None, before_id: str | None = None
+) -> list[ChatMessage]:
+    """Return the messages of a chat from both tiers on an async session.
+
+    See `list_chat_messages`.
+    """
+    return await session.run_sync(list_chat_messages, chat_id, limit, before_id)
+
+
+def read_segment(segment: ChatMessageArchive) -> list[ChatMessage]:
+    """Return the messages of an archive segment, oldest first.
+
+    Parameters
+    ----------
+    segment : ChatMessageArchive
+        The segment.
+
+    Returns
+    -------
+    list[ChatMessage]
+        Detached, read-only messages.
+    """
+    lines = decompress(segment.codec, segment.payload).splitlines()
+    return [
+        ChatMessage(**ChatMessageSchema.model_validate_json(line).model_dump()) for line in lines
+    ]
+
+
+def _segment(chat_id: str, messages: Sequence[ChatMessage]) -> ChatMessageArchive:
+    data = b"\n".join(row_to_json(ChatMessageSchema, message) for message in messages)
+    codec, payload = compress(data)
+    return ChatMessageArchive(
+        chat_id=chat_id,
+        first_message_id=messages[0].id,
+        last_message_id=messages[-1].id,
+        message_count=len(messages),
+        codec=codec,
+        size=len(data),
+        payload=payload,
+    )
@@ -0,0 +1,238 @@
+"""Coalesced chat writes for async gateways.
+
+Gateways append a `ChatMessage` and touch the `Chat` row for every inbound and outbound
+message. Written one by one, each costs a transaction. `ChatWriteCoalescer` queues the writes of
+every coroutine and, once per tick, writes them in a single transaction: one multi-row insert of
+the messages plus one update per touched chat.
+
+Writes are applied in submission order, so the messages and updates of a chat keep their order.
+When a tick's transaction fails, its writes are retried chat by chat, and only the waiters of the
+failing chat get the error. If the background task itself stops, every waiting write fails.
+"""
+
+import asyncio
+from collections.abc import Callable
+from datetime import UTC, datetime
+from typing import Any, NamedTuple, cast
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+import uuid6
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from snap_saas_base.models.chat import (
+    Chat,
+    ChatMessage,
+    chat_activity_values,
+    message_activity,
+)
+
+
+class _Write(NamedTuple):
+    chat_id: str
+    message: dict[str, Any] | None
+    values: dict[str, Any]
+    future: asyncio.Future
+
+
+class ChatWriteCoalescer:
+    """Groups concurrent chat writes into one transaction per tick.
+
+    Parameters
+    ----------
+    session_factory : Callable[[], AsyncSession]
+        Returns a new session for each transaction, e.g. an ``async_sessionmaker``.
+    interval : float, optional
+        Seconds to wait for more writes after the first write of a tick.
+    max_batch : int, optional
+        Maximum number of writes per transaction.
+
+    Attributes
+    ----------
+    transactions : int
+        Number of committed transactions.
+    writes : int
+        Number of committed writes.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        interval: float = 0.005,
+        max_batch: int = 500,
+    ):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.max_batch = max_batch
+        self.transactions = 0
+        self.writes = 0
+        self._queue: list[_Write] = []
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: asyncio.Task | None = None
+
+    async def __aenter__(self) -> "ChatWriteCoalescer":
+        """Return the coalescer."""
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        """Close the coalescer."""
+        await self.close()
+
+    async def add_message(
+        self,
+        chat_id: str,
+        role: str,
+        content_type: str,
+        content: str,
+        message_metadata: dict[str, Any] | None = None,
+        **values: Any,
+    ) -> str:
+        """Append a message to a chat and update the chat's message activity.
+
+        Parameters
+        ----------
+        chat_id : str
+            The chat.
+        role : str
+            The message role.
+        content_type : str
+            The content MIME type.
+        content : str
+            The message content.
+        message_metadata : dict, optional
+            The message metadata.
+        **values
+            Other `ChatMessage` column values.
+
+        Returns
+        -------
+        str
+            The message id, once the message is committed.
+        """
+        now = datetime.now(UTC).replace(tzinfo=None)
+        message = {
+            "id": str(uuid6.uuid7()),
+            "chat_id": chat_id,
+            "role": role,
+            "content_type": content_type,
+            "content": content,
+            "message_metadata": message_metadata or {},
+            "created_at": now,
+            "updated_at": now,
+            **values,
+        }
+        await self._submit(chat_id, message, {})
+        return message["id"]
+
+    async def update_chat(self, chat_id: str, **values: Any) -> None:
+        """Update a chat, e.g. its ``status``, and return once the update is committed.
+
+        Updates of the same chat in a tick are merged, later values winning, into one statement
+        that also sets ``updated_at``. Like every update of a chat, it bumps ``version_id``, once
+        per tick whatever the number of merged writes.
+
+        Parameters
+        ----------
+        chat_id : str
+            The chat.
+        **values
+            `Chat` column values.
+        """
+        await self._submit(chat_id, None, values)
+
+    async def close(self) -> None:
+        """Write the queued writes and stop the background task."""
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def _submit(
+        self, chat_id: str, message: dict[str, Any] | None, values: dict[str, Any]
+    ) -> None:
+        if self._closing:
+            raise RuntimeError("the coalescer is closed")
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        write = _Write(chat_id, message, values, loop.create_future())
+        self._queue.append(write)
+        self._wakeup.set()
+        await write.future
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                await self._wakeup.wait()
+                if self.interval and not self._closing:
+                    await asyncio.sleep(self.interval)
+                self._wakeup.clear()
+                while self._queue:
+                    # The batch stays queued until written, so a dying task still fails it.
+                    batch = self._queue[: self.max_batch]
+                    await self._write(batch)
+                    del self._queue[: len(batch)]
+                if self._closing:
+                    return
+        finally:
+            writes, self._queue = self._queue, []
+            _fail(writes, RuntimeError("the coalescer stopped before the write was committed"))
+
+    async def _write(self, batch: list[_Write]) -> None:
+        try:
+            await self._commit(batch)
+        except Exception as e:
+            chats: dict[str, list[_Write]] = {}
+            for write in batch:
+                chats.setdefault(write.chat_id, []).append(write)
+            if len(chats) == 1:
+                _fail(batch, e)
+                return
+            for writes in chats.values():
+                try:
+                    await self._commit(writes)
+                except Exception as e:
+                    _fail(writes, e)
+
+    async def _commit(self, writes: list[_Write]) -> None:
+        # Messages with different optional columns can't share an executemany.
+        messages: dict[tuple[str, ...], list[dict[str, Any]]] = {}
+        updates: dict[str, dict[str, Any]] = {}
+        for write in writes:
+            if write.message is not None:
+                messages.setdefault(tuple(write.message), []).append(write.message)
+            updates.setdefault(write.chat_id, {}).update(write.values)
+        activity = message_activity(write.message for write in writes if write.message)
+        for chat_id, (count, last_id, last_at) in activity.items():
+            updates[chat_id].update(chat_activity_values(count, last_id, last_at))
+        now = datetime.now(UTC).replace(tzinfo=None)
+        chats = cast(sa.Table, Chat.__table__)
+        async with self.session_factory() as session:
+            try:
+                for rows in messages.values():
+                    await session.execute(sa.insert(cast(sa.Table, ChatMessage.__table__)), rows)
+                for chat_id, values in updates.items():
+                    result = await session.execute(
+                        sa.update(chats)
+                        .where(chats.c.id == chat_id)
+                        .values(**values, updated_at=now)
+                    )
+                    if cast(sa.CursorResult[Any], result).rowcount != 1:
+                        raise so.exc.NoResultFound(f"chat {chat_id} does not exist")
+                await session.commit()
+            except BaseException:
+                await session.rollback()
+                raise
+        self.transactions += 1
+        self.writes += len(writes)
+        for write in writes:
+            if not write.future.done():
+                write.future.set_result(None)
+
+
+def _fail(writes: list[_Write], error: Exception) -> None:
+    for write in writes:
+        if not write.future.done():
+            write.future.set_exception(error)
@@ -0,0 +1,297 @@
+"""Optimistic concurrency control for versioned models.
+
+Versioned rows can be updated without holding a row lock: the update only applies if the row
+still has the version that was read, and bumps it. Losing writers get a `VersionConflictError`
+and retry against the fresh row, see `retry_on_conflict`.
+
+A model is versioned by a version column whose ``info`` has ``"version": True``, such as
+``Chat.version_id``, which every update of a chat bumps, or by a ``version_id_col`` mapper
+argument. `compare_and_swap` checks the version explicitly. ORM flushes only check it in
+sessions that opt in with `set_optimistic_locking` or
+``sessionmaker(info={"optimistic_locking": True})``, so other sessions keep their last writer
+wins updates.
+"""
+
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from functools import cache
+from typing import Any, TypeVar, cast
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar("T")
+
+OPTIMISTIC_LOCKING_KEY = "optimistic_locking"
+
+_LOADED_VERSION_KEY = "loaded_version"
+
+
+class VersionConflictError(so.exc.StaleDataError):
+    """Raised when a versioned row was changed by someone else since it was read.
+
+    Attributes
+    ----------
+    model : type, optional
+        The model of the row, when known.
+    row_id : str, optional
+        The row id, when known.
+    expected_version : int, optional
+        The version the update expected to find, when known.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        model: type | None = None,
+        row_id: str | None = None,
+        expected_version: int | None = None,
+    ):
+        super().__init__(message)
+        self.model = model
+        self.row_id = row_id
+        self.expected_version = expected_version
+
+
+def version_column(model: type) -> sa.Column:
+    """Return the version column of a versioned model.
+
+    Parameters
+    ----------
+    model : type
+        A model with a version column, or declaring ``version_id_col`` in its mapper arguments.
+
+    Returns
+    -------
+    sa.Column
+        The version column.
+    """
+    column = _version_column(model)
+    if column is None:
+        raise TypeError(f"{model.__name__} is not a versioned model")
+    return column
+
+
+def set_optimistic_locking(session: so.Session | AsyncSession, enabled: bool = True) -> None:
+    """Enable or disable the version checks of the ORM flushes of a session.
+
+    When enabled, flushing changes to a versioned row first checks that the row is still at
+    the version that was loaded, and raises a `VersionConflictError` otherwise. The check is a
+    separate ``UPDATE`` that locks the row until the transaction ends.
+
+    Parameters
+    ----------
+    session : so.Session | AsyncSession
+        The session.
+    enabled : bool, optional
+        Whether the flushes check the versions.
+    """
+    session.info[OPTIMISTIC_LOCKING_KEY] = enabled
+
+
+def compare_and_swap(
+    session: so.Session, model: type, row_id: str, expected_version: int, **values: Any
+) -> int:
+    """Update a row only if it is still at the expected version.
+
+    The update and the version check are a single statement, so no row lock is held between
+    reading the row and writing it. Loaded instances of the row in the session are refreshed
+    with the new values.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session used to run the update. The caller commits.
+    model : type
+        A versioned model, e.g. `Chat`.
+    row_id : str
+        The id of the row to update.
+    expected_version : int
+        The version the row had when it was read.
+    **values
+        The attributes to update, e.g. ``status=2``.
+
+    Returns
+    -------
+    int
+        The new version of the row.
+    """
+    result = cast(
+        sa.CursorResult[Any], session.execute(_swap(model, row_id, expected_version, values))
+    )
+    if result.rowcount != 1:
+        raise _conflict(model, row_id, expected_version)
+    return expected_version + 1
+
+
+async def acompare_and_swap(
+    session: AsyncSession, model: type, row_id: str, expected_version: int, **values: Any
+) -> int:
+    """Update a row only if it is still at the expected version, on an async session.
+
+    See `compare_and_swap`.
+    """
+    result = cast(
+        sa.CursorResult[Any], await session.execute(_swap(model, row_id, expected_version, values))
+    )
+    if result.rowcount != 1:
+        raise _conflict(model, row_id, expected_version)
+    return expected_version + 1
+
+
+def retry_on_conflict(
+    session: so.Session,
+    operation: Callable[[so.Session], T],
+    attempts: int = 3,
+    backoff: float = 0.01,
+) -> T:
+    """Run and commit an operation, retrying it when it loses a version conflict.
+
+    The operation must read the rows it updates, so each attempt works on fresh data. The
+    session is rolled back between attempts, which expires every loaded instance.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session passed to the operation.
+    operation : Callable[[so.Session], T]
+        The read, modify and write operation.
+    attempts : int, optional
+        Maximum number of attempts.
+    backoff : float, optional
+        Base delay, in seconds, of the jittered exponential backoff between attempts.
+
+    Returns
+    -------
+    T
+        The value returned by the successful attempt.
+    """
+    for attempt in range(attempts):
+        try:
+            result = operation(session)
+            session.commit()
+            return result
+        except so.exc.StaleDataError as error:
+            session.rollback()
+            if attempt + 1 == attempts:
+                if isinstance(error, VersionConflictError):
+                    raise
+                raise VersionConflictError(str(error)) from error
+            time.sleep(_delay(backoff, attempt))
+    raise ValueError("attempts must be positive")
+
+
+async def aretry_on_conflict(
+    session: AsyncSession,
+    operation: Callable[[AsyncSession], Awaitable[T]],
+    attempts: int = 3,
+    backoff: float = 0.01,
+) -> T:
+    """Run and commit an async operation, retrying it when it loses a version conflict.
+
+    See `retry_on_conflict`.
+    """
+    for attempt in range(attempts):
+        try:
+            result = await operation(session)
+            await session.commit()
+            return result
+        except so.exc.StaleDataError as error:
+            await session.rollback()
+            if attempt + 1 == attempts:
+                if isinstance(error, VersionConflictError):
+                    raise
+                raise VersionConflictError(str(error)) from error
+            await asyncio.sleep(_delay(backoff, attempt))
+    raise ValueError("attempts must be positive")
+
+
+@cache
+def _version_column(model: type) -> sa.Column | None:
+    mapper: so.Mapper[Any] | None = sa.inspect(model, raiseerr=False)
+    if mapper is None:
+        return None
+    if mapper.version_id_col is not None:
+        return cast(sa.Column, mapper.version_id_col)
+    return next((column for column in mapper.columns if column.info.get("version")), None)
+
+
+def _loaded_version(state: so.InstanceState[Any], column: sa.Column) -> Any:
+    # The version the session last saw, never a fresh one reloaded from the row.
+    version = state.attrs[column.key].loaded_value
+    if version is so.LoaderCallableStatus.NO_VALUE:
+        version = state.info.get(_LOADED_VERSION_KEY, version)
+    return version
+
+
+def _record_version(state: so.InstanceState[Any], *args: Any) -> None:
+    model: type = state.class_
+    column = _version_column(model)
+    if column is not None and column.key in state.dict:
+        state.info[_LOADED_VERSION_KEY] = state.dict[column.key]
+
+
+# Expired versions, e.g. after a commit, are checked against the last loaded one.
+for _event in ("load", "refresh", "refresh_flush"):
+    sa.event.listen(so.Mapper, _event, _record_version, raw=True)
+
+
+@sa.event.listens_for(so.Session, "after_commit")
+def _record_committed_versions(session: so.Session) -> None:
+    if session.info.get(OPTIMISTIC_LOCKING_KEY):
+        for state in session.identity_map.all_states():
+            _record_version(state)
+
+
+@sa.event.listens_for(so.Session, "before_flush")
+def _check_versions(session: so.Session, flush_context: Any, instances: Any) -> None:
+    if not session.info.get(OPTIMISTIC_LOCKING_KEY):
+        return
+    for obj in session.dirty:
+        state = sa.inspect(obj)
+        column = _version_column(state.class_)
+        # Mapper versioned models are already checked by the flush itself.
+        if column is None or column is state.mapper.version_id_col:
+            continue
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        row_id = state.identity[0]
+        expected_version = _loaded_version(state, column)
+        if expected_version is so.LoaderCallableStatus.NO_VALUE:
+            raise sa.exc.InvalidRequestError(
+                f"{state.class_.__name__} {row_id} is changed without a loaded version"
+            )
+        # Lock the row at the loaded version, the flush then bumps it.
+        stmt = (
+            sa.update(column.table)
+            .where(state.mapper.primary_key[0] == row_id, column == expected_version)
+            .values({column.key: column})
+        )
+        if cast(sa.CursorResult[Any], session.execute(stmt)).rowcount != 1:
+            raise _conflict(state.class_, row_id, expected_version)
+
+
+def _swap(model: type, row_id: str, expected_version: int, values: dict[str, Any]) -> sa.Update:
+    version = version_column(model)
+    return (
+        sa.update(model)
+        .where(sa.inspect(model).primary_key[0] == row_id, version == expected_version)
+        .values(values)
+        .values({version.key: version + 1})
+    )
+
+
+def _conflict(model: type, row_id: str, expected_version: int) -> VersionConflictError:
+    return VersionConflictError(
+        f"{model.__name__} {row_id} is no longer at version {expected_version}",
+        model,
+        row_id,
+        expected_version,
+    )
+
+
+def _delay(backoff: float, attempt: int) -> float:
+    return backoff * 2**attempt * random.uniform(0.5, 1.5)
@@ -0,0 +1,373 @@
+"""Engine and session factories.
+
+`create_engine` and `create_async_engine` build engines with pool settings tuned for a usage
+profile (see `POOL_PROFILES`), ``pool_pre_ping`` enabled, pool checkout metrics, and an
+optional PgBouncer compatibility mode. The JSON columns use the fastest installed JSON codec,
+see `snap_saas_base.json_codec`. `make_sessionmaker` and `make_async_sessionmaker` add a
+per-session ``statement_timeout``. SQLite engines, used for tests and edge deployments, have
+foreign keys enabled so ``ON DELETE`` actions behave as on PostgreSQL.
+"""
+
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from typing import Any
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine as sa_create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from snap_saas_base.json_codec import JsonCodec, engine_json_options
+
+STATEMENT_TIMEOUT_KEY = "statement_timeout"
+
+# Pool settings per usage profile. Web processes serve many short requests and fail fast when
+# the pool is exhausted instead of queueing requests behind it; workers run fewer, longer
+# transactions; batch jobs hold few connections for a long time.
+POOL_PROFILES: dict[str, dict[str, Any]] = {
+    "web": {"pool_size": 10, "max_overflow": 10, "pool_timeout": 2.0, "pool_recycle": 1800},
+    "worker": {"pool_size": 5, "max_overflow": 5, "pool_timeout": 30.0, "pool_recycle": 1800},
+    "batch": {"pool_size": 2, "max_overflow": 2, "pool_timeout": 120.0, "pool_recycle": 3600},
+}
+
+
+class PoolMetrics:
+    """Connection pool metrics.
+
+    Attributes
+    ----------
+    checkouts : int
+        Number of connections checked out of the pool.
+    checkins : int
+        Number of connections returned to the pool.
+    connects : int
+        Number of new database connections.
+    invalidations : int
+        Number of invalidated connections.
+    timeouts : int
+        Number of checkouts that timed out waiting for a connection.
+    checked_out : int
+        Number of connections currently checked out.
+    wait_total : float
+        Total seconds spent waiting for a connection.
+    wait_max : float
+        Longest wait for a connection, in seconds.
+    on_wait : Callable[[float], None], optional
+        Called with the duration of each checkout, e.g. to feed a histogram.
+
+    Methods
+    -------
+    as_dict:
+        Returns the metrics as a dictionary.
+    """
+
+    def __init__(self, on_wait: Callable[[float], None] | None = None):
+        self.on_wait = on_wait
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.checked_out = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def as_dict(self) -> dict[str, Any]:
+        """Returns the metrics as a dictionary."""
+        return {
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "checked_out": self.checked_out,
+            "wait_total": self.wait_total,
+            "wait_max": self.wait_max,
+        }
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        """Record the time spent getting a connection from the pool."""
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+        if self.on_wait is not None:
+            self.on_wait(seconds)
+
+    def _checkout(self, *args: Any) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+
+    def _checkin(self, *args: Any) -> None:
+        with self._lock:
+            self.checkins += 1
+            self.checked_out -= 1
+
+    def _connect(self, *args: Any) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def _invalidate(self, *args: Any) -> None:
+        with self._lock:
+            self.invalidations += 1
+
+
+class _TimedPoolMixin:
+    metrics: PoolMetrics | None = None
+
+    def connect(self) -> Any:
+        start = time.perf_counter()
+        try:
+            connection = super().connect()  # type: ignore[misc]
+        except sa.exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        if self.metrics is not None:
+            self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self) -> Any:
+        pool = super().recreate()  # type: ignore[misc]
+        pool.metrics = self.metrics
+        return pool
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    """A ``QueuePool`` recording how long checkouts wait in its `PoolMetrics`."""
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    """An ``AsyncAdaptedQueuePool`` recording how long checkouts wait in its `PoolMetrics`."""
+
+
+def pgbouncer_connect_args(url: str | sa.URL) -> dict[str, Any]:
+    """Return driver arguments that are safe behind PgBouncer in transaction pooling mode.
+
+    Transaction pooling hands each transaction to any server connection, so named prepared
+    statements created on one connection are missing or clash on the next. The returned
+    arguments disable the statement caches of asyncpg and the automatic prepares of psycopg 3,
+    and give asyncpg statements unique names.
+
+    Parameters
+    ----------
+    url : str | sa.URL
+        The database URL.
+
+    Returns
+    -------
+    dict[str, Any]
+        The ``connect_args`` for the driver of the URL.
+    """
+    driver = sa.make_url(url).get_driver_name()
+    if driver == "asyncpg":
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    if driver in ("psycopg", "psycopg_async"):
+        return {"prepare_threshold": None}
+    return {}
+
+
+def create_engine(
+    url: str | sa.URL,
+    profile: str = "web",
+    pgbouncer: bool = False,
+    metrics: PoolMetrics | None = None,
+    json_codec: JsonCodec | str | None = None,
+    **kwargs: Any,
+) -> sa.Engine:
+    """Create an engine configured for a usage profile.
+
+    Parameters
+    ----------
+    url : str | sa.URL
+        The database URL.
+    profile : str, optional
+        A `POOL_PROFILES` key: ``"web"``, ``"worker"`` or ``"batch"``.
+    pgbouncer : bool, optional
+        Make the engine safe behind PgBouncer in transaction pooling mode.
+    metrics : PoolMetrics, optional
+        Collects the pool metrics.
+    json_codec : JsonCodec | str, optional
+        The codec of the JSON columns, or its name, ``"orjson"`` or ``"stdlib"``. Defaults to
+        orjson when it is installed.
+    **kwargs
+        Passed to ``sqlalchemy.create_engine``, overriding the profile settings.
+
+    Returns
+    -------
+    sa.Engine
+        The engine.
+    """
+    options = _engine_options(
+        url,
+        profile=profile,
+        pgbouncer=pgbouncer,
+        json_codec=json_codec,
+        poolclass=TimedQueuePool,
+        kwargs=kwargs,
+    )
+    engine = sa.create_engine(url, **options)
+    _install_sqlite_pragmas(engine)
+    _install_metrics(engine, metrics)
+    return engine
+
+
+def create_async_engine(
+    url: str | sa.URL,
+    profile: str = "web",
+    pgbouncer: bool = False,
+    metrics: PoolMetrics | None = None,
+    json_codec: JsonCodec | str | None = None,
+    **kwargs: Any,
+) -> AsyncEngine:
+    """Create an async engine configured for a usage profile.
+
+    See `create_engine`.
+    """
+    options = _engine_options(
+        url,
+        profile=profile,
+        pgbouncer=pgbouncer,
+        json_codec=json_codec,
+        poolclass=TimedAsyncAdaptedQueuePool,
+        kwargs=kwargs,
+    )
+    engine = sa_create_async_engine(url, **options)
+    _install_sqlite_pragmas(engine.sync_engine)
+    _install_metrics(engine.sync_engine, metrics)
+    return engine
+
+
+def make_sessionmaker(
+    engine: sa.Engine, statement_timeout: int | None = None, **kwargs: Any
+) -> so.sessionmaker:
+    """Return a session factory with a default statement timeout.
+
+    Parameters
+    ----------
+    engine : sa.Engine
+        The engine.
+    statement_timeout : int, optional
+        Default statement timeout of the sessions, in milliseconds.
+    **kwargs
+        Passed to ``sessionmaker``.
+
+    Returns
+    -------
+    so.sessionmaker
+        The session factory.
+    """
+    return so.sessionmaker(engine, info=_session_info(statement_timeout, kwargs), **kwargs)
+
+
+def make_async_sessionmaker(
+    engine: AsyncEngine, statement_timeout: int | None = None, **kwargs: Any
+) -> async_sessionmaker:
+    """Return an async session factory with a default statement timeout.
+
+    See `make_sessionmaker`.
+    """
+    kwargs.setdefault("expire_on_commit", False)
+    return async_sessionmaker(engine, info=_session_info(statement_timeout, kwargs), **kwargs)
+
+
+def set_statement_timeout(session: so.Session | AsyncSession, timeout: int | None) -> None:
+    """Set the statement timeout of a session.
+
+    The timeout is applied with ``SET LOCAL`` at the start of every transaction of the session,
+    which keeps it scoped to the transaction and therefore safe behind PgBouncer. A change
+    takes effect from the next transaction.
+
+    Parameters
+    ----------
+    session : so.Session | AsyncSession
+        The session.
+    timeout : int, optional
+        The timeout in milliseconds, or None for the server default.
+    """
+    session.info[STATEMENT_TIMEOUT_KEY] = timeout
+
+
+def _engine_options(  # noqa: PLR0913
+    url: str | sa.URL,
+    *,
+    profile: str,
+    pgbouncer: bool,
+    json_codec: JsonCodec | str | None,
+    poolclass: type,
+    kwargs: dict[str, Any],
+) -> dict[str, Any]:
+    if profile not in POOL_PROFILES:
+        raise ValueError(f"unknown pool profile {profile!r}, expected one of {list(POOL_PROFILES)}")
+    url = sa.make_url(url)
+    options: dict[str, Any] = {"pool_pre_ping": True, **engine_json_options(json_codec)}
+    if not _is_memory_sqlite(url):
+        options.update(POOL_PROFILES[profile], poolclass=poolclass)
+    connect_args = pgbouncer_connect_args(url) if pgbouncer else {}
+    connect_args.update(kwargs.pop("connect_args", {}))
+    if connect_args:
+        options["connect_args"] = connect_args
+    options.update(kwargs)
+    return options
+
+
+def _is_memory_sqlite(url: sa.URL) -> bool:
+    return url.get_backend_name() == "sqlite" and (
+        url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+    )
+
+
+def _install_sqlite_pragmas(engine: sa.Engine) -> None:
+    if engine.dialect.name == "sqlite":
+        sa.event.listen(engine, "connect", _sqlite_connect)
+        sa.event.listen(engine, "begin", _sqlite_begin)
+
+
+def _sqlite_connect(dbapi_connection: Any, connection_record: Any) -> None:
+    # Let SQLAlchemy emit BEGIN itself, the driver's own transaction handling breaks SAVEPOINT.
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _sqlite_begin(connection: sa.Connection) -> None:
+    connection.exec_driver_sql("BEGIN")
+
+
+def _install_metrics(engine: sa.Engine, metrics: PoolMetrics | None) -> None:
+    if metrics is None:
+        return
+    if isinstance(engine.pool, _TimedPoolMixin):
+        engine.pool.metrics = metrics
+    sa.event.listen(engine, "checkout", metrics._checkout)
+    sa.event.listen(engine, "checkin", metrics._checkin)
+    sa.event.listen(engine, "connect", metrics._connect)
+    sa.event.listen(engine, "invalidate", metrics._invalidate)
+
+
+def _session_info(statement_timeout: int | None, kwargs: dict[str, Any]) -> dict[str, Any]:
+    info = dict(kwargs.pop("info", None) or {})
+    if statement_timeout is not None:
+        info[STATEMENT_TIMEOUT_KEY] = statement_timeout
+    return info
+
+
+@sa.event.listens_for(so.Session, "after_begin")
+def _apply_statement_timeout(
+    session: so.Session, transaction: so.SessionTransaction, connection: sa.Connection
+) -> None:
+    timeout = session.info.get(STATEMENT_TIMEOUT_KEY)
+    if timeout is not None and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
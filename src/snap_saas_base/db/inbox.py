@@ -0,0 +1,254 @@
+"""Inbox listing of the chats of a workspace.
+
+The inbox shows the chats of a workspace with the most recent activity first, each with its
+message count and a preview of its last message. The activity is denormalized on `Chat`, see
+`snap_saas_base.models.chat.chat_activity`, so a page is a scan of the
+``(workspace_id, last_message_at, id)`` index plus a primary key lookup of each last message,
+without aggregating ``chats_messages``.
+
+Pages are fetched with keyset pagination: `InboxPage.next_cursor` is an opaque token that
+continues after the last chat of the page, which stays fast however deep the page. The order is
+only stable for the chats whose activity doesn't change while paging: a chat that receives a
+message moves to the top of the inbox, so it is skipped if it was not listed yet, and listed
+again by a new first page.
+
+Chats created before the activity columns were added start without activity, see
+`backfill_chat_activity`.
+"""
+
+import base64
+from collections.abc import Iterable, Sequence
+from datetime import datetime
+from typing import NamedTuple, cast
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from snap_saas_base.db.timerange import uuid7_time
+from snap_saas_base.models.chat import Chat, ChatMessage, ChatMessageArchive
+
+
+class InboxEntry(NamedTuple):
+    """A chat of the inbox with a preview of its last message."""
+
+    chat: Chat
+    preview: str | None
+
+
+class InboxCursor(NamedTuple):
+    """The position of a chat in the inbox, which a page continues after."""
+
+    last_message_at: datetime
+    chat_id: str
+
+
+class InboxPage(NamedTuple):
+    """A page of the inbox and the cursor of the next page, None on the last page."""
+
+    entries: list[InboxEntry]
+    next_cursor: str | None
+
+
+def encode_cursor(last_message_at: datetime, chat_id: str) -> str:
+    """Return the cursor continuing after a chat.
+
+    Parameters
+    ----------
+    last_message_at : datetime
+        The chat's last message time.
+    chat_id : str
+        The chat id.
+
+    Returns
+    -------
+    str
+        The opaque cursor.
+    """
+    token = f"{last_message_at.isoformat()}|{chat_id}".encode()
+    return base64.urlsafe_b64encode(token).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> InboxCursor:
+    """Return the last message time and id of the chat a cursor continues after.
+
+    Raises
+    ------
+    ValueError
+        If the cursor is malformed.
+    """
+    try:
+        token = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        last_message_at, chat_id = token.split("|", 1)
+        return InboxCursor(datetime.fromisoformat(last_message_at), chat_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid inbox cursor {cursor!r}") from e
+
+
+def inbox_query(
+    workspace_id: str,
+    limit: int = 50,
+    cursor: str | None = None,
+    statuses: Iterable[int] | None = None,
+    preview_length: int = 120,
+) -> sa.Select[tuple[Chat, str | None]]:
+    """Return the ``(Chat, preview)`` rows of an inbox page, most recent activity first.
+
+    Chats without messages are not listed.
+
+    Parameters
+    ----------
+    workspace_id : str
+        The workspace.
+    limit : int, optional
+        The page size.
+    cursor : str, optional
+        Continue after the chat of this cursor.
+    statuses : Iterable[int], optional
+        Only list chats with these statuses.
+    preview_length : int, optional
+        Maximum length of the last message previews.
+
+    Returns
+    -------
+    sa.Select[tuple[Chat, str | None]]
+        The query.
+    """
+    preview = sa.func.substr(ChatMessage.content, 1, preview_length).label("preview")
+    stmt = (
+        sa.select(Chat, preview)
+        .outerjoin(ChatMessage, ChatMessage.id == Chat.last_message_id)
+        .where(Chat.workspace_id == workspace_id, Chat.last_message_at.is_not(None))
+    )
+    if statuses is not None:
+        stmt = stmt.where(Chat.status.in_(list(statuses)))
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        stmt = stmt.where(
+            sa.tuple_(Chat.last_message_at, Chat.id)
+            < sa.tuple_(sa.literal(after.last_message_at), sa.literal(after.chat_id))
+        )
+    return stmt.order_by(Chat.last_message_at.desc(), Chat.id.desc()).limit(limit)
+
+
+def load_inbox(
+    session: so.Session,
+    workspace_id: str,
+    limit: int = 50,
+    cursor: str | None = None,
+    statuses: Iterable[int] | None = None,
+) -> InboxPage:
+    """Load an inbox page.
+
+    See `inbox_query`.
+
+    Returns
+    -------
+    InboxPage
+        The page.
+    """
+    rows = session.execute(inbox_query(workspace_id, limit, cursor, statuses)).all()
+    return _page(rows, limit)
+
+
+async def aload_inbox(
+    session: AsyncSession,
+    workspace_id: str,
+    limit: int = 50,
+    cursor: str | None = None,
+    statuses: Iterable[int] | None = None,
+) -> InboxPage:
+    """Load an inbox page on an async session.
+
+    See `inbox_query`.
+    """
+    result = await session.execute(inbox_query(workspace_id, limit, cursor, statuses))
+    return _page(result.all(), limit)
+
+
+def backfill_chat_activity(session: so.Session, batch_size: int = 1000) -> int:
+    """Recompute the message activity of every chat from its messages, committing each batch.
+
+    This is a one-off migration for chats created before the activity columns were added, or a
+    repair after messages were written without the activity hooks. Archived messages count, and
+    the creation time of an archived last message is read from its UUIDv7 id.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session.
+    batch_size : int, optional
+        Number of chats updated at a time.
+
+    Returns
+    -------
+    int
+        The number of updated chats.
+    """
+    table = cast(sa.Table, Chat.__table__)
+    update = (
+        sa.update(table)
+        .where(table.c.id == sa.bindparam("chat_id"))
+        .values(
+            message_count=sa.bindparam("count"),
+            last_message_id=sa.bindparam("last_id"),
+            last_message_at=sa.bindparam("last_at"),
+        )
+    )
+    updated, after = 0, ""
+    while True:
+        chat_ids = session.scalars(
+            sa.select(Chat.id).where(Chat.id > after).order_by(Chat.id).limit(batch_size)
+        ).all()
+        if not chat_ids:
+            return updated
+        activity = dict.fromkeys(chat_ids, (0, None))
+        hot = sa.select(ChatMessage.chat_id, sa.func.count(), sa.func.max(ChatMessage.id))
+        archived = sa.select(
+            ChatMessageArchive.chat_id,
+            sa.func.sum(ChatMessageArchive.message_count),
+            sa.func.max(ChatMessageArchive.last_message_id),
+        )
+        for stmt, model in ((hot, ChatMessage), (archived, ChatMessageArchive)):
+            rows = session.execute(stmt.where(model.chat_id.in_(chat_ids)).group_by(model.chat_id))
+            for chat_id, count, last_id in rows:
+                total, newest = activity[chat_id]
+                activity[chat_id] = (
+                    total + count,
+                    last_id if newest is None else max(newest, last_id),
+                )
+        last_ids = [last_id for _, last_id in activity.values() if last_id is not None]
+        created = dict(
+            session.execute(
+                sa.select(ChatMessage.id, ChatMessage.created_at).where(
+                    ChatMessage.id.in_(last_ids)
+                )
+            )
+            .tuples()
+            .all()
+        )
+        session.execute(
+            update,
+            [
+                {
+                    "chat_id": chat_id,
+                    "count": count,
+                    "last_id": last_id,
+                    "last_at": (
+                        None if last_id is None else created.get(last_id) or uuid7_time(last_id)
+                    ),
+                }
+                for chat_id, (count, last_id) in activity.items()
+            ],
+        )
+        session.commit()
+        updated += len(chat_ids)
+        after = chat_ids[-1]
+
+
+def _page(rows: Sequence[sa.Row[tuple[Chat, str | None]]], limit: int) -> InboxPage:
+    entries = [InboxEntry(chat, preview) for chat, preview in rows]
+    if len(entries) < limit:
+        return InboxPage(entries, None)
+    last = entries[-1].chat
+    return InboxPage(entries, encode_cursor(last.last_message_at, last.id))
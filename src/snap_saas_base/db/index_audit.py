@@ -0,0 +1,218 @@
+"""Audit of the indexes declared on the models.
+
+`audit_indexes` inspects the tables of `AbstractModel.metadata` and reports:
+
+- ``duplicate``: a non-unique index on the same columns as another index, unique constraint or
+  primary key, which already serves every lookup the index serves.
+- ``prefix``: a non-unique index whose columns are the leading columns of another index or
+  constraint, which serves the same lookups.
+- ``unindexed_fk``: a foreign key whose columns are not the leading columns of any index or
+  constraint. Deleting or updating a referenced row, including the cascades of the purge, then
+  scans the whole referencing table.
+
+Unique indexes and constraints are never reported since they enforce an invariant, and partial,
+expression and non-btree indexes are left out of the comparisons. `suggested_ddl` turns the
+findings into ``DROP INDEX`` and ``CREATE INDEX`` statements, by default ``CONCURRENTLY`` so they
+can be applied online. PostgreSQL doesn't allow ``CONCURRENTLY`` in a transaction block, so the
+script must run in autocommit mode, e.g. with ``psql``.
+
+    python -m snap_saas_base.db.index_audit
+    python -m snap_saas_base.db.index_audit --sql > indexes.sql
+"""
+
+import argparse
+import sys
+from collections.abc import Iterable, Sequence
+from typing import NamedTuple
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+import snap_saas_base.models.chat
+import snap_saas_base.models.organization  # noqa: F401
+from snap_saas_base.models.base_model import AbstractModel
+
+
+class IndexFinding(NamedTuple):
+    """A redundant or missing index.
+
+    Attributes
+    ----------
+    kind : str
+        ``duplicate``, ``prefix`` or ``unindexed_fk``.
+    table : str
+        The table.
+    name : str
+        The redundant index, or the suggested name of the missing one.
+    columns : tuple[str, ...]
+        The columns of the index.
+    covered_by : str | None
+        The index or constraint that makes the index redundant, None for missing indexes.
+    """
+
+    kind: str
+    table: str
+    name: str
+    columns: tuple[str, ...]
+    covered_by: str | None
+
+    def __str__(self) -> str:
+        """Describe the finding on one line."""
+        columns = ", ".join(self.columns)
+        if self.kind == "unindexed_fk":
+            return f"{self.table}: foreign key ({columns}) is not indexed, add {self.name}"
+        relation = "duplicates" if self.kind == "duplicate" else "is a prefix of"
+        return f"{self.table}: {self.name} ({columns}) {relation} {self.covered_by}"
+
+
+class _Structure(NamedTuple):
+    name: str
+    columns: tuple[str, ...]
+    droppable: bool
+
+
+def audit_indexes(metadata: sa.MetaData = AbstractModel.metadata) -> list[IndexFinding]:
+    """Return the redundant and missing indexes of the tables of a metadata.
+
+    Parameters
+    ----------
+    metadata : sa.MetaData, optional
+        The metadata, the models' one by default.
+
+    Returns
+    -------
+    list[IndexFinding]
+        The findings, by table.
+    """
+    findings: list[IndexFinding] = []
+    for table in metadata.sorted_tables:
+        structures = _structures(table)
+        dropped: set[str] = set()
+        for structure in structures:
+            if not structure.droppable:
+                continue
+            finding = _covering(table, structure, structures, dropped)
+            if finding is not None:
+                dropped.add(structure.name)
+                findings.append(finding)
+        for fk in sorted(table.foreign_key_constraints, key=_name):
+            columns = tuple(column.name for column in fk.columns)
+            if not any(
+                set(structure.columns[: len(columns)]) == set(columns)
+                for structure in structures
+                if structure.name not in dropped
+            ):
+                findings.append(
+                    IndexFinding(
+                        "unindexed_fk", table.name, _index_name(table, columns), columns, None
+                    )
+                )
+    return findings
+
+
+def suggested_ddl(findings: Iterable[IndexFinding], concurrently: bool = True) -> str:
+    """Return the statements that drop the redundant indexes and create the missing ones.
+
+    Parameters
+    ----------
+    findings : Iterable[IndexFinding]
+        The findings of `audit_indexes`.
+    concurrently : bool, optional
+        Build and drop the indexes ``CONCURRENTLY``, without locking out writes.
+
+    Returns
+    -------
+    str
+        The PostgreSQL statements, one per line.
+    """
+    quote = postgresql.dialect().identifier_preparer.quote
+    mode = " CONCURRENTLY" if concurrently else ""
+    statements = []
+    for finding in findings:
+        if finding.kind == "unindexed_fk":
+            columns = ", ".join(quote(column) for column in finding.columns)
+            statements.append(
+                f"CREATE INDEX{mode} IF NOT EXISTS {quote(finding.name)} "
+                f"ON {quote(finding.table)} ({columns});"
+            )
+        else:
+            statements.append(f"DROP INDEX{mode} IF EXISTS {quote(finding.name)};")
+    return "\n".join(statements)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Print the findings of `audit_indexes`, or their DDL with ``--sql``.
+
+    Returns 1 when there are findings with ``--check``, e.g. to fail a CI job.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m snap_saas_base.db.index_audit", description=main.__doc__
+    )
+    parser.add_argument("--sql", action="store_true", help="print the suggested DDL")
+    parser.add_argument(
+        "--no-concurrently", action="store_true", help="don't use CREATE/DROP INDEX CONCURRENTLY"
+    )
+    parser.add_argument("--check", action="store_true", help="exit with 1 on findings")
+    args = parser.parse_args(argv)
+    findings = audit_indexes()
+    if args.sql:
+        if findings:
+            print(suggested_ddl(findings, concurrently=not args.no_concurrently))
+    else:
+        for finding in findings:
+            print(finding)
+    return 1 if args.check and findings else 0
+
+
+def _structures(table: sa.Table) -> list[_Structure]:
+    structures: list[_Structure] = []
+    if table.primary_key.columns:
+        structures.append(
+            _Structure(
+                _name(table.primary_key) or f"{table.name} primary key",
+                tuple(column.name for column in table.primary_key.columns),
+                False,
+            )
+        )
+    for constraint in sorted(table.constraints, key=_name):
+        if isinstance(constraint, sa.UniqueConstraint):
+            columns = tuple(column.name for column in constraint.columns)
+            structures.append(_Structure(_name(constraint), columns, False))
+    for index in sorted(table.indexes, key=_name):
+        options = index.dialect_options["postgresql"]
+        if options["where"] is not None or options["using"] not in (False, None, "btree"):
+            continue
+        columns = tuple(
+            expression.name for expression in index.expressions if isinstance(expression, sa.Column)
+        )
+        if len(columns) != len(index.expressions):
+            continue
+        structures.append(_Structure(_name(index), columns, not index.unique))
+    return structures
+
+
+def _name(item: sa.Constraint | sa.Index) -> str:
+    # Unnamed constraints are named by the database, or by a naming convention on create.
+    return item.name if isinstance(item.name, str) else ""
+
+
+def _covering(
+    table: sa.Table, index: _Structure, structures: list[_Structure], dropped: set[str]
+) -> IndexFinding | None:
+    for kind, match in (
+        ("duplicate", lambda other: other.columns == index.columns),
+        ("prefix", lambda other: other.columns[: len(index.columns)] == index.columns),
+    ):
+        for other in structures:
+            if other.name == index.name or other.name in dropped or not match(other):
+                continue
+            return IndexFinding(kind, table.name, index.name, index.columns, other.name)
+    return None
+
+
+def _index_name(table: sa.Table, columns: tuple[str, ...]) -> str:
+    return f"ix_{table.name}_{'_'.join(columns)}"
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""Insert modes for high-volume inserts.
+
+The ORM unit of work builds an instance per row and, for models mapped with
+``eager_defaults=True``, asks the database to return generated values. That is wasted work when
+the caller never reads them back. `insert_rows` inserts plain dictionaries with a single
+``executemany`` and no ``RETURNING``, in one of the following modes:
+
+``InsertMode.ORM``
+    Instances are added to the session and flushed, as usual. Use it when the caller needs the
+    instances.
+``InsertMode.CLIENT``
+    Ids and timestamps are generated in Python, nothing is fetched back.
+``InsertMode.SERVER``
+    Ids are generated in Python, timestamps come from the database clock through `utcnow`.
+    They are not fetched back; load the rows by id when they are needed.
+
+Inserting `ChatMessage` rows in every mode also updates the message activity of their chats,
+see `snap_saas_base.models.chat.chat_activity`.
+
+The mode is chosen per operation, or per session through `set_insert_mode` or
+``sessionmaker(info={"insert_mode": "client"})``.
+"""
+
+import enum
+from collections.abc import Iterable, Mapping
+from datetime import UTC, datetime
+from typing import Any, cast
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+import uuid6
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from snap_saas_base.models.base_model import utcnow
+from snap_saas_base.models.chat import ChatMessage, chat_activity, message_activity
+
+INSERT_MODE_KEY = "insert_mode"
+
+
+class InsertMode(enum.StrEnum):
+    """How `insert_rows` generates and fetches back ids and timestamps."""
+
+    ORM = "orm"
+    CLIENT = "client"
+    SERVER = "server"
+
+
+def set_insert_mode(session: so.Session | AsyncSession, mode: InsertMode | str) -> None:
+    """Set the default insert mode of a session.
+
+    Parameters
+    ----------
+    session : so.Session | AsyncSession
+        The session.
+    mode : InsertMode | str
+        The default insert mode for `insert_rows` calls on this session.
+    """
+    session.info[INSERT_MODE_KEY] = InsertMode(mode)
+
+
+def get_insert_mode(session: so.Session | AsyncSession) -> InsertMode:
+    """Return the default insert mode of a session, ``InsertMode.ORM`` unless set."""
+    return InsertMode(session.info.get(INSERT_MODE_KEY, InsertMode.ORM))
+
+
+def insert_rows(
+    session: so.Session,
+    model: type,
+    rows: Iterable[Mapping[str, Any]],
+    mode: InsertMode | str | None = None,
+) -> list[str]:
+    """Insert rows of a model.
+
+    Outside of the ORM mode all rows are sent in a single ``executemany``, so they must have
+    the same keys. Missing ids are generated, as are timestamps in the client mode.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session used to run the insert. The caller commits.
+    model : type
+        The model to insert, e.g. `ChatMessage`.
+    rows : Iterable[Mapping[str, Any]]
+        The column values of each row.
+    mode : InsertMode | str, optional
+        The insert mode. Defaults to the session insert mode.
+
+    Returns
+    -------
+    list[str]
+        The ids of the inserted rows, in order.
+    """
+    mode = InsertMode(mode) if mode is not None else get_insert_mode(session)
+    rows = _prepare(rows)
+    if not rows:
+        return []
+    if mode is InsertMode.ORM:
+        session.add_all([model(**row) for row in rows])
+        session.flush()
+    else:
+        session.execute(_statement(model, rows, mode), rows)
+        for stmt in _activity(model, rows):
+            session.execute(stmt)
+    return [row["id"] for row in rows]
+
+
+async def ainsert_rows(
+    session: AsyncSession,
+    model: type,
+    rows: Iterable[Mapping[str, Any]],
+    mode: InsertMode | str | None = None,
+) -> list[str]:
+    """Insert rows of a model on an async session.
+
+    See `insert_rows`.
+    """
+    mode = InsertMode(mode) if mode is not None else get_insert_mode(session)
+    rows = _prepare(rows)
+    if not rows:
+        return []
+    if mode is InsertMode.ORM:
+        session.add_all([model(**row) for row in rows])
+        await session.flush()
+    else:
+        await session.execute(_statement(model, rows, mode), rows)
+        for stmt in _activity(model, rows):
+            await session.execute(stmt)
+    return [row["id"] for row in rows]
+
+
+def _prepare(rows: Iterable[Mapping[str, Any]]) -> list[dict[str, Any]]:
+    prepared = [dict(row) for row in rows]
+    for row in prepared:
+        if row.get("id") is None:
+            row["id"] = str(uuid6.uuid7())
+    return prepared
+
+
+def _activity(model: type, rows: list[dict[str, Any]]) -> list[sa.Update]:
+    # The ORM mode updates the chat activity on flush, the bulk modes bypass it.
+    if model is not ChatMessage:
+        return []
+    return [
+        chat_activity(chat_id, count, last_id, last_at)
+        for chat_id, (count, last_id, last_at) in message_activity(rows).items()
+    ]
+
+
+def _statement(model: type, rows: list[dict[str, Any]], mode: InsertMode) -> sa.Insert:
+    stmt = sa.insert(cast(sa.Table, sa.inspect(model).local_table))
+    if mode is InsertMode.CLIENT:
+        now = datetime.now(UTC).replace(tzinfo=None)
+        for row in rows:
+            row.setdefault("created_at", now)
+            row.setdefault("updated_at", now)
+        return stmt
+    for row in rows:
+        row.pop("created_at", None)
+        row.pop("updated_at", None)
+    return stmt.values(created_at=utcnow(), updated_at=utcnow())
@@ -0,0 +1,276 @@
+"""Named loader profiles for the model relationships.
+
+Every relationship is declared ``lazy="raise"``, so callers must say up front which related
+objects they need. Profiles give those choices a name and keep the strategy in one place:
+``joinedload`` for many-to-one references, ``selectinload`` for collections, and a limited
+post-load query for collections that are too large to load whole, such as ``Chat.messages``.
+"""
+
+from collections import defaultdict
+from collections.abc import Callable, Sequence
+from typing import Any
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from snap_saas_base.models.chat import Chat, ChatMessage
+from snap_saas_base.models.organization import Organization, OrgMember
+from snap_saas_base.models.workspace import (
+    Workspace,
+    WorkspaceApiKey,
+    WorkspaceKv,
+    WorkspaceMember,
+    WorkspaceMetric,
+)
+
+PostLoader = Callable[[so.Session, Sequence[Any]], None]
+
+
+class LoaderProfile:
+    """A named set of loader options for a model.
+
+    Attributes
+    ----------
+    model : type
+        The model the profile applies to.
+    name : str
+        The profile name, unique per model.
+    options : tuple
+        Loader options added to the statement.
+    post_load : PostLoader, optional
+        Called with the session and the loaded objects to populate relationships that can not
+        be expressed as loader options, such as a limited collection.
+
+    Methods
+    -------
+    apply(stmt):
+        Returns the statement with the profile options.
+    """
+
+    def __init__(
+        self,
+        model: type,
+        name: str,
+        options: Sequence[Any] = (),
+        post_load: PostLoader | None = None,
+    ):
+        self.model = model
+        self.name = name
+        self.options = tuple(options)
+        self.post_load = post_load
+
+    def apply(self, stmt: sa.Select) -> sa.Select:
+        """Return the statement with the profile loader options.
+
+        Parameters
+        ----------
+        stmt : sa.Select
+            A statement selecting the profile model.
+
+        Returns
+        -------
+        sa.Select
+            The statement with the options applied.
+        """
+        return stmt.options(*self.options) if self.options else stmt
+
+
+_profiles: dict[type, dict[str, LoaderProfile]] = defaultdict(dict)
+
+
+def register_profile(
+    model: type,
+    name: str,
+    *options: Any,
+    post_load: PostLoader | None = None,
+    replace: bool = False,
+) -> LoaderProfile:
+    """Register a named loader profile for a model.
+
+    Parameters
+    ----------
+    model : type
+        The model the profile applies to.
+    name : str
+        The profile name.
+    *options
+        Loader options, e.g. ``so.joinedload(OrgMember.member, innerjoin=True)``.
+    post_load : PostLoader, optional
+        Called with the session and the loaded objects after the statement runs.
+    replace : bool, optional
+        Replace an existing profile with the same name instead of raising.
+
+    Returns
+    -------
+    LoaderProfile
+        The registered profile.
+    """
+    if name in _profiles[model] and not replace:
+        raise ValueError(f"{model.__name__} already has a loader profile named {name!r}")
+    profile = LoaderProfile(model, name, options, post_load)
+    _profiles[model][name] = profile
+    return profile
+
+
+def get_profile(model: type, name: str) -> LoaderProfile:
+    """Return a registered loader profile.
+
+    Parameters
+    ----------
+    model : type
+        The model the profile applies to.
+    name : str
+        The profile name.
+
+    Returns
+    -------
+    LoaderProfile
+        The profile.
+    """
+    try:
+        return _profiles[model][name]
+    except KeyError:
+        available = ", ".join(sorted(_profiles[model])) or "none"
+        raise KeyError(
+            f"{model.__name__} has no loader profile named {name!r} (available: {available})"
+        ) from None
+
+
+def load_profile(session: so.Session, stmt: sa.Select, name: str) -> list[Any]:
+    """Run a statement with a loader profile and return the loaded objects.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session used to run the statement.
+    stmt : sa.Select
+        A statement selecting a single model, e.g. ``sa.select(Chat).where(...)``.
+    name : str
+        The name of a profile registered for the selected model.
+
+    Returns
+    -------
+    list
+        The loaded objects.
+    """
+    profile = get_profile(_entity(stmt), name)
+    objects = list(session.scalars(profile.apply(stmt)).unique())
+    if profile.post_load is not None:
+        profile.post_load(session, objects)
+    return objects
+
+
+async def aload_profile(session: AsyncSession, stmt: sa.Select, name: str) -> list[Any]:
+    """Run a statement with a loader profile on an async session.
+
+    Parameters
+    ----------
+    session : AsyncSession
+        The session used to run the statement.
+    stmt : sa.Select
+        A statement selecting a single model.
+    name : str
+        The name of a profile registered for the selected model.
+
+    Returns
+    -------
+    list
+        The loaded objects.
+    """
+    profile = get_profile(_entity(stmt), name)
+    objects = list((await session.scalars(profile.apply(stmt))).unique())
+    if profile.post_load is not None:
+        await session.run_sync(profile.post_load, objects)
+    return objects
+
+
+def last_messages(limit: int) -> PostLoader:
+    """Return a post loader that populates ``Chat.messages`` with the latest messages.
+
+    All the chats are served by one query that keeps the newest ``limit`` messages per chat with
+    a window function. The collection is loaded oldest first. It holds only the latest messages,
+    so it must be treated as read only.
+
+    Parameters
+    ----------
+    limit : int
+        Maximum number of messages loaded per chat.
+
+    Returns
+    -------
+    PostLoader
+        The post loader.
+    """
+
+    def post_load(session: so.Session, chats: Sequence[Chat]) -> None:
+        if not chats:
+            return
+        position = (
+            sa.func.row_number()
+            .over(partition_by=ChatMessage.chat_id, order_by=ChatMessage.id.desc())
+            .label("position")
+        )
+        latest = (
+            sa.select(ChatMessage.id, position)
+            .where(ChatMessage.chat_id.in_([chat.id for chat in chats]))
+            .subquery()
+        )
+        stmt = (
+            sa.select(ChatMessage)
+            .join(latest, latest.c.id == ChatMessage.id)
+            .where(latest.c.position <= limit)
+            .order_by(ChatMessage.chat_id, ChatMessage.id)
+        )
+        messages = defaultdict(list)
+        for message in session.scalars(stmt):
+            messages[message.chat_id].append(message)
+        for chat in chats:
+            set_committed_value(chat, "messages", messages[chat.id])
+            for message in messages[chat.id]:
+                set_committed_value(message, "chat", chat)
+
+    return post_load
+
+
+def _entity(stmt: sa.Select) -> type:
+    return stmt.column_descriptions[0]["entity"]
+
+
+register_profile(Chat, "chat_with_workspace", so.joinedload(Chat.workspace, innerjoin=True))
+register_profile(Chat, "chat_with_messages", so.selectinload(Chat.messages))
+register_profile(Chat, "chat_with_last_messages", post_load=last_messages(20))
+register_profile(ChatMessage, "message_with_chat", so.joinedload(ChatMessage.chat, innerjoin=True))
+register_profile(
+    Organization,
+    "org_with_creator",
+    so.joinedload(Organization.created_by_member, innerjoin=True),
+)
+register_profile(OrgMember, "member_with_user", so.joinedload(OrgMember.member, innerjoin=True))
+register_profile(OrgMember, "member_with_org", so.joinedload(OrgMember.org, innerjoin=True))
+register_profile(Workspace, "workspace_with_org", so.joinedload(Workspace.org, innerjoin=True))
+register_profile(
+    WorkspaceMember, "member_with_user", so.joinedload(WorkspaceMember.member, innerjoin=True)
+)
+register_profile(
+    WorkspaceMember,
+    "member_with_workspace",
+    so.joinedload(WorkspaceMember.workspace, innerjoin=True).joinedload(
+        Workspace.org, innerjoin=True
+    ),
+)
+register_profile(
+    WorkspaceApiKey,
+    "apikey_with_workspace_and_member",
+    so.joinedload(WorkspaceApiKey.workspace, innerjoin=True),
+    so.joinedload(WorkspaceApiKey.member, innerjoin=True),
+)
+register_profile(
+    WorkspaceKv, "kv_with_workspace", so.joinedload(WorkspaceKv.workspace, innerjoin=True)
+)
+register_profile(
+    WorkspaceMetric,
+    "metric_with_workspace",
+    so.joinedload(WorkspaceMetric.workspace, innerjoin=True),
+)
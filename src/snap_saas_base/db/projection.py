@@ -0,0 +1,115 @@
+"""Read-only projections of the models.
+
+Listing endpoints only read and serialize rows, yet loading them as model instances builds an
+instance state per row, registers it in the identity map and tracks its attributes for changes.
+A projection selects the mapped columns of a model as plain columns and returns each row as a
+named tuple generated from the mapper: immutable, without a ``__dict__``, and serializable by the
+schemas, which read attributes (``from_attributes=True``).
+
+>>> from snap_saas_base.models.workspace import WorkspaceMetric
+>>> projection(WorkspaceMetric, ("type", "time")).__name__
+'WorkspaceMetricRow'
+"""
+
+from collections import namedtuple
+from collections.abc import Sequence
+from functools import cache
+from typing import Any, cast
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy.ext.asyncio import AsyncSession
+
+PROJECTION_KEY = "snap_saas_base.projection"
+
+
+def projection(model: type, columns: tuple[str, ...] | None = None) -> type[Any]:
+    """Return the named tuple class of the rows of a model projection.
+
+    Parameters
+    ----------
+    model : type
+        The model.
+    columns : tuple[str, ...], optional
+        The mapped attributes to project. Defaults to every column attribute that isn't deferred.
+
+    Returns
+    -------
+    type
+        The ``<Model>Row`` named tuple class, built once per model and columns. Its fields
+        are only known at runtime, so rows are typed as ``Any``.
+    """
+    return _projection(model, columns)
+
+
+@cache
+def _projection(model: type, columns: tuple[str, ...] | None) -> type[Any]:
+    mapper: so.Mapper[Any] = sa.inspect(model)
+    if columns is None:
+        columns = tuple(prop.key for prop in mapper.column_attrs if not prop.deferred)
+    else:
+        unknown = set(columns) - set(mapper.column_attrs.keys())
+        if unknown:
+            raise ValueError(f"{model.__name__} has no columns {sorted(unknown)}")
+    return namedtuple(f"{model.__name__}Row", columns)  # type: ignore[misc]
+
+
+def projection_query(model: type, columns: Sequence[str] | None = None) -> sa.Select:
+    """Return a query selecting the projection of a model.
+
+    Add criteria, ordering and limits to it as to any select, and load it with `load_projection`.
+
+    Parameters
+    ----------
+    model : type
+        The model.
+    columns : Sequence[str], optional
+        The mapped attributes to project, see `projection`.
+
+    Returns
+    -------
+    sa.Select
+        The query.
+    """
+    row = projection(model, None if columns is None else tuple(columns))
+    # Table columns rather than mapped attributes keep the ORM out of the result processing.
+    mapper: so.Mapper[Any] = sa.inspect(model)
+    return sa.select(
+        *(mapper.column_attrs[key].columns[0].label(key) for key in row._fields)
+    ).execution_options(**{PROJECTION_KEY: row})
+
+
+def load_projection(session: so.Session, stmt: sa.Select) -> list[Any]:
+    """Load the rows of a projection query without touching the identity map.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session.
+    stmt : sa.Select
+        A query built by `projection_query`.
+
+    Returns
+    -------
+    list
+        The rows, as instances of the projection class.
+    """
+    row = _row_class(stmt)
+    return list(map(row._make, session.execute(stmt).tuples()))
+
+
+async def aload_projection(session: AsyncSession, stmt: sa.Select) -> list[Any]:
+    """Load the rows of a projection query on an async session.
+
+    See `load_projection`.
+    """
+    row = _row_class(stmt)
+    result = await session.execute(stmt)
+    return list(map(row._make, result.tuples()))
+
+
+def _row_class(stmt: sa.Select) -> type[Any]:
+    try:
+        return cast(type[Any], stmt.get_execution_options()[PROJECTION_KEY])
+    except KeyError:
+        raise ValueError("the statement was not built by projection_query") from None
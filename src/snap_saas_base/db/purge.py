@@ -0,0 +1,264 @@
+"""Chunked purge of workspaces and organizations.
+
+Deleting a large workspace in a single statement and letting ``ON DELETE CASCADE`` remove its
+dependents produces one long transaction that holds locks and generates a large WAL spike.
+`PurgeJob` deletes the dependents child tables first, in bounded batches, committing between
+batches so the work can be throttled, interrupted and resumed.
+"""
+
+import asyncio
+import time
+from collections.abc import Callable
+from typing import Any, NamedTuple, cast
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from snap_saas_base.models.chat import Chat, ChatMessage, ChatMessageArchive
+from snap_saas_base.models.organization import Organization, OrgMember
+from snap_saas_base.models.workspace import (
+    Workspace,
+    WorkspaceApiKey,
+    WorkspaceKv,
+    WorkspaceMember,
+    WorkspaceMetric,
+)
+
+
+class PurgeRestrictedError(Exception):
+    """Raised when a purge would delete rows protected by an ``ON DELETE RESTRICT`` key."""
+
+
+class PurgeStep(NamedTuple):
+    """A table to purge and the criteria selecting the rows to delete."""
+
+    table: sa.Table
+    criteria: sa.ColumnElement[bool]
+
+    def batch(self, batch_size: int) -> sa.Delete:
+        """Return a statement deleting at most ``batch_size`` matching rows."""
+        ids = sa.select(self.table.c.id).where(self.criteria).limit(batch_size)
+        return sa.delete(self.table).where(self.table.c.id.in_(ids))
+
+
+class PurgeProgress:
+    """The progress of a `PurgeJob`.
+
+    Attributes
+    ----------
+    step : int
+        Index of the step being purged. Steps before it are complete.
+    deleted : dict[str, int]
+        Number of rows deleted so far, by table name.
+    batches : int
+        Number of committed batches.
+    done : bool
+        Whether every step is complete.
+
+    Methods
+    -------
+    as_dict:
+        Returns the progress as a dictionary, suitable for storing and resuming the job later.
+    """
+
+    def __init__(
+        self,
+        step: int = 0,
+        deleted: dict[str, int] | None = None,
+        batches: int = 0,
+        done: bool = False,
+    ):
+        self.step = step
+        self.deleted = dict(deleted or {})
+        self.batches = batches
+        self.done = done
+
+    @property
+    def as_dict(self) -> dict[str, Any]:
+        """Returns the progress as a dictionary.
+
+        Returns
+        -------
+        dict
+            A dictionary that can be passed back as keyword arguments to resume the job.
+        """
+        return {
+            "step": self.step,
+            "deleted": dict(self.deleted),
+            "batches": self.batches,
+            "done": self.done,
+        }
+
+
+class PurgeJob:
+    """Deletes a workspace or an organization and all its dependents in bounded batches.
+
+    Each batch deletes at most ``batch_size`` rows from one table and is committed on its own.
+    Dependent tables are purged before the tables they reference, so the final parent delete
+    has nothing left to cascade to.
+
+    ``ON DELETE RESTRICT`` keys are respected: purging an organization that still has
+    workspaces raises `PurgeRestrictedError` unless ``include_workspaces`` is set, and the users
+    referenced by ``Organization.created_by`` are never deleted.
+
+    Parameters
+    ----------
+    steps : list[PurgeStep]
+        The tables to purge, in order.
+    batch_size : int, optional
+        Maximum number of rows deleted per batch.
+    pause : float, optional
+        Seconds to sleep between batches, to throttle the purge.
+    max_batches : int, optional
+        Stop after this many batches in a single `run` call. Call `run` again to resume.
+    on_progress : Callable[[PurgeProgress], None], optional
+        Called after each committed batch.
+    progress : PurgeProgress, optional
+        Progress of a previous run to resume from.
+    restrict : sa.Select, optional
+        A query that must return no rows for the purge to start.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        steps: list[PurgeStep],
+        *,
+        batch_size: int = 1000,
+        pause: float = 0.0,
+        max_batches: int | None = None,
+        on_progress: Callable[[PurgeProgress], None] | None = None,
+        progress: PurgeProgress | None = None,
+        restrict: sa.Select | None = None,
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be positive")
+        self.steps = steps
+        self.batch_size = batch_size
+        self.pause = pause
+        self.max_batches = max_batches
+        self.on_progress = on_progress
+        self.progress = progress or PurgeProgress()
+        self.restrict = restrict
+
+    @classmethod
+    def workspace(cls, workspace_id: str, **kwargs: Any) -> "PurgeJob":
+        """Return a job purging a workspace.
+
+        Parameters
+        ----------
+        workspace_id : str
+            The workspace to delete.
+        **kwargs
+            Passed to `PurgeJob`.
+        """
+        return cls(_workspace_steps(Workspace.id == workspace_id), **kwargs)
+
+    @classmethod
+    def organization(
+        cls, org_id: str, include_workspaces: bool = False, **kwargs: Any
+    ) -> "PurgeJob":
+        """Return a job purging an organization.
+
+        Parameters
+        ----------
+        org_id : str
+            The organization to delete.
+        include_workspaces : bool, optional
+            Also purge the organization workspaces. Without it the job refuses to start while
+            the organization has workspaces, as ``workspaces.org_id`` is ``ON DELETE RESTRICT``.
+        **kwargs
+            Passed to `PurgeJob`.
+        """
+        steps = []
+        restrict = None
+        if include_workspaces:
+            steps.extend(_workspace_steps(Workspace.org_id == org_id))
+        else:
+            restrict = sa.select(Workspace.id).where(Workspace.org_id == org_id).limit(1)
+        steps.append(_step(OrgMember, OrgMember.org_id == org_id))
+        steps.append(_step(Organization, Organization.id == org_id))
+        return cls(steps, restrict=restrict, **kwargs)
+
+    def run(self, session: so.Session) -> PurgeProgress:
+        """Run the purge on a session, committing after every batch.
+
+        Parameters
+        ----------
+        session : so.Session
+            The session used to run the batches. It must not have pending work.
+
+        Returns
+        -------
+        PurgeProgress
+            The progress, with ``done`` set once every step is complete.
+        """
+        if self.restrict is not None and session.execute(self.restrict).first() is not None:
+            raise PurgeRestrictedError("the purge is blocked by an ON DELETE RESTRICT reference")
+        budget = self.max_batches
+        while not self.progress.done and budget != 0:
+            step = self.steps[self.progress.step]
+            result = cast(sa.CursorResult[Any], session.execute(step.batch(self.batch_size)))
+            deleted = result.rowcount
+            session.commit()
+            budget = self._advance(step, deleted, budget)
+            if self.pause and not self.progress.done and budget != 0:
+                time.sleep(self.pause)
+        return self.progress
+
+    async def arun(self, session: AsyncSession) -> PurgeProgress:
+        """Run the purge on an async session, committing after every batch.
+
+        Parameters
+        ----------
+        session : AsyncSession
+            The session used to run the batches. It must not have pending work.
+
+        Returns
+        -------
+        PurgeProgress
+            The progress, with ``done`` set once every step is complete.
+        """
+        if self.restrict is not None and (await session.execute(self.restrict)).first():
+            raise PurgeRestrictedError("the purge is blocked by an ON DELETE RESTRICT reference")
+        budget = self.max_batches
+        while not self.progress.done and budget != 0:
+            step = self.steps[self.progress.step]
+            result = cast(sa.CursorResult[Any], await session.execute(step.batch(self.batch_size)))
+            deleted = result.rowcount
+            await session.commit()
+            budget = self._advance(step, deleted, budget)
+            if self.pause and not self.progress.done and budget != 0:
+                await asyncio.sleep(self.pause)
+        return self.progress
+
+    def _advance(self, step: PurgeStep, deleted: int, budget: int | None) -> int | None:
+        progress = self.progress
+        progress.batches += 1
+        progress.deleted[step.table.name] = progress.deleted.get(step.table.name, 0) + deleted
+        if deleted < self.batch_size:
+            progress.step += 1
+            progress.done = progress.step >= len(self.steps)
+        if self.on_progress is not None:
+            self.on_progress(progress)
+        return None if budget is None else budget - 1
+
+
+def _workspace_steps(criteria: sa.ColumnElement[bool]) -> list[PurgeStep]:
+    workspace_ids = sa.select(Workspace.id).where(criteria)
+    chat_ids = sa.select(Chat.id).where(Chat.workspace_id.in_(workspace_ids))
+    return [
+        _step(ChatMessage, ChatMessage.chat_id.in_(chat_ids)),
+        _step(ChatMessageArchive, ChatMessageArchive.chat_id.in_(chat_ids)),
+        _step(Chat, Chat.workspace_id.in_(workspace_ids)),
+        _step(WorkspaceKv, WorkspaceKv.workspace_id.in_(workspace_ids)),
+        _step(WorkspaceApiKey, WorkspaceApiKey.workspace_id.in_(workspace_ids)),
+        _step(WorkspaceMetric, WorkspaceMetric.workspace_id.in_(workspace_ids)),
+        _step(WorkspaceMember, WorkspaceMember.workspace_id.in_(workspace_ids)),
+        _step(Workspace, criteria),
+    ]
+
+
+def _step(model: Any, criteria: sa.ColumnElement[bool]) -> PurgeStep:
+    # Declarative models type __table__ as a FromClause, it is always a Table here.
+    return PurgeStep(cast(sa.Table, model.__table__), criteria)
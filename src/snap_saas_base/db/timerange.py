@@ -0,0 +1,180 @@
+"""Time-range scans on UUIDv7 ids.
+
+Ids generated by ``uuid6.uuid7()`` start with their creation time in milliseconds, and their
+text form sorts in creation order. A creation time window therefore maps to a range of ids, and
+time-window queries can scan the primary key or a ``(chat_id, id)`` index instead of a separate
+``created_at`` index.
+
+>>> uuid7_min(datetime(2024, 3, 2, 13, 28, 54))
+'018dff5a-71f0-0000-0000-000000000000'
+>>> uuid7_time("018dff5a-71f0-7d5e-b3f1-6c2f0a1e9b77")
+datetime.datetime(2024, 3, 2, 13, 28, 54)
+
+The bounds only select rows whose ids were generated by ``uuid7()`` close to ``created_at``;
+rows imported with ids of another kind need the ``created_at`` indexes.
+"""
+
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+import sqlalchemy as sa
+
+from snap_saas_base.models.chat import Chat, ChatMessage
+
+_MS = timedelta(milliseconds=1)
+_EPOCH = datetime.fromtimestamp(0, UTC).replace(tzinfo=None)
+
+
+def uuid7_min(moment: datetime) -> str:
+    """Return the smallest UUIDv7 text generated at a millisecond.
+
+    Parameters
+    ----------
+    moment : datetime
+        The time. Naive datetimes are UTC, as ``created_at``.
+
+    Returns
+    -------
+    str
+        The lower id bound.
+    """
+    return _uuid7_bound(moment, "0000-0000-000000000000")
+
+
+def uuid7_max(moment: datetime) -> str:
+    """Return the largest UUIDv7 text generated at a millisecond.
+
+    See `uuid7_min`.
+    """
+    return _uuid7_bound(moment, "ffff-ffff-ffffffffffff")
+
+
+def uuid7_time(value: Any) -> datetime:
+    """Return the creation time encoded in a UUIDv7 id.
+
+    Parameters
+    ----------
+    value : str | uuid.UUID
+        The id.
+
+    Returns
+    -------
+    datetime
+        The naive UTC creation time, with millisecond precision.
+    """
+    milliseconds = int(str(value).replace("-", "")[:12], 16)
+    return _EPOCH + milliseconds * _MS
+
+
+def id_between(
+    column: Any, start: datetime | None = None, end: datetime | None = None
+) -> sa.ColumnElement[bool]:
+    """Return a predicate selecting the UUIDv7 ids created in ``[start, end)``.
+
+    Parameters
+    ----------
+    column : sa.Column
+        The id column.
+    start : datetime, optional
+        Start of the window, included. Unbounded if None.
+    end : datetime, optional
+        End of the window, excluded. Unbounded if None.
+
+    Returns
+    -------
+    sa.ColumnElement[bool]
+        The range predicate.
+    """
+    criteria = []
+    if start is not None:
+        criteria.append(column >= uuid7_min(start))
+    if end is not None:
+        criteria.append(column < uuid7_min(end))
+    return sa.and_(sa.true(), *criteria)
+
+
+def chats_created_between(
+    workspace_id: str, start: datetime | None = None, end: datetime | None = None
+) -> sa.Select:
+    """Return the chats of a workspace created in ``[start, end)``, oldest first.
+
+    The query is a range scan of the ``(workspace_id, id)`` index.
+
+    Parameters
+    ----------
+    workspace_id : str
+        The workspace.
+    start : datetime, optional
+        Start of the window, included.
+    end : datetime, optional
+        End of the window, excluded.
+
+    Returns
+    -------
+    sa.Select
+        The query.
+    """
+    return (
+        sa.select(Chat)
+        .where(Chat.workspace_id == workspace_id, id_between(Chat.id, start, end))
+        .order_by(Chat.id)
+    )
+
+
+def messages_created_between(
+    chat_id: str, start: datetime | None = None, end: datetime | None = None
+) -> sa.Select:
+    """Return the messages of a chat created in ``[start, end)``, oldest first.
+
+    The query is a range scan of the ``(chat_id, id)`` unique index.
+
+    Parameters
+    ----------
+    chat_id : str
+        The chat.
+    start : datetime, optional
+        Start of the window, included.
+    end : datetime, optional
+        End of the window, excluded.
+
+    Returns
+    -------
+    sa.Select
+        The query.
+    """
+    return (
+        sa.select(ChatMessage)
+        .where(ChatMessage.chat_id == chat_id, id_between(ChatMessage.id, start, end))
+        .order_by(ChatMessage.id)
+    )
+
+
+def messages_since(chat_id: str, period: timedelta, now: datetime | None = None) -> sa.Select:
+    """Return the messages of a chat created during the last period, e.g. the last hour.
+
+    Parameters
+    ----------
+    chat_id : str
+        The chat.
+    period : timedelta
+        Length of the window ending now.
+    now : datetime, optional
+        End of the window. Defaults to the current time.
+
+    Returns
+    -------
+    sa.Select
+        The query.
+    """
+    now = now or datetime.now(UTC).replace(tzinfo=None)
+    return messages_created_between(chat_id, now - period)
+
+
+def _uuid7_bound(moment: datetime, tail: str) -> str:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(UTC).replace(tzinfo=None)
+    milliseconds = (moment - _EPOCH) // _MS
+    if not 0 <= milliseconds < 1 << 48:
+        raise ValueError(f"{moment} is out of the UUIDv7 time range")
+    prefix = f"{milliseconds:012x}"
+    return f"{prefix[:8]}-{prefix[8:]}-{tail}"
@@ -0,0 +1,537 @@
+"""Columnar time-series queries over `WorkspaceMetric`.
+
+Dashboards need counts, sums and percentiles of metric events over days of data. Loading the
+events as ORM objects and looping over them in Python doesn't scale, so this module offers two
+faster paths:
+
+* Aggregation in SQL. `bucket_query` groups the events into fixed time buckets per type, and
+  `percentile_query` computes percentiles on PostgreSQL. Only the aggregates leave the database.
+* Columnar loading. `load_series` fetches ``time``, ``type`` and selected numeric ``data``
+  fields as plain rows and returns a `MetricSeries` of NumPy arrays, with vectorized
+  `MetricSeries.resample`, `MetricSeries.downsample` and `MetricSeries.percentile`.
+
+Numeric ``data`` fields are read with `json_number`, so events whose field is missing or not a
+JSON number are skipped by the aggregates, and loaded as NaN, on every database.
+
+NumPy is an optional dependency, installed with the ``analytics`` extra. It is only needed to
+build the arrays.
+"""
+
+import importlib
+from collections.abc import Callable, Iterable, Sequence
+from datetime import datetime, timedelta
+from typing import Any
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+
+from snap_saas_base.models.workspace import WorkspaceMetric
+
+AGGREGATES = ("count", "sum", "mean", "min", "max")
+
+_SQL_AGGREGATES: dict[str, Callable[..., sa.ColumnElement[Any]]] = {
+    "count": sa.func.count,
+    "sum": sa.func.sum,
+    "mean": sa.func.avg,
+    "min": sa.func.min,
+    "max": sa.func.max,
+}
+
+
+class time_bucket(sa.sql.expression.FunctionElement):  # noqa: N801
+    """Start of the fixed-width time bucket of a naive UTC timestamp, in epoch seconds."""
+
+    type = sa.BigInteger()
+    inherit_cache = True
+
+    def __init__(self, column: Any, seconds: int):
+        if seconds < 1:
+            raise ValueError("buckets must be at least one second wide")
+        super().__init__(column, sa.literal_column(str(int(seconds))))
+
+
+@compiles(time_bucket)
+def _time_bucket_default(element, compiler, **kw):
+    column, seconds = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f"(CAST(strftime('%s', {column}) AS INTEGER) / {seconds}) * {seconds}"
+
+
+@compiles(time_bucket, "postgresql")
+def _time_bucket_postgresql(element, compiler, **kw):
+    column, seconds = (compiler.process(clause, **kw) for clause in element.clauses)
+    return f"CAST(FLOOR(EXTRACT(EPOCH FROM {column}) / {seconds}) * {seconds} AS BIGINT)"
+
+
+class json_number(sa.sql.expression.FunctionElement):  # noqa: N801
+    """A top-level field of a JSON column as a float, NULL unless it is a JSON number.
+
+    A plain cast of the field fails on PostgreSQL for strings, booleans or objects.
+    """
+
+    type = sa.Float()
+    inherit_cache = True
+
+    def __init__(self, column: Any, name: str):
+        super().__init__(column, sa.literal(name, sa.String))
+
+
+@compiles(json_number)
+def _json_number_default(element, compiler, **kw):
+    column, name = (compiler.process(clause, **kw) for clause in element.clauses)
+    path = f"'$.\"' || {name} || '\"'"
+    return (
+        f"CASE WHEN json_type({column}, {path}) IN ('integer', 'real') "
+        f"THEN json_extract({column}, {path}) END"
+    )
+
+
+@compiles(json_number, "postgresql")
+def _json_number_postgresql(element, compiler, **kw):
+    column, name = (compiler.process(clause, **kw) for clause in element.clauses)
+    return (
+        f"CASE WHEN jsonb_typeof({column} -> {name}) = 'number' "
+        f"THEN CAST({column} ->> {name} AS FLOAT) END"
+    )
+
+
+class MetricSeries:
+    """Metric events as columns of NumPy arrays.
+
+    Attributes
+    ----------
+    time : np.ndarray
+        Event times, as ``datetime64[us]``.
+    type : np.ndarray
+        Event types, as strings.
+    fields : dict[str, np.ndarray]
+        Selected ``data`` fields, as floats. Missing values are NaN, and so are non-numeric
+        values when loaded by `load_series`.
+
+    Methods
+    -------
+    where(types):
+        Returns the events of some types.
+    resample(every, field=None, how="count", start=None):
+        Aggregates the events into fixed time buckets.
+    downsample(points, field, how="mean"):
+        Aggregates the events into at most a number of buckets.
+    percentile(field, q):
+        Returns percentiles of a field.
+    by_type(every, field=None, how="count"):
+        Resamples the events of each type.
+    """
+
+    def __init__(self, time: Any, types: Any, fields: dict[str, Any]):
+        self.time = time
+        self.type = types
+        self.fields = fields
+
+    def __len__(self) -> int:
+        """Return the number of events."""
+        return len(self.time)
+
+    def __getitem__(self, name: str) -> Any:
+        """Return the ``time`` or ``type`` column, or a field."""
+        if name in ("time", "type"):
+            return getattr(self, name)
+        return self.fields[name]
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence[Any]], fields: Sequence[str]) -> "MetricSeries":
+        """Build the columns from ``(time, type, *fields)`` rows.
+
+        Parameters
+        ----------
+        rows : Sequence[Sequence]
+            The rows, e.g. returned by `metrics_query`.
+        fields : Sequence[str]
+            The names of the field columns.
+
+        Returns
+        -------
+        MetricSeries
+            The columns.
+        """
+        np = _numpy()
+        columns = list(zip(*rows, strict=True)) if rows else [()] * (2 + len(fields))
+        return cls(
+            np.array(columns[0], dtype="datetime64[us]"),
+            np.array(columns[1], dtype=str),
+            {name: np.array(columns[2 + i], dtype=float) for i, name in enumerate(fields)},
+        )
+
+    def where(self, types: str | Iterable[str]) -> "MetricSeries":
+        """Return the events of some types.
+
+        Parameters
+        ----------
+        types : str | Iterable[str]
+            The event types.
+
+        Returns
+        -------
+        MetricSeries
+            The selected events.
+        """
+        np = _numpy()
+        mask = np.isin(self.type, [types] if isinstance(types, str) else list(types))
+        return MetricSeries(
+            self.time[mask],
+            self.type[mask],
+            {name: values[mask] for name, values in self.fields.items()},
+        )
+
+    def resample(
+        self,
+        every: timedelta,
+        field: str | None = None,
+        how: str = "count",
+        start: datetime | None = None,
+    ) -> tuple[Any, Any]:
+        """Aggregate the events into fixed time buckets.
+
+        Parameters
+        ----------
+        every : timedelta
+            The bucket width.
+        field : str, optional
+            The field to aggregate. Not needed to count events.
+        how : str, optional
+            One of `AGGREGATES`. ``count`` counts events, the others ignore NaN field values.
+        start : datetime, optional
+            Start of the first bucket. Defaults to the bucket of the first event.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The bucket start times and the aggregated values, one per bucket from the first
+            bucket to the last non-empty one. Empty buckets count 0 and aggregate to NaN.
+        """
+        np = _numpy()
+        if how not in AGGREGATES:
+            raise ValueError(f"unknown aggregate {how!r}, expected one of {AGGREGATES}")
+        width = int(every / timedelta(microseconds=1))
+        if width < 1:
+            raise ValueError("buckets must be at least one microsecond wide")
+        ticks = self.time.astype(np.int64)
+        if start is not None:
+            origin = int(np.datetime64(start, "us").astype(np.int64))
+        elif len(ticks):
+            origin = int(ticks.min()) // width * width
+        else:
+            origin = 0
+        keep = ticks >= origin
+        index = (ticks[keep] - origin) // width
+        size = int(index.max()) + 1 if len(index) else 0
+        times = (origin + np.arange(size, dtype=np.int64) * width).astype("datetime64[us]")
+        if how == "count":
+            return times, np.bincount(index, minlength=size)
+        if field is None:
+            raise ValueError(f"aggregating with {how!r} needs a field")
+        values = self.fields[field][keep]
+        valid = ~np.isnan(values)
+        index, values = index[valid], values[valid]
+        if how in ("sum", "mean"):
+            totals = np.bincount(index, weights=values, minlength=size)
+            if how == "sum":
+                return times, totals
+            counts = np.bincount(index, minlength=size)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return times, np.where(counts > 0, totals / counts, np.nan)
+        result = np.full(size, np.nan)
+        reduce = np.fmin if how == "min" else np.fmax
+        reduce.at(result, index, values)
+        return times, result
+
+    def downsample(self, points: int, field: str, how: str = "mean") -> tuple[Any, Any]:
+        """Aggregate the events into at most a number of equally wide buckets, e.g. to plot.
+
+        See `resample`.
+        """
+        np = _numpy()
+        if points < 1:
+            raise ValueError("points must be positive")
+        if not len(self):
+            return self.resample(timedelta(seconds=1), field, how)
+        span = int((self.time.max() - self.time.min()).astype(np.int64)) + 1
+        width = timedelta(microseconds=-(-span // points))
+        return self.resample(width, field, how, start=self.time.min().astype(datetime))
+
+    def percentile(self, field: str, q: float | Sequence[float]) -> Any:
+        """Return percentiles of a field, ignoring NaN values.
+
+        Parameters
+        ----------
+        field : str
+            The field.
+        q : float | Sequence[float]
+            Percentiles between 0 and 100.
+
+        Returns
+        -------
+        float | np.ndarray
+            The percentiles.
+        """
+        np = _numpy()
+        values = self.fields[field]
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        return np.percentile(values, q)
+
+    def by_type(
+        self, every: timedelta, field: str | None = None, how: str = "count"
+    ) -> dict[str, tuple[Any, Any]]:
+        """Resample the events of each type on a shared bucket grid.
+
+        See `resample`.
+        """
+        np = _numpy()
+        if not len(self):
+            return {}
+        start = self.time.min().astype(datetime)
+        return {
+            str(name): self.where(str(name)).resample(every, field, how, start=start)
+            for name in np.unique(self.type)
+        }
+
+
+def metrics_query(
+    workspace_id: str,
+    start: datetime,
+    end: datetime,
+    *,
+    types: Iterable[str] | None = None,
+    fields: Sequence[str] = (),
+) -> sa.Select:
+    """Return the ``(time, type, *fields)`` rows of the metric events in ``[start, end)``.
+
+    The rows are ordered by time and read through the ``(workspace_id, time, type)`` or
+    ``(workspace_id, type, time)`` indexes.
+
+    Parameters
+    ----------
+    workspace_id : str
+        The workspace.
+    start : datetime
+        Start of the window, included.
+    end : datetime
+        End of the window, excluded.
+    types : Iterable[str], optional
+        Only select events of these types.
+    fields : Sequence[str], optional
+        Numeric ``data`` fields to select, as floats. See `json_number`.
+
+    Returns
+    -------
+    sa.Select
+        The query.
+    """
+    stmt = sa.select(
+        WorkspaceMetric.time,
+        WorkspaceMetric.type,
+        *(json_number(WorkspaceMetric.data, name).label(name) for name in fields),
+    )
+    return _window(stmt, workspace_id, start, end, types).order_by(WorkspaceMetric.time)
+
+
+def bucket_query(  # noqa: PLR0913
+    workspace_id: str,
+    start: datetime,
+    end: datetime,
+    every: timedelta,
+    *,
+    field: str | None = None,
+    how: str = "count",
+    types: Iterable[str] | None = None,
+) -> sa.Select:
+    """Return the ``(bucket, type, value)`` aggregates of the events in ``[start, end)``.
+
+    ``bucket`` is the start of each non-empty time bucket in epoch seconds, see `time_bucket`.
+
+    Parameters
+    ----------
+    workspace_id : str
+        The workspace.
+    start : datetime
+        Start of the window, included.
+    end : datetime
+        End of the window, excluded.
+    every : timedelta
+        The bucket width, a whole number of seconds.
+    field : str, optional
+        The numeric ``data`` field to aggregate. Not needed to count events.
+    how : str, optional
+        One of `AGGREGATES`.
+    types : Iterable[str], optional
+        Only aggregate events of these types.
+
+    Returns
+    -------
+    sa.Select
+        The query.
+    """
+    if how not in AGGREGATES:
+        raise ValueError(f"unknown aggregate {how!r}, expected one of {AGGREGATES}")
+    if how == "count":
+        value: sa.ColumnElement[Any] = sa.func.count()
+    elif field is None:
+        raise ValueError(f"aggregating with {how!r} needs a field")
+    else:
+        value = _SQL_AGGREGATES[how](json_number(WorkspaceMetric.data, field))
+    bucket = time_bucket(WorkspaceMetric.time, int(every.total_seconds())).label("bucket")
+    stmt = sa.select(bucket, WorkspaceMetric.type, value.label("value"))
+    return (
+        _window(stmt, workspace_id, start, end, types)
+        .group_by(bucket, WorkspaceMetric.type)
+        .order_by(bucket, WorkspaceMetric.type)
+    )
+
+
+def percentile_query(  # noqa: PLR0913
+    workspace_id: str,
+    start: datetime,
+    end: datetime,
+    field: str,
+    q: Sequence[float],
+    *,
+    types: Iterable[str] | None = None,
+) -> sa.Select:
+    """Return the ``(type, p1, p2, ...)`` percentiles of a field per type, on PostgreSQL.
+
+    Other databases have no ``percentile_cont``; use `MetricSeries.percentile` there.
+
+    Parameters
+    ----------
+    workspace_id : str
+        The workspace.
+    start : datetime
+        Start of the window, included.
+    end : datetime
+        End of the window, excluded.
+    field : str
+        The numeric ``data`` field.
+    q : Sequence[float]
+        Percentiles between 0 and 100.
+    types : Iterable[str], optional
+        Only select events of these types.
+
+    Returns
+    -------
+    sa.Select
+        The query.
+    """
+    value = json_number(WorkspaceMetric.data, field)
+    stmt = sa.select(
+        WorkspaceMetric.type,
+        *(
+            sa.func.percentile_cont(p / 100).within_group(value).label(f"p{p:g}".replace(".", "_"))
+            for p in q
+        ),
+    )
+    return _window(stmt, workspace_id, start, end, types).group_by(WorkspaceMetric.type)
+
+
+def load_series(  # noqa: PLR0913
+    session: so.Session,
+    workspace_id: str,
+    start: datetime,
+    end: datetime,
+    *,
+    types: Iterable[str] | None = None,
+    fields: Sequence[str] = (),
+) -> MetricSeries:
+    """Load the metric events in ``[start, end)`` as columns.
+
+    See `metrics_query`.
+
+    Returns
+    -------
+    MetricSeries
+        The columns.
+    """
+    stmt = metrics_query(workspace_id, start, end, types=types, fields=fields)
+    rows = session.execute(stmt).all()
+    return MetricSeries.from_rows(rows, fields)
+
+
+async def aload_series(  # noqa: PLR0913
+    session: AsyncSession,
+    workspace_id: str,
+    start: datetime,
+    end: datetime,
+    *,
+    types: Iterable[str] | None = None,
+    fields: Sequence[str] = (),
+) -> MetricSeries:
+    """Load the metric events in ``[start, end)`` as columns on an async session.
+
+    See `load_series`.
+    """
+    stmt = metrics_query(workspace_id, start, end, types=types, fields=fields)
+    result = await session.execute(stmt)
+    return MetricSeries.from_rows(result.all(), fields)
+
+
+def load_buckets(session: so.Session, stmt: sa.Select) -> dict[str, Any]:
+    """Run a `bucket_query` and return its columns.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session.
+    stmt : sa.Select
+        The query.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        The ``bucket`` start times as ``datetime64[s]``, the ``type`` and the ``value`` columns.
+    """
+    return _bucket_columns(session.execute(stmt).all())
+
+
+async def aload_buckets(session: AsyncSession, stmt: sa.Select) -> dict[str, Any]:
+    """Run a `bucket_query` on an async session and return its columns.
+
+    See `load_buckets`.
+    """
+    return _bucket_columns((await session.execute(stmt)).all())
+
+
+def _bucket_columns(rows: Sequence[Sequence[Any]]) -> dict[str, Any]:
+    np = _numpy()
+    buckets, types, values = zip(*rows, strict=True) if rows else ((), (), ())
+    return {
+        "bucket": np.array(buckets, dtype=np.int64).astype("datetime64[s]"),
+        "type": np.array(types, dtype=str),
+        "value": np.array(values, dtype=float),
+    }
+
+
+def _window(
+    stmt: sa.Select,
+    workspace_id: str,
+    start: datetime,
+    end: datetime,
+    types: Iterable[str] | None,
+) -> sa.Select:
+    stmt = stmt.where(
+        WorkspaceMetric.workspace_id == workspace_id,
+        WorkspaceMetric.time >= start,
+        WorkspaceMetric.time < end,
+    )
+    if types is not None:
+        stmt = stmt.where(WorkspaceMetric.type.in_(list(types)))
+    return stmt
+
+
+def _numpy() -> Any:
+    try:
+        return importlib.import_module("numpy")
+    except ImportError as e:  # pragma: no cover
+        raise ImportError(
+            "columnar metric series need NumPy, install snap-saas-base[analytics]"
+        ) from e
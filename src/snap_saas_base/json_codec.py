@@ -0,0 +1,170 @@
+"""JSON codecs for the JSON columns and compression of large documents.
+
+The ``JSON`` and ``JSONB`` columns are encoded and decoded by the engine's ``json_serializer``
+and ``json_deserializer``, the standard library ``json`` module by default. `create_engine`
+plugs in `default_codec` instead: orjson, several times faster on the large ``history`` and
+``state`` documents of a chat, when ``snap-saas-base[json]`` is installed, and the standard
+library otherwise.
+
+>>> codec = get_codec("stdlib")
+>>> codec.loads(codec.dumps({"turns": [1, 2]}))
+{'turns': [1, 2]}
+
+`compress` and `decompress` use zstd, or zlib when ``zstandard`` is not installed. They back
+`snap_saas_base.models.types.CompressedJSON` and the message archive.
+
+The module depends on neither the models nor the database helpers, so both layers import it.
+"""
+
+import importlib
+import json
+import zlib
+from collections.abc import Callable
+from functools import cache
+from typing import Any, NamedTuple
+
+
+class JsonCodec(NamedTuple):
+    """A JSON implementation.
+
+    Attributes
+    ----------
+    name : str
+        ``orjson`` or ``stdlib``.
+    dumps : Callable[[Any], str]
+        Encodes a value to a JSON string.
+    loads : Callable[[str | bytes], Any]
+        Decodes a JSON document.
+    """
+
+    name: str
+    dumps: Callable[[Any], str]
+    loads: Callable[[str | bytes], Any]
+
+
+def _stdlib_dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+STDLIB = JsonCodec("stdlib", _stdlib_dumps, json.loads)
+
+
+def get_codec(name: str | None = None) -> JsonCodec:
+    """Return a JSON codec.
+
+    Parameters
+    ----------
+    name : str, optional
+        ``orjson`` or ``stdlib``. Defaults to orjson when it is installed.
+
+    Returns
+    -------
+    JsonCodec
+        The codec.
+
+    Raises
+    ------
+    ImportError
+        If ``orjson`` is requested but not installed.
+    ValueError
+        If the name is unknown.
+    """
+    if name not in (None, "orjson", "stdlib"):
+        raise ValueError(f"unknown JSON codec {name!r}, expected 'orjson' or 'stdlib'")
+    if name == "stdlib":
+        return STDLIB
+    if _orjson(required=name == "orjson") is None:
+        return STDLIB
+    return _orjson_codec()
+
+
+@cache
+def _orjson_codec() -> JsonCodec:
+    orjson = _orjson()
+    # Integer keys are encoded as strings, as the standard library does.
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(value: Any) -> str:
+        return orjson.dumps(value, option=option).decode()
+
+    return JsonCodec("orjson", dumps, orjson.loads)
+
+
+def default_codec() -> JsonCodec:
+    """Return the fastest installed codec."""
+    return get_codec()
+
+
+def engine_json_options(codec: JsonCodec | str | None = None) -> dict[str, Any]:
+    """Return the ``create_engine`` arguments that make the JSON columns use a codec.
+
+    Parameters
+    ----------
+    codec : JsonCodec | str, optional
+        The codec or its name, `default_codec` if None.
+
+    Returns
+    -------
+    dict[str, Any]
+        The ``json_serializer`` and ``json_deserializer`` arguments.
+    """
+    if not isinstance(codec, JsonCodec):
+        codec = get_codec(codec)
+    return {"json_serializer": codec.dumps, "json_deserializer": codec.loads}
+
+
+def compress(data: bytes, level: int | None = None) -> tuple[str, bytes]:
+    """Compress data with zstd, or zlib when ``zstandard`` is not installed.
+
+    Parameters
+    ----------
+    data : bytes
+        The data.
+    level : int, optional
+        The compression level, 10 for zstd and 6 for zlib by default.
+
+    Returns
+    -------
+    tuple[str, bytes]
+        The codec, ``zstd`` or ``zlib``, and the compressed data.
+    """
+    zstandard = _zstandard()
+    if zstandard is None:
+        return "zlib", zlib.compress(data, 6 if level is None else level)
+    return "zstd", zstandard.ZstdCompressor(level=10 if level is None else level).compress(data)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    """Decompress data compressed by `compress`.
+
+    Raises
+    ------
+    ImportError
+        If the data is zstd compressed and ``zstandard`` is not installed.
+    ValueError
+        If the codec is unknown.
+    """
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise ImportError("reading zstd compressed data needs snap-saas-base[archive]")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"unknown compression codec {codec!r}")
+
+
+def _orjson(required: bool = False) -> Any:
+    try:
+        return importlib.import_module("orjson")
+    except ImportError as e:  # pragma: no cover
+        if not required:
+            return None
+        raise ImportError("the orjson codec needs orjson, install snap-saas-base[json]") from e
+
+
+def _zstandard() -> Any:
+    try:
+        return importlib.import_module("zstandard")
+    except ImportError:
+        return None
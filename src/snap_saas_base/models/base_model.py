@@ -3,6 +3,7 @@ from datetime import datetime
 import sqlalchemy as sa
 import sqlalchemy.orm as so
 import uuid6
+from sqlalchemy.ext.compiler import compiles
 
 db_naming_convention = {
     "ix": "ix_%(column_0_label)s",
@@ -15,6 +16,23 @@ db_naming_convention = {
 # https://blog.miguelgrinberg.com/post/what-s-new-in-sqlalchemy-2-0
 
 
+class utcnow(sa.sql.expression.FunctionElement):  # noqa: N801
+    """Current UTC timestamp, consistent with the naive UTC `datetime.utcnow` defaults."""
+
+    type = sa.DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
 class AbstractModel(so.DeclarativeBase):
     """Abstract base class for SQLAlchemy models. This class provides common
     attributes and methods for all models.
@@ -36,6 +54,8 @@ class AbstractModel(so.DeclarativeBase):
         The `id` attribute uses the `cuid.cuid` function to generate a unique identifier.
         The `created_at` and `updated_at` attributes use the `datetime.utcnow` function to generate timestamps.
         The `updated_at` attribute is also updated every time the instance is updated.
+        Both timestamps also have a `utcnow()` server default, used by the server insert mode of
+        `snap_saas_base.db.inserts`.
     """
 
     __abstract__ = True
@@ -46,13 +66,13 @@ class AbstractModel(so.DeclarativeBase):
         sa.DateTime(timezone=False),
         nullable=False,
         default=datetime.utcnow,
-        # server_default=func.now(),
+        server_default=utcnow(),
     )
     updated_at: so.Mapped[datetime] = so.mapped_column(
         sa.DateTime(timezone=False),
         nullable=False,
         default=datetime.utcnow,
         onupdate=datetime.utcnow,
-        # server_default=func.now(),
+        server_default=utcnow(),
         # server_onupdate=func.now(),
     )
@@ -4,9 +4,9 @@ from typing import Any
 import sqlalchemy as sa
 import sqlalchemy.orm as so
 import uuid6
-from sqlalchemy.dialects.postgresql import JSONB
 
-from snap_saas_base.models.base_model import AbstractModel
+from snap_saas_base.models.base_model import AbstractModel, utcnow
+from snap_saas_base.models.types import JSONB
 from snap_saas_base.models.workspace import Workspace
 
 # https://github.com/sqlalchemy/sqlalchemy/discussions/6165
@@ -42,6 +42,21 @@ class Chat(AbstractModel):
     session_metadata: so.Mapped[dict[str, Any]] = so.mapped_column(JSONB, nullable=False)
     history: so.Mapped[dict[str, Any]] = so.mapped_column(JSONB, nullable=False)
     deleted_at: so.Mapped[datetime] = so.mapped_column(nullable=True)
+    # Row version used for optimistic concurrency control, see snap_saas_base.db.concurrency.
+    # Every update of the row bumps it, version checks are opt-in per session.
+    version_id: so.Mapped[int] = so.mapped_column(
+        nullable=False,
+        default=1,
+        server_default=sa.text("1"),
+        onupdate=sa.literal_column("version_id") + 1,
+        info={"version": True},
+    )
+    # Message activity, maintained by the message write paths, see chat_activity.
+    message_count: so.Mapped[int] = so.mapped_column(
+        nullable=False, default=0, server_default=sa.text("0")
+    )
+    last_message_at: so.Mapped[datetime] = so.mapped_column(nullable=True)
+    last_message_id: so.Mapped[str] = so.mapped_column(nullable=True)
 
     # messages: so.WriteOnlyMapped["ChatMessage"] = so.relationship(
     #     back_populates="chat", cascade="all, delete-orphan"
@@ -55,19 +70,12 @@ class Chat(AbstractModel):
         sa.UniqueConstraint("workspace_id", "id"),
         sa.UniqueConstraint("workspace_id", "handsoff_config", "handsoff_cid"),
         sa.UniqueConstraint("workspace_id", "channel", "channel_session_id"),
-        sa.Index(
-            "ix_chats_workspace_id_channel_channel_id",
-            "workspace_id",
-            "channel",
-            "channel_session_id",
-        ),
         sa.Index(
             "ix_chats_workspace_id_channel_contact_uid_created_at",
             "workspace_id",
             "channel_contact_uid",
             "created_at",
         ),
-        sa.Index("ix_chats_workspace_id_id", "workspace_id", "id"),
         sa.Index(
             "ix_chats_by_channel_plugin",
             "workspace_id",
@@ -91,6 +99,7 @@ class Chat(AbstractModel):
             "created_at",
             "id",
         ),
+        sa.Index("ix_chats_inbox", "workspace_id", "last_message_at", "id"),
     )
     __mapper_args__ = {"eager_defaults": True}
 
@@ -163,3 +172,192 @@ class ChatMessage(AbstractModel):
         if "id" not in kwargs:
             kwargs["id"] = str(uuid6.uuid7())
         super(ChatMessage, self).__init__(*args, **kwargs)
+
+
+class ChatMessageArchive(AbstractModel):
+    """A compressed segment of archived chat messages.
+
+    Old messages are moved out of ``chats_messages`` into segments of consecutive messages of a
+    chat, see `snap_saas_base.db.archive`. The columns other than ``payload`` form the manifest
+    of the archive, so ``payload`` is deferred and only loaded to read the messages back.
+
+    Attributes
+    ----------
+    __tablename__ : str
+        The name of the table in the database.
+    chat_id : so.Mapped[str]
+        The chat of the messages.
+    first_message_id : so.Mapped[str]
+        The id of the oldest message in the segment.
+    last_message_id : so.Mapped[str]
+        The id of the newest message in the segment.
+    message_count : so.Mapped[int]
+        The number of messages in the segment.
+    codec : so.Mapped[str]
+        The compression of the payload, ``zstd`` or ``zlib``.
+    size : so.Mapped[int]
+        The uncompressed payload size, in bytes.
+    payload : so.Mapped[bytes]
+        The messages as compressed newline-delimited JSON, oldest first.
+
+    Methods
+    -------
+    as_dict:
+        Returns the manifest of the segment as a dictionary.
+    __init__(*args, **kwargs):
+        Initializes the segment. If no id is provided, a unique id is generated.
+    """
+
+    __tablename__ = "chats_messages_archive"
+
+    chat_id: so.Mapped[str] = so.mapped_column(
+        sa.ForeignKey("chats.id", ondelete="CASCADE"), nullable=False
+    )
+    first_message_id: so.Mapped[str] = so.mapped_column(nullable=False)
+    last_message_id: so.Mapped[str] = so.mapped_column(nullable=False)
+    message_count: so.Mapped[int] = so.mapped_column(nullable=False)
+    codec: so.Mapped[str] = so.mapped_column(nullable=False)
+    size: so.Mapped[int] = so.mapped_column(nullable=False)
+    payload: so.Mapped[bytes] = so.mapped_column(sa.LargeBinary, nullable=False, deferred=True)
+
+    __table_args__ = (
+        sa.UniqueConstraint("chat_id", "first_message_id"),
+        sa.Index("ix_chats_messages_archive_chat_id_last_message_id", "chat_id", "last_message_id"),
+    )
+    __mapper_args__ = {"eager_defaults": True}  # noqa: RUF012
+
+    @property
+    def as_dict(self):
+        """Returns the manifest of the segment as a dictionary.
+
+        The deferred payload is left out.
+
+        Returns
+        -------
+        dict
+            A dictionary representation of the segment without its payload.
+        """
+        return {
+            c.name: getattr(self, c.name) for c in self.__table__.columns if c.name != "payload"
+        }
+
+    def __init__(self, *args, **kwargs):
+        if "id" not in kwargs:
+            kwargs["id"] = str(uuid6.uuid7())
+        super().__init__(*args, **kwargs)
+
+
+def chat_activity(
+    chat_id: str,
+    count: int,
+    last_message_id: str | None = None,
+    last_message_at: Any = None,
+) -> sa.Update:
+    """Return the update of the message activity of a chat after messages were added.
+
+    The update is incremental, so concurrent writers don't overwrite each other, and the last
+    message only moves forward. Like every update of a chat, it bumps ``version_id``.
+
+    Parameters
+    ----------
+    chat_id : str
+        The chat.
+    count : int
+        The number of added messages, negative for removed ones.
+    last_message_id : str, optional
+        The id of the newest added message.
+    last_message_at : datetime, optional
+        The creation time of the newest added message. Defaults to the current time.
+
+    Returns
+    -------
+    sa.Update
+        The update.
+    """
+    return (
+        sa.update(Chat)
+        .where(Chat.id == chat_id)
+        .values(**chat_activity_values(count, last_message_id, last_message_at))
+    )
+
+
+def chat_activity_values(
+    count: int, last_message_id: str | None = None, last_message_at: Any = None
+) -> dict[str, Any]:
+    """Return the ``SET`` values of `chat_activity`, to merge into another chat update."""
+    table = Chat.__table__
+    values: dict[str, Any] = {"message_count": table.c.message_count + count}
+    if last_message_id is not None:
+        newer = sa.or_(table.c.last_message_id.is_(None), table.c.last_message_id < last_message_id)
+        if last_message_at is None:
+            last_message_at = utcnow()
+        values["last_message_id"] = sa.case((newer, last_message_id), else_=table.c.last_message_id)
+        values["last_message_at"] = sa.case((newer, last_message_at), else_=table.c.last_message_at)
+    return values
+
+
+def message_activity(messages: Any) -> dict[str, tuple[int, str, Any]]:
+    """Aggregate added messages per chat.
+
+    Parameters
+    ----------
+    messages : Iterable
+        `ChatMessage` objects or row mappings with ``chat_id``, ``id`` and, optionally,
+        ``created_at``.
+
+    Returns
+    -------
+    dict[str, tuple[int, str, datetime | None]]
+        The count, newest id and newest creation time of the messages of each chat.
+    """
+    activity: dict[str, tuple[int, str, Any]] = {}
+    for message in messages:
+        if isinstance(message, ChatMessage):
+            chat_id, message_id, created_at = message.chat_id, message.id, message.created_at
+        else:
+            chat_id, message_id = message["chat_id"], message["id"]
+            created_at = message.get("created_at")
+        count, last_id, last_at = activity.get(chat_id, (0, None, None))
+        if last_id is None or message_id > last_id:
+            last_id, last_at = message_id, created_at
+        activity[chat_id] = (count + 1, last_id, last_at)
+    return activity
+
+
+_ACTIVITY_KEYS = ("message_count", "last_message_at", "last_message_id")
+
+
+@sa.event.listens_for(so.Session, "after_flush")
+def _track_chat_activity(session: so.Session, flush_context: Any) -> None:
+    added = [obj for obj in session.new if isinstance(obj, ChatMessage)]
+    removed = [obj for obj in session.deleted if isinstance(obj, ChatMessage)]
+    if not added and not removed:
+        return
+    updates = [
+        chat_activity(chat_id, count, last_id, last_at)
+        for chat_id, (count, last_id, last_at) in message_activity(added).items()
+    ]
+    updates += [
+        chat_activity(chat_id, -count)
+        for chat_id, (count, _, _) in message_activity(removed).items()
+    ]
+    connection = session.connection()
+    columns = Chat.__table__.c
+    returning = [columns.id, columns.version_id, *(columns[key] for key in _ACTIVITY_KEYS)]
+    for update in updates:
+        row = connection.execute(update.returning(*returning)).one_or_none()
+        if row is not None:
+            _apply_activity(session, row._mapping)
+
+
+def _apply_activity(session: so.Session, row: Any) -> None:
+    chat = session.identity_map.get(so.util.identity_key(Chat, row["id"]))
+    if chat is None:
+        return
+    # Set as loaded state, so reading it needs no reload, which async sessions can't do lazily.
+    for key in _ACTIVITY_KEYS:
+        so.attributes.set_committed_value(chat, key, row[key])
+    # Only follow a bump of the loaded version, so a concurrent update stays detectable.
+    version = sa.inspect(chat).dict.get("version_id")
+    if version is not None and row["version_id"] == version + 1:
+        so.attributes.set_committed_value(chat, "version_id", row["version_id"])
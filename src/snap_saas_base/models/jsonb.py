@@ -0,0 +1,185 @@
+"""Index and query helpers for the JSONB columns."""
+
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Any
+
+import sqlalchemy as sa
+
+from snap_saas_base.models.chat import Chat, ChatMessage
+
+# JSONB columns that are commonly filtered by key and benefit from a GIN index.
+JSONB_INDEXED_COLUMNS = (
+    Chat.subject,
+    Chat.session_metadata,
+    Chat.slots,
+    ChatMessage.message_metadata,
+)
+
+
+def jsonb_gin_index(column: Any, name: str | None = None) -> sa.Index:
+    """Return a ``jsonb_path_ops`` GIN index for a JSONB column.
+
+    The index is attached to the column's table, so it is picked up by ``create_all`` and by
+    migration autogeneration. ``jsonb_path_ops`` indexes are smaller and faster than the default
+    ``jsonb_ops`` ones but only serve the containment operator (``@>``), which is what
+    `jsonb_contains` and `jsonb_path_contains` generate.
+
+    Parameters
+    ----------
+    column : Any
+        A JSONB column or mapped attribute, e.g. ``Chat.subject``.
+    name : str, optional
+        The index name. Defaults to ``ix_<table>_<column>_gin``.
+
+    Returns
+    -------
+    sa.Index
+        The index, or the existing one if an index with the same name is already declared.
+    """
+    column = column.expression
+    name = name or f"ix_{column.table.name}_{column.name}_gin"
+    existing = _find_index(column.table, name)
+    if existing is not None:
+        return existing
+    return sa.Index(
+        name,
+        column,
+        postgresql_using="gin",
+        postgresql_ops={column.name: "jsonb_path_ops"},
+    )
+
+
+def jsonb_key_index(column: Any, key: str, name: str | None = None) -> sa.Index:
+    """Return a btree expression index over ``column ->> key``.
+
+    Use it for a small number of declared hot keys that are compared by equality or range. The
+    matching predicate is generated by `jsonb_key_equals`.
+
+    Parameters
+    ----------
+    column : Any
+        A JSONB column or mapped attribute, e.g. ``Chat.subject``.
+    key : str
+        The top level key to index.
+    name : str, optional
+        The index name. Defaults to ``ix_<table>_<column>_<key>``.
+
+    Returns
+    -------
+    sa.Index
+        The index, or the existing one if an index with the same name is already declared.
+    """
+    column = column.expression
+    name = name or f"ix_{column.table.name}_{column.name}_{key}"
+    existing = _find_index(column.table, name)
+    if existing is not None:
+        return existing
+    return sa.Index(name, column[key].astext)
+
+
+def enable_jsonb_indexes(
+    columns: Iterable[Any] = JSONB_INDEXED_COLUMNS,
+    hot_keys: Mapping[Any, Iterable[str]] | None = None,
+) -> list[sa.Index]:
+    """Declare the opt-in JSONB indexes on the model metadata.
+
+    The indexes are not part of the default schema. Services that filter by JSONB keys call this
+    once, before ``create_all`` or migration autogeneration, to add them. Calling it more than
+    once is harmless.
+
+    Parameters
+    ----------
+    columns : Iterable[Any], optional
+        JSONB columns that get a ``jsonb_path_ops`` GIN index. Defaults to
+        `JSONB_INDEXED_COLUMNS`.
+    hot_keys : Mapping[Any, Iterable[str]], optional
+        Expression indexes to declare, mapping a JSONB column to its hot keys, e.g.
+        ``{Chat.subject: ["customer_id"]}``.
+
+    Returns
+    -------
+    list[sa.Index]
+        The declared indexes.
+    """
+    indexes = [jsonb_gin_index(column) for column in columns]
+    for column, keys in (hot_keys or {}).items():
+        indexes.extend(jsonb_key_index(column, key) for key in keys)
+    return indexes
+
+
+def jsonb_contains(column: Any, value: Mapping[str, Any]) -> sa.ColumnElement[bool]:
+    """Return a ``column @> value`` predicate.
+
+    Unlike ``column ->> 'key' = 'value'``, the containment operator can use a GIN index.
+
+    Parameters
+    ----------
+    column : Any
+        A JSONB column or mapped attribute.
+    value : Mapping[str, Any]
+        The document fragment the column must contain, e.g. ``{"customer": {"tier": "gold"}}``.
+
+    Returns
+    -------
+    sa.ColumnElement[bool]
+        The containment predicate.
+    """
+    return column.contains(dict(value))
+
+
+def jsonb_path_contains(
+    column: Any, path: str | Sequence[str], value: Any
+) -> sa.ColumnElement[bool]:
+    """Return a containment predicate matching a single nested key.
+
+    ``jsonb_path_contains(Chat.subject, "customer.tier", "gold")`` is the index friendly form of
+    ``subject -> 'customer' ->> 'tier' = 'gold'``.
+
+    Parameters
+    ----------
+    column : Any
+        A JSONB column or mapped attribute.
+    path : str | Sequence[str]
+        The key path, either dotted or as a sequence of keys.
+    value : Any
+        The expected JSON value at the path.
+
+    Returns
+    -------
+    sa.ColumnElement[bool]
+        The containment predicate.
+    """
+    keys = path.split(".") if isinstance(path, str) else list(path)
+    if not keys:
+        raise ValueError("path must have at least one key")
+    document = value
+    for key in reversed(keys):
+        document = {key: document}
+    return jsonb_contains(column, document)
+
+
+def jsonb_key_equals(column: Any, key: str, value: str) -> sa.ColumnElement[bool]:
+    """Return a ``column ->> key = value`` predicate matching a `jsonb_key_index`.
+
+    The key is rendered inline so the planner can match the expression index even when the
+    statement is prepared.
+
+    Parameters
+    ----------
+    column : Any
+        A JSONB column or mapped attribute.
+    key : str
+        The top level key declared in `jsonb_key_index`.
+    value : str
+        The expected text value.
+
+    Returns
+    -------
+    sa.ColumnElement[bool]
+        The equality predicate.
+    """
+    return column[sa.literal(key, literal_execute=True)].astext == value
+
+
+def _find_index(table: sa.Table, name: str) -> sa.Index | None:
+    return next((index for index in table.indexes if index.name == name), None)
@@ -46,7 +46,7 @@ class Organization(AbstractModel):
     slug: so.Mapped[str] = so.mapped_column(nullable=False, unique=True)
     bucket: so.Mapped[str] = so.mapped_column(nullable=False)
     created_by: so.Mapped[str] = so.mapped_column(
-        sa.ForeignKey("users.id", ondelete="RESTRICT"), nullable=False
+        sa.ForeignKey("users.id", ondelete="RESTRICT"), nullable=False, index=True
     )
     created_by_member: so.Mapped[User] = so.relationship("User", uselist=False, lazy="raise")
     revoke_link: so.Mapped[bool] = so.mapped_column(default=False, server_default=sa.text("false"))
@@ -113,7 +113,7 @@ class OrgMember(AbstractModel):
         sa.ForeignKey("organizations.id", ondelete="CASCADE"), nullable=False
     )
     member_id: so.Mapped[str] = so.mapped_column(
-        sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
     )
     role: so.Mapped[str] = so.mapped_column(nullable=False)
     org = so.relationship("Organization", back_populates="org_member", uselist=False, lazy="raise")
@@ -0,0 +1,84 @@
+"""Portable column types.
+
+`JSONB` is PostgreSQL ``JSONB`` that falls back to the generic ``JSON`` type, stored as text,
+on SQLite. The models use it so the schema can also be created on an embedded SQLite database,
+e.g. for fast tests or edge deployments. PostgreSQL-only operators such as ``@>`` and the GIN
+indexes of `snap_saas_base.models.jsonb` remain PostgreSQL-only.
+
+`CompressedJSON` stores JSON documents as binary, compressed when they are large. It suits large
+documents that are read and written whole but never queried in SQL, such as a long chat
+``history``.
+"""
+
+from typing import Any
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from snap_saas_base.json_codec import JsonCodec, compress, decompress, default_codec
+
+JSONB = postgresql.JSONB().with_variant(sa.JSON(), "sqlite")
+
+# The first byte of a CompressedJSON value tells how the rest is stored.
+_RAW = b"\x00"
+_CODECS = {"zlib": b"\x01", "zstd": b"\x02"}
+_HEADERS = {header: codec for codec, header in _CODECS.items()}
+
+
+class CompressedJSON(sa.TypeDecorator):
+    """A JSON document stored as ``bytea``, compressed above a size threshold.
+
+    Documents are encoded with the JSON codec of the engine and compressed with zstd, or zlib
+    when ``zstandard`` is not installed. Values stay readable whichever compressor wrote them,
+    as long as the matching library is installed.
+
+    Parameters
+    ----------
+    threshold : int, optional
+        Documents of this many bytes or more are compressed, smaller ones are stored as is.
+    level : int, optional
+        The compression level. The default favours speed, as documents are compressed on every
+        write.
+    codec : JsonCodec, optional
+        The JSON codec, overriding the engine's.
+    """
+
+    impl = sa.LargeBinary
+    cache_ok = True
+
+    def __init__(self, threshold: int = 2048, level: int = 3, codec: JsonCodec | None = None):
+        super().__init__()
+        self.threshold = threshold
+        self.level = level
+        self.codec = codec
+
+    def process_bind_param(self, value: Any, dialect: sa.Dialect) -> bytes | None:
+        """Encode a document, compressed if it reaches the threshold."""
+        if value is None:
+            return None
+        data = self._codec(dialect).dumps(value).encode()
+        if len(data) < self.threshold:
+            return _RAW + data
+        codec, compressed = compress(data, self.level)
+        return _CODECS[codec] + compressed
+
+    def process_result_value(self, value: bytes | None, dialect: sa.Dialect) -> Any:
+        """Decode a stored document, whichever way it was stored."""
+        if value is None:
+            return None
+        header, data = value[:1], value[1:]
+        if header != _RAW:
+            if header not in _HEADERS:
+                raise ValueError(f"unknown CompressedJSON header {header!r}")
+            data = decompress(_HEADERS[header], data)
+        return self._codec(dialect).loads(data)
+
+    def _codec(self, dialect: sa.Dialect) -> JsonCodec:
+        if self.codec is not None:
+            return self.codec
+        # The serializers given to create_engine, as used by the JSON types of the dialects.
+        dumps = getattr(dialect, "_json_serializer", None)
+        loads = getattr(dialect, "_json_deserializer", None)
+        if dumps is None or loads is None:
+            return default_codec()
+        return JsonCodec("engine", dumps, loads)
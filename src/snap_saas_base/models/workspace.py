@@ -4,10 +4,10 @@ from typing import Any
 import sqlalchemy as sa
 import sqlalchemy.orm as so
 import uuid6
-from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 
 from snap_saas_base.models.base_model import AbstractModel
+from snap_saas_base.models.types import JSONB
 from snap_saas_base.models.user import User
 
 # https://github.com/sqlalchemy/sqlalchemy/discussions/6165
@@ -110,7 +110,7 @@ class WorkspaceMember(AbstractModel):
         sa.ForeignKey("workspaces.id", ondelete="CASCADE"), nullable=False
     )
     member_id: so.Mapped[str] = so.mapped_column(
-        sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+        sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True
     )
     role: so.Mapped[str] = so.mapped_column(nullable=False)
     workspace: so.Mapped[Workspace] = so.relationship("Workspace", uselist=False, lazy="raise")
@@ -174,7 +174,7 @@ class WorkspaceKv(AbstractModel):
 
     __tablename__ = "workspaces_kv"
     workspace_id: so.Mapped[str] = so.mapped_column(
-        sa.ForeignKey("workspaces.id", ondelete="CASCADE"), nullable=False
+        sa.ForeignKey("workspaces.id", ondelete="CASCADE"), nullable=False, index=True
     )
     workspace: so.Mapped[Workspace] = so.relationship("Workspace", uselist=False, lazy="raise")
     key: so.Mapped[str] = so.mapped_column(nullable=False)
@@ -0,0 +1,250 @@
+"""Chat schema."""
+
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from snap_saas_base.schemas.common import RawJson
+
+
+# Schemas
+class ChatBaseSchema(BaseModel):
+    """Chat fields set by the client."""
+
+    workspace_id: str = Field(
+        ...,
+        title="Workspace ID",
+        description="Workspace the chat belongs to.",
+        examples=["018e2a4c-8c2b-7f1e-9d6a-2b1c3d4e5f60"],
+    )
+    channel: str = Field(
+        ...,
+        title="Channel",
+        description="Channel the chat happens on.",
+        examples=["whatsapp"],
+    )
+    channel_plugin: str = Field(
+        ...,
+        title="Channel plugin",
+        description="Plugin handling the channel.",
+        examples=["twilio"],
+    )
+    channel_id: str = Field(
+        ...,
+        title="Channel ID",
+        description="Channel identifier.",
+    )
+    channel_session_id: str = Field(
+        ...,
+        title="Channel session ID",
+        description="Session identifier in the channel.",
+    )
+    channel_contact_uid: str = Field(
+        ...,
+        title="Contact UID",
+        description="Contact identifier in the channel.",
+        examples=["+5527999884321"],
+    )
+    subject: RawJson = Field(
+        ...,
+        title="Subject",
+        description="Who the chat is with.",
+        examples=[{"name": "John Doe"}],
+    )
+    agi_id: str = Field(
+        ...,
+        title="AGI ID",
+        description="Agent handling the chat.",
+    )
+    status: int = Field(
+        ...,
+        title="Status",
+        description="Chat status.",
+        examples=[1],
+    )
+    state: RawJson = Field(
+        ...,
+        title="State",
+        description="Conversation state.",
+    )
+    contact_id: str = Field(
+        ...,
+        title="Contact ID",
+        description="Contact the chat is with.",
+    )
+    handsoff: str | None = Field(
+        None,
+        title="Hands off",
+        description="Hands off target, when the chat is handed to a human.",
+    )
+    handsoff_config: str | None = Field(
+        None,
+        title="Hands off config",
+        description="Hands off configuration.",
+    )
+    handsoff_cid: str | None = Field(
+        None,
+        title="Hands off conversation ID",
+        description="Conversation identifier in the hands off target.",
+    )
+    handsoff_data: RawJson = Field(
+        ...,
+        title="Hands off data",
+        description="Hands off data.",
+    )
+    slots: RawJson = Field(
+        ...,
+        title="Slots",
+        description="Values collected during the conversation.",
+    )
+    session_metadata: RawJson = Field(
+        ...,
+        title="Session metadata",
+        description="Channel session metadata.",
+    )
+    history: RawJson = Field(
+        ...,
+        title="History",
+        description="Conversation history.",
+    )
+
+    model_config = ConfigDict(
+        from_attributes=True,
+    )
+
+
+class ChatSchema(ChatBaseSchema):
+    """A chat as stored, with its id, version and message activity."""
+
+    id: str = Field(
+        ...,
+        title="ID",
+        description="Unique ID.",
+        examples=["018e2a4c-8c2b-7f1e-9d6a-2b1c3d4e5f60"],
+    )
+    version_id: int = Field(
+        ...,
+        title="Version",
+        description="Row version, used for optimistic concurrency control.",
+        examples=[1],
+    )
+    message_count: int | None = Field(
+        None,
+        title="Message Count",
+        description="Number of messages of the chat, archived ones included.",
+        examples=[12],
+    )
+    last_message_at: datetime | None = Field(
+        None,
+        title="Last Message At",
+        description="Timestamp of the newest message.",
+        examples=["2022-08-02T09:48:54.000000"],
+    )
+    last_message_id: str | None = Field(
+        None,
+        title="Last Message ID",
+        description="ID of the newest message.",
+        examples=["018e2a4c-8c2b-7f1e-9d6a-2b1c3d4e5f60"],
+    )
+    deleted_at: datetime | None = Field(
+        None,
+        title="Deleted At",
+        description="Timestamp when this record was deleted.",
+    )
+    created_at: datetime | None = Field(
+        ...,
+        title="Create At",
+        description="Timestamp when this record was created.",
+        examples=["2021-03-02T13:28:54.589000"],
+    )
+    updated_at: datetime | None = Field(
+        ...,
+        title="Updated At",
+        description="Timestamp when this record was last updated.",
+        examples=["2022-08-02T09:48:54.000000"],
+    )
+
+
+class ChatMessageBaseSchema(BaseModel):
+    """Chat message fields set by the client."""
+
+    chat_id: str = Field(
+        ...,
+        title="Chat ID",
+        description="Chat the message belongs to.",
+    )
+    channel_message_id: str | None = Field(
+        None,
+        title="Channel message ID",
+        description="Message identifier in the channel.",
+    )
+    role: str = Field(
+        ...,
+        title="Role",
+        description="Author role.",
+        examples=["user"],
+    )
+    content_type: str = Field(
+        ...,
+        title="Content type",
+        description="Content type of the message.",
+        examples=["text/plain"],
+    )
+    content: str = Field(
+        ...,
+        title="Content",
+        description="Message content.",
+        examples=["Hello!"],
+    )
+    message_metadata: RawJson = Field(
+        ...,
+        title="Metadata",
+        description="Message metadata.",
+    )
+    rating: RawJson | None = Field(
+        None,
+        title="Rating",
+        description="Message rating.",
+    )
+
+    model_config = ConfigDict(
+        from_attributes=True,
+    )
+
+
+class ChatMessageSchema(ChatMessageBaseSchema):
+    """A chat message as stored."""
+
+    id: str = Field(
+        ...,
+        title="ID",
+        description="Unique ID.",
+        examples=["018e2a4c-8c2b-7f1e-9d6a-2b1c3d4e5f60"],
+    )
+    deleted_at: datetime | None = Field(
+        None,
+        title="Deleted At",
+        description="Timestamp when this record was deleted.",
+    )
+    created_at: datetime | None = Field(
+        ...,
+        title="Create At",
+        description="Timestamp when this record was created.",
+        examples=["2021-03-02T13:28:54.589000"],
+    )
+    updated_at: datetime | None = Field(
+        ...,
+        title="Updated At",
+        description="Timestamp when this record was last updated.",
+        examples=["2022-08-02T09:48:54.000000"],
+    )
+
+
+class ChatWithMessagesSchema(ChatSchema):
+    """A chat with its loaded messages."""
+
+    messages: list[ChatMessageSchema] = Field(
+        ...,
+        title="Messages",
+        description="Chat messages. Load them with a loader profile, e.g. chat_with_last_messages.",
+    )
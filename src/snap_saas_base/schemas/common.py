@@ -0,0 +1,69 @@
+"""Shared schema types and fast JSON serializers."""
+
+from collections.abc import Iterable
+from functools import cache
+from typing import Any
+
+from pydantic import BaseModel, SkipValidation, TypeAdapter
+
+# JSONB columns are already decoded by the database driver, and are encoded again when the
+# schema is dumped to JSON. Skipping validation only saves walking and copying the decoded value
+# in between, pydantic-core encodes it as it is.
+RawJson = SkipValidation[dict[str, Any]]
+
+
+@cache
+def list_adapter(schema: type[BaseModel]) -> TypeAdapter:
+    """Return a cached ``TypeAdapter`` for a list of a schema.
+
+    Parameters
+    ----------
+    schema : type[BaseModel]
+        The item schema.
+
+    Returns
+    -------
+    TypeAdapter
+        The adapter for ``list[schema]``, built once per schema.
+    """
+    return TypeAdapter(list[schema])  # type: ignore[valid-type]
+
+
+def row_to_json(schema: type[BaseModel], row: Any) -> bytes:
+    """Serialize a model instance or row to JSON through a schema.
+
+    Parameters
+    ----------
+    schema : type[BaseModel]
+        A schema with ``from_attributes`` enabled.
+    row : Any
+        The object to serialize, e.g. a `Chat` instance.
+
+    Returns
+    -------
+    bytes
+        The JSON document.
+    """
+    return schema.__pydantic_serializer__.to_json(schema.model_validate(row))
+
+
+def rows_to_json(schema: type[BaseModel], rows: Iterable[Any]) -> bytes:
+    """Serialize model instances or rows to a JSON array through a schema.
+
+    Validation and encoding both run in pydantic-core, in one pass each over the rows, instead
+    of building an intermediate ``as_dict`` per row and encoding it with ``json.dumps``.
+
+    Parameters
+    ----------
+    schema : type[BaseModel]
+        A schema with ``from_attributes`` enabled.
+    rows : Iterable[Any]
+        The objects to serialize.
+
+    Returns
+    -------
+    bytes
+        The JSON array.
+    """
+    adapter = list_adapter(schema)
+    return adapter.dump_json(adapter.validate_python(list(rows), from_attributes=True))
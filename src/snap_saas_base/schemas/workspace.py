@@ -0,0 +1,309 @@
+"""Workspace schema."""
+
+from collections.abc import Iterable
+from datetime import datetime
+from typing import Any
+
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, field_serializer
+
+from snap_saas_base.schemas.common import RawJson, row_to_json, rows_to_json
+
+
+# Schemas
+class WorkspaceBaseSchema(BaseModel):
+    """Workspace fields set by the client."""
+
+    name: str = Field(
+        ...,
+        title="Name",
+        description="Workspace name.",
+        examples=["Support"],
+    )
+    slug: str = Field(
+        ...,
+        title="Slug",
+        description="Workspace slug, unique in the organization.",
+        examples=["support"],
+    )
+    bucket: str | None = Field(
+        None,
+        title="Bucket",
+        description="Storage bucket of the workspace.",
+    )
+    org_id: str = Field(
+        ...,
+        title="Organization ID",
+        description="Organization the workspace belongs to.",
+    )
+
+    model_config = ConfigDict(
+        from_attributes=True,
+    )
+
+
+class WorkspaceSchema(WorkspaceBaseSchema):
+    """A workspace as stored."""
+
+    id: str = Field(
+        ...,
+        title="ID",
+        description="Unique ID.",
+        examples=["018e2a4c-8c2b-7f1e-9d6a-2b1c3d4e5f60"],
+    )
+    created_at: datetime | None = Field(
+        ...,
+        title="Create At",
+        description="Timestamp when this record was created.",
+        examples=["2021-03-02T13:28:54.589000"],
+    )
+    updated_at: datetime | None = Field(
+        ...,
+        title="Updated At",
+        description="Timestamp when this record was last updated.",
+        examples=["2022-08-02T09:48:54.000000"],
+    )
+
+
+class WorkspaceApiKeyBaseSchema(BaseModel):
+    """Workspace API key fields set by the client."""
+
+    workspace_id: str = Field(
+        ...,
+        title="Workspace ID",
+        description="Workspace the API key belongs to.",
+    )
+    member_id: str = Field(
+        ...,
+        title="Member ID",
+        description="Workspace member the API key acts for.",
+    )
+    type: str = Field(
+        ...,
+        title="Type",
+        description="API key type.",
+    )
+    label: str = Field(
+        ...,
+        title="Label",
+        description="API key label.",
+        examples=["CRM integration"],
+    )
+    value: RawJson = Field(
+        ...,
+        title="Value",
+        description="Data associated with the API key.",
+    )
+    role: str = Field(
+        ...,
+        title="Role",
+        description="Role granted to the API key.",
+        examples=["member"],
+    )
+    active: bool = Field(
+        True,
+        title="Active",
+        description="API key active.",
+        examples=[True],
+    )
+
+    model_config = ConfigDict(
+        from_attributes=True,
+    )
+
+
+class WorkspaceApiKeySchema(WorkspaceApiKeyBaseSchema):
+    """A workspace API key as stored."""
+
+    id: str = Field(
+        ...,
+        title="ID",
+        description="Unique ID.",
+        examples=["018e2a4c-8c2b-7f1e-9d6a-2b1c3d4e5f60"],
+    )
+    key: str = Field(
+        ...,
+        title="Key",
+        description="The API key.",
+        repr=False,
+    )
+    created_at: datetime | None = Field(
+        ...,
+        title="Create At",
+        description="Timestamp when this record was created.",
+        examples=["2021-03-02T13:28:54.589000"],
+    )
+    updated_at: datetime | None = Field(
+        ...,
+        title="Updated At",
+        description="Timestamp when this record was last updated.",
+        examples=["2022-08-02T09:48:54.000000"],
+    )
+
+
+class WorkspaceMetricBaseSchema(BaseModel):
+    """Workspace metric fields set by the client."""
+
+    workspace_id: str = Field(
+        ...,
+        title="Workspace ID",
+        description="Workspace the metric belongs to.",
+    )
+    specversion: str = Field(
+        "1.0",
+        title="Spec version",
+        description="CloudEvents specification version.",
+        examples=["1.0"],
+    )
+    type: str = Field(
+        ...,
+        title="Type",
+        description="Metric type.",
+        examples=["chat.message.created"],
+    )
+    event_id: str = Field(
+        ...,
+        title="Event ID",
+        description="Event identifier, unique per workspace and source.",
+    )
+    time: datetime = Field(
+        ...,
+        title="Time",
+        description="Time the metric was recorded, in UTC.",
+        examples=["2024-03-02T13:28:54.589000"],
+    )
+    source: str = Field(
+        ...,
+        title="Source",
+        description="Source of the metric.",
+        examples=["/workspaces/support/chats"],
+    )
+    subject: str = Field(
+        ...,
+        title="Subject",
+        description="Subject of the metric.",
+    )
+    data: RawJson = Field(
+        ...,
+        title="Data",
+        description="Metric data.",
+    )
+
+    model_config = ConfigDict(
+        from_attributes=True,
+    )
+
+
+class WorkspaceMetricSchema(WorkspaceMetricBaseSchema):
+    """A workspace metric as stored."""
+
+    id: str = Field(
+        ...,
+        title="ID",
+        description="Unique ID.",
+        examples=["018e2a4c-8c2b-7f1e-9d6a-2b1c3d4e5f60"],
+    )
+    created_at: datetime | None = Field(
+        ...,
+        title="Create At",
+        description="Timestamp when this record was created.",
+        examples=["2021-03-02T13:28:54.589000"],
+    )
+    updated_at: datetime | None = Field(
+        ...,
+        title="Updated At",
+        description="Timestamp when this record was last updated.",
+        examples=["2022-08-02T09:48:54.000000"],
+    )
+
+
+class WorkspaceMetricCloudEventSchema(BaseModel):
+    """A workspace metric in the CloudEvents JSON format."""
+
+    specversion: str = Field(
+        "1.0",
+        title="Spec version",
+        description="CloudEvents specification version.",
+    )
+    id: str = Field(
+        ...,
+        title="ID",
+        description="Event identifier, read from the metric event_id.",
+        validation_alias=AliasChoices("event_id", "id"),
+    )
+    source: str = Field(
+        ...,
+        title="Source",
+        description="Source of the event.",
+    )
+    type: str = Field(
+        ...,
+        title="Type",
+        description="Event type.",
+    )
+    subject: str = Field(
+        ...,
+        title="Subject",
+        description="Subject of the event.",
+    )
+    time: datetime = Field(
+        ...,
+        title="Time",
+        description="Time the event happened.",
+    )
+    datacontenttype: str = Field(
+        "application/json",
+        title="Data content type",
+        description="Content type of the event data.",
+    )
+    workspaceid: str = Field(
+        ...,
+        title="Workspace ID",
+        description="Extension attribute with the workspace the event belongs to.",
+        validation_alias=AliasChoices("workspace_id", "workspaceid"),
+    )
+    data: RawJson = Field(
+        ...,
+        title="Data",
+        description="Event data.",
+    )
+
+    model_config = ConfigDict(
+        from_attributes=True,
+    )
+
+    @field_serializer("time")
+    def serialize_time(self, value: datetime) -> str:
+        """Serialize naive timestamps, stored in UTC, as RFC 3339 UTC timestamps."""
+        return value.isoformat() + "Z" if value.tzinfo is None else value.isoformat()
+
+
+def metric_to_cloudevent(metric: Any) -> bytes:
+    """Serialize a workspace metric as a structured mode CloudEvent.
+
+    Parameters
+    ----------
+    metric : Any
+        A `WorkspaceMetric` instance or row.
+
+    Returns
+    -------
+    bytes
+        The ``application/cloudevents+json`` document.
+    """
+    return row_to_json(WorkspaceMetricCloudEventSchema, metric)
+
+
+def metrics_to_cloudevents(metrics: Iterable[Any]) -> bytes:
+    """Serialize workspace metrics as a batched mode CloudEvents array.
+
+    Parameters
+    ----------
+    metrics : Iterable[Any]
+        `WorkspaceMetric` instances or rows.
+
+    Returns
+    -------
+    bytes
+        The ``application/cloudevents-batch+json`` document.
+    """
+    return rows_to_json(WorkspaceMetricCloudEventSchema, metrics)
@@ -0,0 +1 @@
+"""Snap SAAS Base services package."""
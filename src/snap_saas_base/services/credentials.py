@@ -0,0 +1,324 @@
+"""Password hashing off the event loop.
+
+Hashing or verifying a password on purpose costs tens to hundreds of milliseconds of CPU. Done on
+the event loop, every login stalls all the other requests of the process. `CredentialService`
+runs the work in a bounded executor, a thread pool by default since both bcrypt and
+``hashlib.pbkdf2_hmac`` release the GIL, and awaits it.
+
+The number of hashes in flight, running or queued, is capped. Past the cap the service raises
+`CredentialsOverloadedError` right away, which callers turn into a ``503``, rather than queueing
+logins that would time out anyway while holding their connections, e.g. during a login storm
+after a deploy.
+
+Hashes record their algorithm and cost. When a password verifies against a hash made with other
+parameters, e.g. after raising the cost, the service returns a new hash for the caller to store,
+so hashes are upgraded as users log in.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import importlib
+import secrets
+from collections.abc import Sequence
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, NamedTuple, Protocol
+
+from snap_saas_base.models.user import User
+
+_MIN_BCRYPT_ROUNDS = 4
+_MAX_BCRYPT_ROUNDS = 31
+
+
+class PasswordHasher(Protocol):
+    """Hashes and verifies passwords with one algorithm."""
+
+    def identify(self, hashed: str) -> bool:
+        """Return whether a hash was made with this algorithm."""
+
+    def hash(self, password: str) -> str:
+        """Return the hash of a password, with a new salt."""
+
+    def verify(self, password: str, hashed: str) -> bool:
+        """Return whether a password matches a hash."""
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Return whether a hash of this algorithm was made with other parameters."""
+
+
+class BcryptHasher:
+    """bcrypt hashes, e.g. ``$2b$12$...``. Needs ``snap-saas-base[bcrypt]``.
+
+    Parameters
+    ----------
+    rounds : int, optional
+        The log2 cost factor.
+    """
+
+    prefixes = ("$2a$", "$2b$", "$2y$")
+
+    def __init__(self, rounds: int = 12):
+        if not _MIN_BCRYPT_ROUNDS <= rounds <= _MAX_BCRYPT_ROUNDS:
+            raise ValueError(
+                f"bcrypt rounds must be between {_MIN_BCRYPT_ROUNDS} and {_MAX_BCRYPT_ROUNDS}"
+            )
+        self.rounds = rounds
+
+    def identify(self, hashed: str) -> bool:
+        """Return whether a hash is a bcrypt hash."""
+        return hashed.startswith(self.prefixes)
+
+    def hash(self, password: str) -> str:
+        """Return the bcrypt hash of a password, with a new salt."""
+        bcrypt = _bcrypt()
+        return bcrypt.hashpw(_bcrypt_secret(password), bcrypt.gensalt(self.rounds)).decode()
+
+    def verify(self, password: str, hashed: str) -> bool:
+        """Return whether a password matches a bcrypt hash."""
+        try:
+            return _bcrypt().checkpw(_bcrypt_secret(password), hashed.encode())
+        except ValueError:
+            return False
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Return whether a bcrypt hash has another version or cost."""
+        return not hashed.startswith(f"$2b${self.rounds:02d}$")
+
+
+class Pbkdf2Hasher:
+    """PBKDF2-HMAC-SHA256 hashes, ``$pbkdf2-sha256$<iterations>$<salt>$<hash>``.
+
+    Only needs the standard library.
+
+    Parameters
+    ----------
+    iterations : int, optional
+        The number of iterations.
+    """
+
+    prefix = "$pbkdf2-sha256$"
+
+    def __init__(self, iterations: int = 600_000):
+        if iterations < 1:
+            raise ValueError("iterations must be positive")
+        self.iterations = iterations
+
+    def identify(self, hashed: str) -> bool:
+        """Return whether a hash is a PBKDF2-HMAC-SHA256 hash."""
+        return hashed.startswith(self.prefix)
+
+    def hash(self, password: str) -> str:
+        """Return the PBKDF2 hash of a password, with a new salt."""
+        salt = secrets.token_bytes(16)
+        key = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, self.iterations)
+        return f"{self.prefix}{self.iterations}${_b64encode(salt)}${_b64encode(key)}"
+
+    def verify(self, password: str, hashed: str) -> bool:
+        """Return whether a password matches a PBKDF2 hash."""
+        try:
+            iterations, salt, key = hashed[len(self.prefix) :].split("$")
+            expected = _b64decode(key)
+            actual = hashlib.pbkdf2_hmac(
+                "sha256", password.encode(), _b64decode(salt), int(iterations)
+            )
+        except ValueError:
+            return False
+        return hmac.compare_digest(actual, expected)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Return whether a PBKDF2 hash has another number of iterations."""
+        return not hashed.startswith(f"{self.prefix}{self.iterations}$")
+
+
+class VerifyResult(NamedTuple):
+    """The outcome of a password verification.
+
+    Attributes
+    ----------
+    valid : bool
+        Whether the password matches.
+    new_hash : str, optional
+        A hash of the password with the current parameters, to store instead of the verified
+        one. None if the password is invalid or the hash is up to date.
+    """
+
+    valid: bool
+    new_hash: str | None = None
+
+
+class CredentialsOverloadedError(RuntimeError):
+    """Raised when too many hashes are in flight to accept another one.
+
+    Attributes
+    ----------
+    limit : int
+        The maximum number of hashes in flight.
+    """
+
+    def __init__(self, limit: int):
+        super().__init__(f"more than {limit} password hashes in flight")
+        self.limit = limit
+
+
+class CredentialService:
+    """Hashes and verifies passwords in a bounded executor.
+
+    Use a service from a single event loop.
+
+    Parameters
+    ----------
+    hasher : PasswordHasher, optional
+        Hashes new passwords. Defaults to a `BcryptHasher` when bcrypt is installed, a
+        `Pbkdf2Hasher` otherwise.
+    legacy : Sequence[PasswordHasher], optional
+        Other algorithms that stored hashes may use. Their hashes still verify and are
+        replaced with a hash of ``hasher`` on success.
+    max_workers : int, optional
+        Number of hashes computed at a time, by the thread pool the service creates.
+    max_pending : int, optional
+        Number of hashes in flight, computed or queued, before the service sheds load.
+    executor : Executor, optional
+        Run the hashes in this executor, e.g. a ``ProcessPoolExecutor``, instead of a thread
+        pool of ``max_workers`` threads. The service doesn't shut it down.
+
+    Attributes
+    ----------
+    shed : int
+        Number of requests rejected with `CredentialsOverloadedError`.
+    rehashed : int
+        Number of new hashes returned by verifications.
+    """
+
+    def __init__(
+        self,
+        hasher: PasswordHasher | None = None,
+        legacy: Sequence[PasswordHasher] = (),
+        max_workers: int = 4,
+        max_pending: int = 64,
+        executor: Executor | None = None,
+    ):
+        if max_pending < 1:
+            raise ValueError("max_pending must be positive")
+        if hasher is None:
+            hasher = BcryptHasher() if _bcrypt(required=False) else Pbkdf2Hasher()
+        self.hasher = hasher
+        self.hashers = (hasher, *legacy)
+        self.max_pending = max_pending
+        self.shed = 0
+        self.rehashed = 0
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers, thread_name_prefix="credentials"
+        )
+        self._pending = 0
+        self._dummy_hash: str | None = None
+
+    async def hash_password(self, password: str) -> str:
+        """Return the hash of a password to store, e.g. in `User.password`.
+
+        Raises
+        ------
+        CredentialsOverloadedError
+            If too many hashes are in flight.
+        """
+        return await self._run(self.hasher.hash, password)
+
+    async def verify_password(self, password: str, hashed: str | None) -> VerifyResult:
+        """Verify a password against a stored hash.
+
+        A missing or unrecognized hash fails after as long as a real verification, so the
+        response time doesn't tell which users exist.
+
+        Parameters
+        ----------
+        password : str
+            The password to check.
+        hashed : str, optional
+            The stored hash.
+
+        Returns
+        -------
+        VerifyResult
+            Whether the password matches, and its new hash when the stored one is outdated.
+
+        Raises
+        ------
+        CredentialsOverloadedError
+            If too many hashes are in flight.
+        """
+        hasher = next((h for h in self.hashers if hashed and h.identify(hashed)), None)
+        if hasher is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = await self._run(self.hasher.hash, secrets.token_hex())
+            await self._run(self.hasher.verify, password, self._dummy_hash)
+            return VerifyResult(False)
+        assert hashed is not None
+        if not await self._run(hasher.verify, password, hashed):
+            return VerifyResult(False)
+        if hasher is self.hasher and not hasher.needs_rehash(hashed):
+            return VerifyResult(True)
+        new_hash = await self._run(self.hasher.hash, password)
+        self.rehashed += 1
+        return VerifyResult(True, new_hash)
+
+    async def authenticate(self, user: User | None, password: str) -> bool:
+        """Verify the password of a user, upgrading their stored hash when it is outdated.
+
+        The new hash is set on ``user.password``; the caller commits it with the session, as
+        it does for the last login time.
+
+        Parameters
+        ----------
+        user : User, optional
+            The user, None if no user matched the login.
+        password : str
+            The password to check.
+
+        Returns
+        -------
+        bool
+            Whether the password matches.
+        """
+        result = await self.verify_password(password, user.password if user else None)
+        if result.new_hash is not None and user is not None:
+            user.password = result.new_hash
+        return result.valid
+
+    def close(self) -> None:
+        """Shut down the thread pool the service created."""
+        if self._owns_executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, func: Any, *args: Any) -> Any:
+        if self._pending >= self.max_pending:
+            self.shed += 1
+            raise CredentialsOverloadedError(self.max_pending)
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+
+
+def _bcrypt_secret(password: str) -> bytes:
+    # bcrypt only uses the first 72 bytes. Older bcrypt releases truncated silently, newer ones
+    # raise, so truncate to keep verifying the hashes made by either.
+    return password.encode()[:72]
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode().rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def _bcrypt(required: bool = True) -> Any:
+    try:
+        return importlib.import_module("bcrypt")
+    except ImportError as e:  # pragma: no cover
+        if not required:
+            return None
+        raise ImportError("bcrypt hashes need bcrypt, install snap-saas-base[bcrypt]") from e
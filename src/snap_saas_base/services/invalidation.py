@@ -0,0 +1,350 @@
+"""Cross-process invalidation of the caches in front of the models.
+
+Process-local caches, such as the `WorkspaceResolver` entries or API keys and workspace KV
+values, don't see the commits of other processes. `InvalidationBus.watch` registers session hooks
+that turn the committed changes of the watched models into compact `Invalidation` messages,
+``(table, id, workspace_id)``, and publish them through a backend. Every process runs the bus
+listener and passes the messages it receives to the subscribed callbacks, which evict the
+matching entries.
+
+- `PostgresBackend` sends the messages with ``NOTIFY`` in the transaction that made the changes,
+  so PostgreSQL delivers them if and only if it commits, and listens with a dedicated asyncpg
+  connection. Needs ``snap-saas-base[invalidation]``.
+- `InMemoryBackend` delivers the messages after the commit to the buses of the same process,
+  e.g. the buses standing in for several processes in tests.
+
+The committing process dispatches its own messages right after the commit, without waiting for
+the backend. A listener that loses its connection may miss messages, so after reconnecting it
+calls the ``on_reset`` callbacks, which should clear their caches.
+"""
+
+import asyncio
+import contextlib
+import importlib
+import json
+import logging
+import uuid
+from collections.abc import Callable, Iterable, Sequence
+from typing import Any, NamedTuple, Protocol
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+from snap_saas_base.models.organization import Organization, OrgMember
+from snap_saas_base.models.workspace import (
+    Workspace,
+    WorkspaceApiKey,
+    WorkspaceKv,
+    WorkspaceMember,
+)
+
+logger = logging.getLogger(__name__)
+
+INVALIDATIONS_KEY = "bus_invalidations"
+
+# The models cached by the services, e.g. API keys checked on every request.
+DEFAULT_MODELS = (Organization, OrgMember, Workspace, WorkspaceApiKey, WorkspaceKv, WorkspaceMember)
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more.
+MAX_PAYLOAD = 7900
+
+
+class Invalidation(NamedTuple):
+    """A changed row.
+
+    Attributes
+    ----------
+    table : str
+        The table of the row.
+    id : str
+        The row id.
+    workspace_id : str, optional
+        The workspace of the row, its own id for a `Workspace`, None for rows outside a workspace.
+    """
+
+    table: str
+    id: str
+    workspace_id: str | None = None
+
+    @classmethod
+    def of(cls, obj: Any) -> "Invalidation":
+        """Return the invalidation of a model instance."""
+        workspace_id = obj.id if isinstance(obj, Workspace) else getattr(obj, "workspace_id", None)
+        return cls(obj.__tablename__, obj.id, workspace_id)
+
+
+Subscriber = Callable[[list[Invalidation]], None]
+
+
+class InvalidationBackend(Protocol):
+    """Carries invalidation payloads between processes."""
+
+    def prepare(self, connection: sa.Connection, payload: str) -> None:
+        """Prepare a payload in the transaction that made the changes, e.g. to ``NOTIFY``."""
+
+    def commit(self, payload: str) -> None:
+        """Send a payload after the transaction that made the changes committed."""
+
+    async def listen(
+        self, receive: Callable[[str], None], reset: Callable[[], None]
+    ) -> None:  # pragma: no cover
+        """Call ``receive`` with the payloads of every process until cancelled.
+
+        Calls ``reset`` when payloads may have been missed.
+        """
+
+
+class InMemoryBackend:
+    """Delivers payloads after the commit to the listening buses of this process."""
+
+    def __init__(self) -> None:
+        self._receivers: list[Callable[[str], None]] = []
+
+    def prepare(self, connection: sa.Connection, payload: str) -> None:
+        """Do nothing, the payload is delivered after the commit."""
+
+    def commit(self, payload: str) -> None:
+        """Deliver a payload to the listening buses."""
+        for receive in list(self._receivers):
+            receive(payload)
+
+    async def listen(self, receive: Callable[[str], None], reset: Callable[[], None]) -> None:
+        """Receive the committed payloads until cancelled."""
+        self._receivers.append(receive)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            self._receivers.remove(receive)
+
+
+class PostgresBackend:
+    """Sends payloads with ``NOTIFY`` and receives them with ``LISTEN``.
+
+    Parameters
+    ----------
+    url : str
+        The database URL of the listener connection, e.g. the application's database URL.
+    channel : str, optional
+        The notification channel.
+    reconnect_delay : float, optional
+        Seconds to wait before reconnecting a lost listener connection.
+    """
+
+    def __init__(self, url: str, channel: str = "cache_invalidation", reconnect_delay: float = 1.0):
+        # asyncpg only understands plain postgresql:// URLs.
+        self.dsn = (
+            sa.make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        )
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+
+    def prepare(self, connection: sa.Connection, payload: str) -> None:
+        """Send a payload with ``NOTIFY``, delivered if the transaction commits."""
+        connection.execute(sa.select(sa.func.pg_notify(self.channel, payload)))
+
+    def commit(self, payload: str) -> None:
+        """Do nothing, PostgreSQL delivers the payload on commit."""
+
+    async def listen(self, receive: Callable[[str], None], reset: Callable[[], None]) -> None:
+        """Receive the notifications until cancelled, reconnecting when the connection is lost."""
+        asyncpg = _asyncpg()
+        connected = False
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _, lost=lost: lost.set())
+                await connection.add_listener(
+                    self.channel, lambda _connection, _pid, _channel, payload: receive(payload)
+                )
+                if connected:
+                    reset()
+                connected = True
+                await lost.wait()
+                logger.warning("invalidation listener lost its connection")
+            except Exception as e:
+                # Retry on any failure, rather than let the listener task die silently.
+                logger.warning("invalidation listener failed, reconnecting: %s", e)
+            finally:
+                if connection is not None and not connection.is_closed():
+                    with contextlib.suppress(Exception):
+                        await connection.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+
+class InvalidationBus:
+    """Publishes the committed changes of models and dispatches those of every process.
+
+    Parameters
+    ----------
+    backend : InvalidationBackend
+        Carries the messages between processes.
+    models : Sequence[type], optional
+        The models whose changes are published.
+
+    Attributes
+    ----------
+    published : int
+        Number of messages published by this process.
+    received : int
+        Number of messages received from other processes.
+    """
+
+    def __init__(self, backend: InvalidationBackend, models: Sequence[type] = DEFAULT_MODELS):
+        self.backend = backend
+        self.models = tuple(models)
+        self.origin = uuid.uuid4().hex
+        self.published = 0
+        self.received = 0
+        self._subscribers: list[Subscriber] = []
+        self._resets: list[Callable[[], None]] = []
+        self._watched: list[Any] = []
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self, callback: Subscriber, on_reset: Callable[[], None] | None = None) -> None:
+        """Call ``callback`` with the invalidations of every process.
+
+        Parameters
+        ----------
+        callback : Subscriber
+            Called with a list of invalidations, e.g. `WorkspaceResolver.on_invalidations`.
+        on_reset : Callable[[], None], optional
+            Called when invalidations may have been missed, to clear the cache.
+        """
+        self._subscribers.append(callback)
+        if on_reset is not None:
+            self._resets.append(on_reset)
+
+    def publish(self, session: so.Session, invalidations: Iterable[Invalidation]) -> None:
+        """Publish invalidations with the current transaction of a session.
+
+        For changes the session hooks don't see, e.g. those of Core ``UPDATE`` statements.
+        """
+        invalidations = list(invalidations)
+        if invalidations:
+            self._prepare(session, invalidations)
+
+    def watch(self, target: Any = so.Session) -> None:
+        """Publish the changes of the watched models committed by a session class.
+
+        Parameters
+        ----------
+        target : Any, optional
+            A ``Session`` class or ``sessionmaker``. The default watches every session,
+            including the sessions proxied by ``AsyncSession``.
+        """
+        sa.event.listen(target, "after_flush", self._after_flush)
+        sa.event.listen(target, "after_commit", self._after_commit)
+        sa.event.listen(target, "after_soft_rollback", self._after_soft_rollback)
+        self._watched.append(target)
+
+    def unwatch(self) -> None:
+        """Remove the session hooks registered by `watch`."""
+        for target in self._watched:
+            sa.event.remove(target, "after_flush", self._after_flush)
+            sa.event.remove(target, "after_commit", self._after_commit)
+            sa.event.remove(target, "after_soft_rollback", self._after_soft_rollback)
+        self._watched.clear()
+
+    def start(self) -> None:
+        """Start listening to the other processes in a task of the running event loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(
+                self.backend.listen(self._receive, self._reset)
+            )
+
+    async def stop(self) -> None:
+        """Stop listening."""
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def dispatch(self, invalidations: list[Invalidation]) -> None:
+        """Call the subscribers with invalidations, logging their errors."""
+        for callback in self._subscribers:
+            try:
+                callback(invalidations)
+            except Exception:
+                logger.exception("invalidation subscriber %r failed", callback)
+
+    def _after_flush(self, session: so.Session, flush_context: Any) -> None:
+        changed = [
+            obj
+            for obj in session.dirty
+            if isinstance(obj, self.models) and session.is_modified(obj, include_collections=False)
+        ]
+        changed.extend(
+            obj for obj in (*session.new, *session.deleted) if isinstance(obj, self.models)
+        )
+        invalidations = [Invalidation.of(obj) for obj in changed]
+        if invalidations:
+            self._prepare(session, invalidations)
+
+    def _prepare(self, session: so.Session, invalidations: list[Invalidation]) -> None:
+        session.info.setdefault(INVALIDATIONS_KEY, []).extend(invalidations)
+        connection = session.connection()
+        for payload in self._encode(invalidations):
+            self.backend.prepare(connection, payload)
+
+    def _after_commit(self, session: so.Session) -> None:
+        invalidations = list(dict.fromkeys(session.info.pop(INVALIDATIONS_KEY, ())))
+        if not invalidations:
+            return
+        self.published += len(invalidations)
+        self.dispatch(invalidations)
+        for payload in self._encode(invalidations):
+            self.backend.commit(payload)
+
+    def _after_soft_rollback(self, session: so.Session, previous_transaction: Any) -> None:
+        # The changes flushed before a rolled back savepoint are still committed later.
+        if not previous_transaction.nested and not session.in_transaction():
+            session.info.pop(INVALIDATIONS_KEY, None)
+
+    def _encode(self, invalidations: list[Invalidation]) -> list[str]:
+        payloads: list[str] = []
+        rows: list[Invalidation] = []
+        size = 0
+        for invalidation in dict.fromkeys(invalidations):
+            row_size = len(json.dumps(invalidation, separators=(",", ":"))) + 1
+            if rows and size + row_size > MAX_PAYLOAD - 64:
+                payloads.append(self._payload(rows))
+                rows, size = [], 0
+            rows.append(invalidation)
+            size += row_size
+        if rows:
+            payloads.append(self._payload(rows))
+        return payloads
+
+    def _payload(self, rows: list[Invalidation]) -> str:
+        return json.dumps({"o": self.origin, "m": rows}, separators=(",", ":"))
+
+    def _receive(self, payload: str) -> None:
+        try:
+            message = json.loads(payload)
+            if message["o"] == self.origin:
+                return
+            invalidations = [Invalidation(*row) for row in message["m"]]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("ignoring malformed invalidation payload %r", payload)
+            return
+        self.received += len(invalidations)
+        self.dispatch(invalidations)
+
+    def _reset(self) -> None:
+        for callback in self._resets:
+            try:
+                callback()
+            except Exception:
+                logger.exception("invalidation reset %r failed", callback)
+
+
+def _asyncpg() -> Any:
+    try:
+        return importlib.import_module("asyncpg")
+    except ImportError as e:  # pragma: no cover
+        raise ImportError(
+            "the invalidation listener needs asyncpg, install snap-saas-base[invalidation]"
+        ) from e
@@ -0,0 +1,526 @@
+"""Cached resolution of ``org_slug/workspace_slug`` URLs.
+
+`WorkspaceResolver` maps an organization slug and a workspace slug to the ids and buckets of the
+`Organization` and `Workspace` they name. Lookups go through three levels:
+
+1. `LocalCache`, an in-process LRU cache with a short time to live.
+2. An optional `SharedCache`, e.g. Redis or memcached, shared by every process.
+   `InMemorySharedCache` is a local stand-in for tests and single-process deployments.
+3. The database, with concurrent misses for the same slugs collapsed into a single query.
+
+Unknown slugs are cached locally for a few seconds too, so probing requests don't reach the
+database.
+
+The shared entries of an organization are versioned: their keys embed a random version stored
+under the organization slug, and invalidating the organization or any of its workspaces deletes
+that version. Every entry of the organization is then dropped at once, whichever process wrote
+it.
+
+`WorkspaceResolver.watch` registers session hooks that invalidate the cached entries after a
+commit changes the slugs, buckets or ``revoke_link`` of an organization or workspace. Other
+processes drop their local entries when the time to live expires, or right away when
+`WorkspaceResolver.on_invalidations` is subscribed to a
+`snap_saas_base.services.invalidation.InvalidationBus`.
+"""
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from functools import partial
+from typing import Any, NamedTuple, Protocol
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from snap_saas_base.models.organization import Organization
+from snap_saas_base.models.workspace import Workspace
+
+INVALIDATIONS_KEY = "resolver_invalidations"
+
+# Changes to these attributes alter a resolved workspace.
+_ORGANIZATION_ATTRIBUTES = ("slug", "bucket", "revoke_link")
+_WORKSPACE_ATTRIBUTES = ("slug", "bucket", "org_id")
+
+_MISSING = object()
+
+
+class _Unknown(NamedTuple):
+    # Local entry of slugs that named no workspace, valid until the next invalidation.
+    generation: int
+
+
+class ResolvedWorkspace(NamedTuple):
+    """The ids and buckets named by an ``org_slug/workspace_slug`` URL."""
+
+    org_id: str
+    org_slug: str
+    org_bucket: str
+    revoke_link: bool
+    workspace_id: str
+    workspace_slug: str
+    workspace_bucket: str | None
+
+    @property
+    def bucket(self) -> str:
+        """The workspace bucket, or the organization bucket if the workspace has none."""
+        return self.workspace_bucket or self.org_bucket
+
+
+class SharedCache(Protocol):
+    """A cache shared by every process, such as Redis or memcached."""
+
+    async def get(self, key: str) -> bytes | None:
+        """Return the value of a key, or None if it is missing or expired."""
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Store the value of a key for ``ttl`` seconds."""
+
+    async def delete(self, *keys: str) -> None:
+        """Remove keys."""
+
+
+class LocalCache:
+    """A thread-safe LRU cache whose entries expire.
+
+    Parameters
+    ----------
+    maxsize : int, optional
+        Maximum number of entries. The least recently used entries are evicted first.
+    ttl : float, optional
+        Seconds an entry stays valid.
+    clock : Callable[[], float], optional
+        Returns the current monotonic time in seconds.
+    """
+
+    def __init__(
+        self, maxsize: int = 10_000, ttl: float = 30.0, clock: Callable[[], float] = time.monotonic
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of entries, including the expired ones not removed yet."""
+        return len(self._entries)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Return the value of a key, or ``default`` if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= self.clock():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Any, value: Any, ttl: float | None = None) -> None:
+        """Store the value of a key, for ``ttl`` seconds if given."""
+        expires = self.clock() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys: Any) -> None:
+        """Remove keys."""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def pop_matching(self, predicate: Callable[[Any], bool]) -> list[Any]:
+        """Remove the entries whose value matches a predicate.
+
+        Scans every entry, so it suits rare operations such as invalidations.
+
+        Parameters
+        ----------
+        predicate : Callable[[Any], bool]
+            Returns whether a value is removed.
+
+        Returns
+        -------
+        list
+            The removed values.
+        """
+        with self._lock:
+            keys = [key for key, (_, value) in self._entries.items() if predicate(value)]
+            return [self._entries.pop(key)[1] for key in keys]
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+
+
+class InMemorySharedCache:
+    """A `SharedCache` kept in the memory of the current process.
+
+    Parameters
+    ----------
+    clock : Callable[[], float], optional
+        Returns the current monotonic time in seconds.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._entries: dict[str, tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> bytes | None:
+        """Return the value of a key, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self.clock():
+            self._entries.pop(key, None)
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Store the value of a key for ``ttl`` seconds."""
+        self._entries[key] = (self.clock() + ttl, value)
+
+    async def delete(self, *keys: str) -> None:
+        """Remove keys."""
+        for key in keys:
+            self._entries.pop(key, None)
+
+
+class WorkspaceResolver:
+    """Resolves ``org_slug/workspace_slug`` to a `ResolvedWorkspace` through the caches.
+
+    Parameters
+    ----------
+    session_factory : Callable[[], AsyncSession]
+        Returns a new session for each database lookup, e.g. an ``async_sessionmaker``.
+    shared : SharedCache, optional
+        The second-level cache. Without it, misses of the local cache go to the database.
+    maxsize : int, optional
+        Maximum number of entries in the local cache.
+    ttl : float, optional
+        Seconds an entry stays in the local cache. Bounds how long other processes, which
+        don't see this process' commits, keep a changed entry.
+    shared_ttl : float, optional
+        Seconds an entry stays in the shared cache. Organization versions stay ten times longer.
+    negative_ttl : float, optional
+        Seconds unknown slugs stay in the local cache. They share its ``maxsize``.
+    prefix : str, optional
+        Prefix of the shared cache keys.
+    clock : Callable[[], float], optional
+        Returns the current monotonic time in seconds.
+
+    Attributes
+    ----------
+    hits : int
+        Lookups answered by the local cache.
+    shared_hits : int
+        Lookups answered by the shared cache.
+    loads : int
+        Lookups answered by the database.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        session_factory: Callable[[], AsyncSession],
+        *,
+        shared: SharedCache | None = None,
+        maxsize: int = 10_000,
+        ttl: float = 30.0,
+        shared_ttl: float = 300.0,
+        negative_ttl: float = 5.0,
+        prefix: str = "resolver:",
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.session_factory = session_factory
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.negative_ttl = negative_ttl
+        self.prefix = prefix
+        self.local = LocalCache(maxsize, ttl, clock)
+        self.hits = 0
+        self.shared_hits = 0
+        self.loads = 0
+        self._inflight: dict[tuple[str, str], asyncio.Task] = {}
+        self._generation = 0
+        self._shared_deletes: set[str] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._watched: list[Any] = []
+
+    async def resolve(self, org_slug: str, workspace_slug: str) -> ResolvedWorkspace | None:
+        """Resolve the slugs of a workspace URL.
+
+        Parameters
+        ----------
+        org_slug : str
+            The `Organization` slug.
+        workspace_slug : str
+            The `Workspace` slug, unique within the organization.
+
+        Returns
+        -------
+        ResolvedWorkspace, optional
+            The resolved workspace, or None if the slugs don't name a workspace.
+        """
+        key = (org_slug, workspace_slug)
+        value = self.local.get(key, _MISSING)
+        if isinstance(value, _Unknown) and value.generation != self._generation:
+            value = _MISSING
+        if value is not _MISSING:
+            self.hits += 1
+            return None if isinstance(value, _Unknown) else value
+        # The lookup runs in its own task, so cancelling a caller doesn't fail the others.
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._fetch(key))
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._fetched, key))
+        return await asyncio.shield(task)
+
+    async def invalidate(
+        self,
+        org_ids: Iterable[str] = (),
+        workspace_ids: Iterable[str] = (),
+        org_slugs: Iterable[str] = (),
+    ) -> None:
+        """Remove the entries of organizations and workspaces from every cache level.
+
+        The organization slugs of the ids are read from the database, so the shared entries
+        written by every process are removed.
+
+        Parameters
+        ----------
+        org_ids : Iterable[str], optional
+            Ids of changed organizations. Removes the entries of all their workspaces.
+        workspace_ids : Iterable[str], optional
+            Ids of changed workspaces.
+        org_slugs : Iterable[str], optional
+            Former slugs of renamed organizations, whose shared entries are removed too.
+        """
+        org_ids, workspace_ids = set(org_ids), set(workspace_ids)
+        org_slugs = set(org_slugs)
+        if self.shared is not None and (org_ids or workspace_ids):
+            async with self.session_factory() as session:
+                org_slugs.update(await session.scalars(_org_slugs_query(org_ids, workspace_ids)))
+        self._invalidate(org_ids, workspace_ids, org_slugs)
+        await self._flush_shared_deletes()
+
+    def invalidate_local(
+        self, org_ids: Iterable[str] = (), workspace_ids: Iterable[str] = ()
+    ) -> None:
+        """Remove the entries of organizations and workspaces from the local cache.
+
+        The shared entries of the organizations of the removed entries are removed too, by the
+        next lookup or `invalidate`, or right away when called from a running event loop.
+
+        See `invalidate`.
+        """
+        self._invalidate(set(org_ids), set(workspace_ids), set())
+
+    def on_invalidations(self, invalidations: Iterable[Any]) -> None:
+        """Remove the local entries of the organizations and workspaces of invalidations.
+
+        Subscribe it, with `clear_local` as reset, to an ``InvalidationBus`` to see the commits
+        of the other processes::
+
+            bus.subscribe(resolver.on_invalidations, resolver.clear_local)
+
+        Parameters
+        ----------
+        invalidations : Iterable[Invalidation]
+            The ``(table, id, workspace_id)`` of changed rows.
+        """
+        org_ids = set()
+        workspace_ids = set()
+        for table, row_id, _ in invalidations:
+            if table == Organization.__tablename__:
+                org_ids.add(row_id)
+            elif table == Workspace.__tablename__:
+                workspace_ids.add(row_id)
+        if org_ids or workspace_ids:
+            self.invalidate_local(org_ids, workspace_ids)
+
+    def clear_local(self) -> None:
+        """Remove every entry from the local cache."""
+        self.local.clear()
+        self._invalidate(set(), set(), set())
+
+    def _invalidate(self, org_ids: set[str], workspace_ids: set[str], org_slugs: set[str]) -> None:
+        removed = self.local.pop_matching(
+            lambda value: isinstance(value, ResolvedWorkspace)
+            and (value.org_id in org_ids or value.workspace_id in workspace_ids)
+        )
+        # Lookups that started before are not stored, and the slugs cached as unknown are
+        # dropped: a new or renamed organization or workspace may match them.
+        self._generation += 1
+        self._inflight.clear()
+        if self.shared is None:
+            return
+        org_slugs |= {value.org_slug for value in removed}
+        self._shared_deletes.update(self._version_key(slug) for slug in org_slugs)
+        if not self._shared_deletes:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._flush_shared_deletes())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def watch(self, target: Any = so.Session) -> None:
+        """Invalidate the cached entries changed by the commits of a session class.
+
+        Parameters
+        ----------
+        target : Any, optional
+            A ``Session`` class or ``sessionmaker``. The default watches every session,
+            including the sessions proxied by ``AsyncSession``.
+
+        Notes
+        -----
+        Only changes made through the unit of work are seen. Callers changing slugs with
+        ORM-enabled or Core ``UPDATE`` statements must call `invalidate` themselves.
+        """
+        sa.event.listen(target, "after_flush", self._after_flush)
+        sa.event.listen(target, "after_commit", self._after_commit)
+        sa.event.listen(target, "after_soft_rollback", self._after_soft_rollback)
+        self._watched.append(target)
+
+    def unwatch(self) -> None:
+        """Remove the session hooks registered by `watch`."""
+        for target in self._watched:
+            sa.event.remove(target, "after_flush", self._after_flush)
+            sa.event.remove(target, "after_commit", self._after_commit)
+            sa.event.remove(target, "after_soft_rollback", self._after_soft_rollback)
+        self._watched.clear()
+
+    async def _fetch(self, key: tuple[str, str]) -> ResolvedWorkspace | None:
+        await self._flush_shared_deletes()
+        generation = self._generation
+        shared, shared_key = self.shared, ""
+        if shared is not None:
+            # Read before the database, so a concurrent invalidation orphans what we write.
+            shared_key = await self._shared_key(shared, key)
+            cached = await shared.get(shared_key)
+            if cached is not None:
+                self.shared_hits += 1
+                resolved = ResolvedWorkspace(*json.loads(cached))
+                self._store(key, resolved, generation)
+                return resolved
+        self.loads += 1
+        async with self.session_factory() as session:
+            row = (await session.execute(_resolve_query(*key))).first()
+        value = ResolvedWorkspace(*row) if row is not None else None
+        if value is not None and shared is not None and generation == self._generation:
+            await shared.set(shared_key, json.dumps(value).encode(), self.shared_ttl)
+        self._store(key, value, generation)
+        return value
+
+    def _fetched(self, key: tuple[str, str], task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every caller was cancelled.
+            task.exception()
+
+    def _store(
+        self, key: tuple[str, str], value: ResolvedWorkspace | None, generation: int
+    ) -> None:
+        # A lookup that raced with an invalidation may have read the old row.
+        if generation != self._generation:
+            return
+        if value is None:
+            self.local.set(key, _Unknown(generation), self.negative_ttl)
+            return
+        self.local.set(key, value)
+
+    async def _flush_shared_deletes(self) -> None:
+        if self.shared is None or not self._shared_deletes:
+            return
+        keys, self._shared_deletes = self._shared_deletes, set()
+        try:
+            await self.shared.delete(*keys)
+        except BaseException:
+            self._shared_deletes |= keys
+            raise
+
+    async def _shared_key(self, shared: SharedCache, key: tuple[str, str]) -> str:
+        version_key = self._version_key(key[0])
+        version = await shared.get(version_key)
+        if version is None:
+            version = uuid.uuid4().hex.encode()
+            await shared.set(version_key, version, self.shared_ttl * 10)
+        return f"{self.prefix}{key[0]}/{version.decode()}/{key[1]}"
+
+    def _version_key(self, org_slug: str) -> str:
+        return f"{self.prefix}version:{org_slug}"
+
+    def _after_flush(self, session: so.Session, flush_context: Any) -> None:
+        org_ids, workspace_ids, org_slugs = session.info.setdefault(
+            INVALIDATIONS_KEY, (set(), set(), set())
+        )
+        workspace_org_ids = set()
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if isinstance(obj, Organization) and _changed(obj, _ORGANIZATION_ATTRIBUTES):
+                org_ids.add(obj.id)
+                org_slugs |= _values(obj, "slug")
+            elif isinstance(obj, Workspace) and _changed(obj, _WORKSPACE_ATTRIBUTES):
+                workspace_ids.add(obj.id)
+                workspace_org_ids |= _values(obj, "org_id")
+        if self.shared is not None and workspace_org_ids:
+            org_slugs.update(session.scalars(_org_slugs_query(workspace_org_ids, ())))
+
+    def _after_commit(self, session: so.Session) -> None:
+        changes = session.info.pop(INVALIDATIONS_KEY, None)
+        if changes is not None and any(changes):
+            self._invalidate(*changes)
+
+    def _after_soft_rollback(self, session: so.Session, previous_transaction: Any) -> None:
+        # The changes flushed before a rolled back savepoint are still committed later.
+        if not previous_transaction.nested and not session.in_transaction():
+            session.info.pop(INVALIDATIONS_KEY, None)
+
+
+def _changed(obj: Any, attributes: tuple[str, ...]) -> bool:
+    state = sa.inspect(obj)
+    if state.pending or state.deleted or state.was_deleted:
+        return True
+    return any(state.attrs[name].history.has_changes() for name in attributes)
+
+
+def _values(obj: Any, name: str) -> set[Any]:
+    # The current and, if it changed, the previous value of a loaded attribute.
+    state = sa.inspect(obj)
+    values = {state.dict.get(name), *state.attrs[name].history.deleted}
+    values.discard(None)
+    return values
+
+
+def _org_slugs_query(org_ids: Iterable[str], workspace_ids: Iterable[str]) -> sa.Select:
+    return sa.select(Organization.slug).where(
+        Organization.id.in_(org_ids)
+        | Organization.id.in_(sa.select(Workspace.org_id).where(Workspace.id.in_(workspace_ids)))
+    )
+
+
+def _resolve_query(org_slug: str, workspace_slug: str) -> sa.Select:
+    return (
+        sa.select(
+            Organization.id,
+            Organization.slug,
+            Organization.bucket,
+            Organization.revoke_link,
+            Workspace.id,
+            Workspace.slug,
+            Workspace.bucket,
+        )
+        .join(Workspace, Workspace.org_id == Organization.id)
+        .where(Organization.slug == org_slug, Workspace.slug == workspace_slug)
+    )
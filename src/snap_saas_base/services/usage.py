@@ -0,0 +1,373 @@
+"""Usage accounting per workspace API key.
+
+`UsageCounters` counts requests, tokens or any other usage in memory, per
+``(workspace_id, api_key_id, type)`` and fixed time window, and periodically flushes the
+aggregated counts as `WorkspaceMetric` events. Counting only touches one of several
+independently locked shards, so concurrent threads rarely contend.
+
+Every flushed event has a deterministic ``event_id`` derived from the counter instance, the
+drain generation and the counted key. A flush that fails is retried with the same events, and
+the ``(workspace_id, source, event_id)`` unique constraint turns a replayed insert into a no-op.
+Flushes need ``INSERT ... ON CONFLICT DO NOTHING``, so they run on PostgreSQL and SQLite.
+"""
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from datetime import UTC, datetime
+from typing import Any, NamedTuple
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+import uuid6
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from snap_saas_base.models.workspace import WorkspaceMetric
+
+logger = logging.getLogger(__name__)
+
+USAGE_NAMESPACE = uuid.UUID("6f1c3b1e-52f4-4d36-9a57-3c1f0c2b8e41")
+
+# The workspace, API key, usage type and window start of a counter.
+_UsageKey = tuple[str, str, str, int]
+
+
+class UsageDelta(NamedTuple):
+    """Usage counted for a key during a closed window."""
+
+    workspace_id: str
+    api_key_id: str
+    type: str
+    window_start: int
+    amount: int
+
+
+class UsageCounters:
+    """Sharded in-memory usage counters flushed into `WorkspaceMetric`.
+
+    Parameters
+    ----------
+    window : int, optional
+        Length, in seconds, of the counting windows. Each flushed event covers one window.
+    shards : int, optional
+        Number of independently locked shards. Each thread is assigned a shard, round-robin, the
+        first time it counts.
+    instance_id : str, optional
+        Stable identifier of this counter instance, e.g. the host name and process id. It keeps
+        the event ids of different processes counting the same key apart. Defaults to a random
+        identifier.
+    clock : Callable[[], float], optional
+        Returns the current time in seconds since the epoch.
+    """
+
+    def __init__(
+        self,
+        window: int = 60,
+        shards: int = 16,
+        instance_id: str | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        if window < 1 or shards < 1:
+            raise ValueError("window and shards must be positive")
+        self.window = window
+        self.instance_id = instance_id or uuid.uuid4().hex
+        self.clock = clock
+        self._shards: list[tuple[dict[_UsageKey, int], threading.Lock]] = [
+            ({}, threading.Lock()) for _ in range(shards)
+        ]
+        self._next_shard = itertools.count()
+        self._local = threading.local()
+        self._generation = 0
+        self._pending: list[dict[str, Any]] = []
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def add(self, workspace_id: str, api_key_id: str, usage_type: str, amount: int = 1) -> None:
+        """Count usage for an API key.
+
+        Parameters
+        ----------
+        workspace_id : str
+            The workspace of the API key.
+        api_key_id : str
+            The `WorkspaceApiKey` id.
+        usage_type : str
+            The usage type, e.g. ``"requests"`` or ``"tokens"``.
+        amount : int, optional
+            The amount to count.
+        """
+        key = (workspace_id, api_key_id, usage_type, self._window_start())
+        counts, lock = self._shard()
+        with lock:
+            counts[key] = counts.get(key, 0) + amount
+
+    def total(self, workspace_id: str, api_key_id: str, usage_type: str) -> int:
+        """Return the usage counted for an API key in the current window.
+
+        Parameters
+        ----------
+        workspace_id : str
+            The workspace of the API key.
+        api_key_id : str
+            The `WorkspaceApiKey` id.
+        usage_type : str
+            The usage type.
+
+        Returns
+        -------
+        int
+            The usage counted by this instance since the window started.
+        """
+        key = (workspace_id, api_key_id, usage_type, self._window_start())
+        return sum(counts.get(key, 0) for counts, _ in self._shards)
+
+    def allow(
+        self, workspace_id: str, api_key_id: str, usage_type: str, limit: int, amount: int = 1
+    ) -> bool:
+        """Count usage if it stays within a limit for the current window.
+
+        This is an in-process fixed window rate limit. The check and the count are not atomic
+        across threads, so concurrent callers may overshoot the limit slightly.
+
+        Parameters
+        ----------
+        workspace_id : str
+            The workspace of the API key.
+        api_key_id : str
+            The `WorkspaceApiKey` id.
+        usage_type : str
+            The usage type.
+        limit : int
+            Maximum usage per window.
+        amount : int, optional
+            The amount to count.
+
+        Returns
+        -------
+        bool
+            Whether the usage was allowed and counted.
+        """
+        if self.total(workspace_id, api_key_id, usage_type) + amount > limit:
+            return False
+        self.add(workspace_id, api_key_id, usage_type, amount)
+        return True
+
+    def drain(self, include_open: bool = False) -> list[UsageDelta]:
+        """Remove and return the counts of the closed windows.
+
+        Parameters
+        ----------
+        include_open : bool, optional
+            Also drain the current window, e.g. when shutting down.
+
+        Returns
+        -------
+        list[UsageDelta]
+            The aggregated counts, one per key and window.
+        """
+        current = self._window_start()
+        totals: dict[_UsageKey, int] = {}
+        for counts, lock in self._shards:
+            with lock:
+                keys = [key for key in counts if include_open or key[3] < current]
+                drained = [(key, counts.pop(key)) for key in keys]
+            for key, count in drained:
+                totals[key] = totals.get(key, 0) + count
+        return [UsageDelta(*key, amount) for key, amount in totals.items()]
+
+    def events(self, deltas: list[UsageDelta]) -> list[dict[str, Any]]:
+        """Return `WorkspaceMetric` rows for drained counts.
+
+        Parameters
+        ----------
+        deltas : list[UsageDelta]
+            Counts returned by `drain`.
+
+        Returns
+        -------
+        list[dict]
+            The metric rows, with deterministic event ids.
+        """
+        self._generation += 1
+        now = datetime.now(UTC).replace(tzinfo=None)
+        return [
+            {
+                "id": str(uuid6.uuid7()),
+                "workspace_id": delta.workspace_id,
+                "specversion": "1.0",
+                "type": f"usage.{delta.type}",
+                "event_id": str(
+                    uuid.uuid5(
+                        USAGE_NAMESPACE,
+                        f"{self.instance_id}:{self._generation}:{delta.workspace_id}:"
+                        f"{delta.api_key_id}:{delta.type}:{delta.window_start}",
+                    )
+                ),
+                "time": datetime.fromtimestamp(delta.window_start, UTC).replace(tzinfo=None),
+                "source": f"/apikeys/{delta.api_key_id}",
+                "subject": delta.api_key_id,
+                "data": {
+                    "api_key_id": delta.api_key_id,
+                    "type": delta.type,
+                    "count": delta.amount,
+                    "window_seconds": self.window,
+                },
+                "created_at": now,
+                "updated_at": now,
+            }
+            for delta in deltas
+        ]
+
+    def flush(self, session: so.Session, include_open: bool = False) -> int:
+        """Write the counts of the closed windows as `WorkspaceMetric` events and commit.
+
+        Events of a failed flush are kept and written again, with the same event ids, by the
+        next flush.
+
+        Parameters
+        ----------
+        session : so.Session
+            The session used to write the events.
+        include_open : bool, optional
+            Also flush the current window, e.g. when shutting down.
+
+        Returns
+        -------
+        int
+            The number of events written.
+
+        Raises
+        ------
+        ValueError
+            If the database is neither PostgreSQL nor SQLite.
+        """
+        with self._flush_lock:
+            rows = self._collect(include_open)
+            if not rows:
+                return 0
+            try:
+                session.execute(_insert_ignore(session.get_bind()), rows)
+                session.commit()
+            except BaseException:
+                session.rollback()
+                self._pending = rows
+                raise
+            return len(rows)
+
+    async def aflush(self, session: AsyncSession, include_open: bool = False) -> int:
+        """Write the counts of the closed windows on an async session.
+
+        See `flush`. Concurrent flushes of the same counters must be avoided.
+        """
+        rows = self._collect(include_open)
+        if not rows:
+            return 0
+        try:
+            await session.execute(_insert_ignore(session.get_bind()), rows)
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            self._pending = rows
+            raise
+        return len(rows)
+
+    def start(self, session_factory: Callable[[], so.Session], interval: float = 10.0) -> None:
+        """Start flushing in a background thread.
+
+        Parameters
+        ----------
+        session_factory : Callable[[], so.Session]
+            Returns a new session for each flush, e.g. a ``sessionmaker``.
+        interval : float, optional
+            Seconds between flushes.
+        """
+        if self._thread is not None:
+            raise RuntimeError("the background flush is already running")
+        self._stop.clear()
+
+        def run() -> None:
+            while not self._stop.wait(interval):
+                try:
+                    with session_factory() as session:
+                        self.flush(session)
+                except Exception:
+                    # The events are kept and retried by the next flush.
+                    logger.warning("usage flush failed, retrying later", exc_info=True)
+            try:
+                with session_factory() as session:
+                    self.flush(session, include_open=True)
+            except Exception:
+                logger.exception("final usage flush failed, the pending usage is lost")
+
+        self._thread = threading.Thread(target=run, name="usage-counters", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread after a final flush of every window."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    async def run(
+        self, session_factory: Callable[[], AsyncSession], interval: float = 10.0
+    ) -> None:
+        """Flush periodically until cancelled, then flush every window.
+
+        Parameters
+        ----------
+        session_factory : Callable[[], AsyncSession]
+            Returns a new session for each flush, e.g. an ``async_sessionmaker``.
+        interval : float, optional
+            Seconds between flushes.
+        """
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    async with session_factory() as session:
+                        await self.aflush(session)
+                except Exception:
+                    # The events are kept and retried by the next flush.
+                    logger.warning("usage flush failed, retrying later", exc_info=True)
+        except asyncio.CancelledError:
+            async with session_factory() as session:
+                await self.aflush(session, include_open=True)
+            raise
+
+    def _collect(self, include_open: bool) -> list[dict[str, Any]]:
+        rows, self._pending = self._pending, []
+        deltas = self.drain(include_open)
+        if deltas:
+            rows.extend(self.events(deltas))
+        return rows
+
+    def _shard(self) -> tuple[dict[_UsageKey, int], threading.Lock]:
+        # Thread ids are aligned addresses, so they can't pick the shard themselves.
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._shards[next(self._next_shard) % len(self._shards)]
+            self._local.shard = shard
+        return shard
+
+    def _window_start(self) -> int:
+        return int(self.clock() // self.window) * self.window
+
+
+def _insert_ignore(bind: Any) -> sa.Insert:
+    table = WorkspaceMetric.__table__
+    dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(bind.dialect.name)
+    if dialect is None:
+        raise ValueError(
+            f"usage flushes need INSERT ... ON CONFLICT, not supported on {bind.dialect.name}"
+        )
+    return dialect.insert(table).on_conflict_do_nothing(
+        index_elements=["workspace_id", "source", "event_id"]
+    )
@@ -0,0 +1 @@
+"""Snap SAAS Base testing helpers package."""
@@ -0,0 +1,142 @@
+"""Embedded SQLite databases for tests.
+
+The models use the portable `snap_saas_base.models.types.JSONB` type, so the whole schema can be
+created on an in-memory SQLite database. Each database lives in a single process, which gives
+every pytest-xdist worker its own database and lets the persistence tests run in parallel
+without a PostgreSQL server.
+
+``unittest`` test cases use `create_sqlite_engine` and `rollback_session` directly. pytest
+fixtures wrapping them are in `snap_saas_base.testing.pytest_plugin`. This module does not
+need pytest.
+
+PostgreSQL-only features, such as the ``@>`` operator and GIN indexes, still need PostgreSQL.
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import StaticPool
+
+from snap_saas_base.db.engine import create_async_engine, create_engine
+from snap_saas_base.models.base_model import AbstractModel
+from snap_saas_base.models.chat import Chat
+from snap_saas_base.models.organization import Organization
+from snap_saas_base.models.user import User
+from snap_saas_base.models.workspace import Workspace
+
+
+def create_sqlite_engine(url: str = "sqlite://", **kwargs: Any) -> sa.Engine:
+    """Create an in-memory SQLite engine with the whole schema.
+
+    All sessions share a single connection, so they all see the same database.
+
+    Parameters
+    ----------
+    url : str, optional
+        The database URL.
+    **kwargs
+        Passed to `snap_saas_base.db.engine.create_engine`.
+
+    Returns
+    -------
+    sa.Engine
+        The engine.
+    """
+    kwargs.setdefault("poolclass", StaticPool)
+    kwargs.setdefault("connect_args", {"check_same_thread": False})
+    engine = create_engine(url, **kwargs)
+    AbstractModel.metadata.create_all(engine)
+    return engine
+
+
+async def create_async_sqlite_engine(
+    url: str = "sqlite+aiosqlite://", **kwargs: Any
+) -> AsyncEngine:
+    """Create an in-memory SQLite async engine with the whole schema.
+
+    Needs the ``aiosqlite`` driver. See `create_sqlite_engine`.
+    """
+    kwargs.setdefault("poolclass", StaticPool)
+    engine = create_async_engine(url, **kwargs)
+    async with engine.begin() as connection:
+        await connection.run_sync(AbstractModel.metadata.create_all)
+    return engine
+
+
+@contextmanager
+def rollback_session(engine: sa.Engine, **kwargs: Any) -> Iterator[so.Session]:
+    """Yield a session whose changes are rolled back on exit.
+
+    The session runs inside an outer transaction. Its commits only release savepoints, so the
+    code under test can commit as usual.
+
+    Parameters
+    ----------
+    engine : sa.Engine
+        The engine.
+    **kwargs
+        Passed to ``Session``.
+
+    Yields
+    ------
+    so.Session
+        The session.
+    """
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        session = so.Session(bind=connection, join_transaction_mode="create_savepoint", **kwargs)
+        try:
+            yield session
+        finally:
+            session.close()
+            transaction.rollback()
+
+
+def add_chat(session: so.Session, **values: Any) -> Chat:
+    """Add a chat and flush it.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session.
+    **values
+        Chat column values overriding the defaults. Without a ``workspace_id``, a workspace is
+        added too, with its organization and user.
+
+    Returns
+    -------
+    Chat
+        The chat.
+    """
+    if "workspace_id" not in values:
+        user = User(username="john", email="john@domain.com", cell_phone="1", full_name="John")
+        org = Organization(name="Org", slug="org", bucket="b", created_by=user.id)
+        workspace = Workspace(name="Support", slug="support", org_id=org.id)
+        session.add_all([user, org, workspace])
+        values["workspace_id"] = workspace.id
+    chat = Chat(
+        **{
+            "channel": "whatsapp",
+            "channel_plugin": "twilio",
+            "channel_id": "c1",
+            "channel_session_id": "s1",
+            "channel_contact_uid": "+5527999884321",
+            "subject": {"name": "John Doe"},
+            "agi_id": "agi",
+            "status": 1,
+            "state": {},
+            "contact_id": "contact",
+            "handsoff_data": {},
+            "slots": {},
+            "session_metadata": {},
+            "history": {},
+            **values,
+        }
+    )
+    session.add(chat)
+    session.flush()
+    return chat
@@ -0,0 +1,32 @@
+"""pytest fixtures for the embedded SQLite databases.
+
+Enable them in a ``conftest.py``::
+
+    pytest_plugins = ["snap_saas_base.testing.pytest_plugin"]
+
+and request ``sqlite_session`` in a test. Every test runs in a transaction that is rolled back
+afterwards, so tests do not see each other's rows. See `snap_saas_base.testing.fixtures`.
+"""
+
+from collections.abc import Iterator
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+from snap_saas_base.testing.fixtures import create_sqlite_engine, rollback_session
+
+
+@pytest.fixture(scope="session")
+def sqlite_engine() -> Iterator[sa.Engine]:
+    """Yield an in-memory SQLite engine with the whole schema, one per test process."""
+    engine = create_sqlite_engine()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sqlite_session(sqlite_engine: sa.Engine) -> Iterator[so.Session]:
+    """Yield a session on `sqlite_engine` rolled back after the test."""
+    with rollback_session(sqlite_engine) as session:
+        yield session
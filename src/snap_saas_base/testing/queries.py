@@ -0,0 +1,89 @@
+"""Helpers that count the SQL statements run by the code under test."""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+from snap_saas_base.db.loaders import load_profile
+
+
+class QueryCounter:
+    """Records the statements executed on an engine while it is active.
+
+    Attributes
+    ----------
+    statements : list[str]
+        The SQL of every executed statement, in order.
+
+    Methods
+    -------
+    count:
+        Returns the number of executed statements.
+    """
+
+    def __init__(self, bind: Any):
+        self.engine: sa.Engine = getattr(bind, "sync_engine", bind)
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        """Returns the number of executed statements."""
+        return len(self.statements)
+
+    def _record(self, conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        self.statements.append(statement)
+
+    def __enter__(self) -> "QueryCounter":
+        """Start recording the statements."""
+        sa.event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stop recording the statements."""
+        sa.event.remove(self.engine, "before_cursor_execute", self._record)
+
+
+@contextmanager
+def assert_query_count(bind: Any, expected: int) -> Iterator[QueryCounter]:
+    """Assert the number of statements executed inside the block.
+
+    Parameters
+    ----------
+    bind : Any
+        The engine, sync or async, the statements run on.
+    expected : int
+        The expected number of statements.
+    """
+    with QueryCounter(bind) as counter:
+        yield counter
+    assert (
+        counter.count == expected
+    ), f"expected {expected} queries, got {counter.count}:\n" + "\n".join(counter.statements)
+
+
+def assert_profile_query_count(
+    session: so.Session, stmt: sa.Select, name: str, expected: int
+) -> list[Any]:
+    """Load a statement with a loader profile and assert how many queries it took.
+
+    Parameters
+    ----------
+    session : so.Session
+        The session used to run the statement.
+    stmt : sa.Select
+        A statement selecting a single model.
+    name : str
+        The loader profile name.
+    expected : int
+        The expected number of statements.
+
+    Returns
+    -------
+    list
+        The loaded objects.
+    """
+    with assert_query_count(session.get_bind(), expected):
+        return load_profile(session, stmt, name)
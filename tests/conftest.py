@@ -0,0 +1,3 @@
+"""Test Snap SAAS Base."""
+
+pytest_plugins = ["snap_saas_base.testing.pytest_plugin"]
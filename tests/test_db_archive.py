@@ -0,0 +1,107 @@
+"""Test Snap SAAS Base."""
+
+import secrets
+from datetime import datetime, timedelta
+from unittest import TestCase
+from unittest.mock import patch
+
+import sqlalchemy as sa
+import uuid6
+
+from snap_saas_base.db.archive import archive_chat, archive_messages, list_chat_messages
+from snap_saas_base.models.chat import ChatMessage, ChatMessageArchive
+from snap_saas_base.testing.fixtures import add_chat, create_sqlite_engine, rollback_session
+from snap_saas_base.testing.queries import assert_query_count
+
+MESSAGES = 10
+
+
+def uuid7_at(moment: datetime) -> str:
+    """Return a UUIDv7 with the timestamp of a naive UTC time."""
+    milliseconds = (moment - datetime.fromisoformat("1970-01-01")) // timedelta(milliseconds=1)
+    return str(uuid6.UUID(int=milliseconds << 80 | secrets.randbits(76), version=7))
+
+
+class ArchiveTest(TestCase):
+    """Test class for the message archive."""
+
+    def setUp(self) -> None:
+        """Create a chat with ten messages, one per day."""
+        print("Setting up archive testcase")
+        self.engine = create_sqlite_engine()
+        self.start = datetime.fromisoformat("2024-03-01")
+
+    def tearDown(self) -> None:
+        """Dispose the engine."""
+        self.engine.dispose()
+
+    def add_messages(self, session) -> str:
+        """Add a chat with a message per day and return its id."""
+        chat_id = add_chat(session).id
+        session.add_all(
+            ChatMessage(
+                id=uuid7_at(self.start + timedelta(days=i)),
+                chat_id=chat_id,
+                role="user",
+                content_type="text/plain",
+                content=f"message {i}",
+                message_metadata={"i": i},
+            )
+            for i in range(MESSAGES)
+        )
+        session.commit()
+        return chat_id
+
+    def contents(self, messages: list[ChatMessage]) -> list[str]:
+        """Return the contents of messages."""
+        return [message.content for message in messages]
+
+    def test_archive_old_messages(self) -> None:
+        """Test that the messages before a time are archived and still listed."""
+        with rollback_session(self.engine) as session:
+            chat_id = self.add_messages(session)
+            before = self.start + timedelta(days=6)
+            archived = archive_messages(session, before, segment_size=4)
+            segments = session.scalars(sa.select(ChatMessageArchive)).all()
+            assert [segment.message_count for segment in segments] == [4, 2]
+            hot = session.scalar(sa.select(sa.func.count()).select_from(ChatMessage))
+            assert (archived, hot) == (6, MESSAGES - 6)
+            messages = list_chat_messages(session, chat_id)
+        assert self.contents(messages) == [f"message {i}" for i in range(MESSAGES)]
+        assert messages[0].message_metadata == {"i": 0}
+        assert messages[0].created_at is not None
+
+    def test_pages_span_both_tiers(self) -> None:
+        """Test that pages continue from the hot messages into the archive."""
+        with rollback_session(self.engine) as session:
+            chat_id = self.add_messages(session)
+            archive_chat(session, chat_id, self.start + timedelta(days=6), segment_size=4)
+            session.commit()
+            page = list_chat_messages(session, chat_id, limit=3)
+            assert self.contents(page) == ["message 7", "message 8", "message 9"]
+            page = list_chat_messages(session, chat_id, limit=4, before_id=page[0].id)
+            assert self.contents(page) == [f"message {i}" for i in range(3, 7)]
+            page = list_chat_messages(session, chat_id, limit=4, before_id=page[0].id)
+            assert self.contents(page) == [f"message {i}" for i in range(3)]
+
+    def test_archive_whole_chat_with_zlib(self) -> None:
+        """Test that a whole chat is archived with zlib when zstandard is missing."""
+        with rollback_session(self.engine) as session:
+            chat_id = self.add_messages(session)
+            with patch("snap_saas_base.json_codec._zstandard", return_value=None):
+                assert archive_chat(session, chat_id) == MESSAGES
+                session.commit()
+                assert session.scalar(sa.select(ChatMessageArchive.codec)) == "zlib"
+                messages = list_chat_messages(session, chat_id, limit=2)
+        assert self.contents(messages) == ["message 8", "message 9"]
+
+    def test_segments_load_their_payload_at_once(self) -> None:
+        """Test that listing archived messages doesn't load the payloads one by one."""
+        with rollback_session(self.engine) as session:
+            chat_id = self.add_messages(session)
+            archive_chat(session, chat_id, segment_size=3)
+            session.commit()
+            session.connection()
+            with assert_query_count(self.engine, 2):
+                messages = list_chat_messages(session, chat_id)
+        assert self.contents(messages) == [f"message {i}" for i in range(MESSAGES)]
@@ -0,0 +1,102 @@
+"""Test Snap SAAS Base."""
+
+import asyncio
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from snap_saas_base.db.coalescer import ChatWriteCoalescer
+from snap_saas_base.models.chat import Chat, ChatMessage, chat_activity
+from snap_saas_base.testing.fixtures import add_chat, create_async_sqlite_engine
+
+
+class ChatWriteCoalescerTest(IsolatedAsyncioTestCase):
+    """Test class for the chat write coalescer."""
+
+    async def asyncSetUp(self) -> None:
+        """Create a chat in an in-memory database."""
+        print("Setting up coalescer testcase")
+        self.engine = await create_async_sqlite_engine()
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.session_factory() as session:
+            self.chat_id = (await session.run_sync(add_chat)).id
+            await session.commit()
+        self.coalescer = ChatWriteCoalescer(self.session_factory)
+
+    async def asyncTearDown(self) -> None:
+        """Close the coalescer and dispose the engine."""
+        await self.coalescer.close()
+        await self.engine.dispose()
+
+    async def test_coalesce(self) -> None:
+        """Test that concurrent writes share one transaction and bump the version once."""
+        messages = [
+            self.coalescer.add_message(self.chat_id, "user", "text/plain", f"message {i}")
+            for i in range(50)
+        ]
+        message_ids, _ = await asyncio.gather(
+            asyncio.gather(*messages), self.coalescer.update_chat(self.chat_id, status=2)
+        )
+        assert self.coalescer.transactions == 1
+        async with self.session_factory() as session:
+            contents = (
+                await session.scalars(sa.select(ChatMessage.content).order_by(ChatMessage.id))
+            ).all()
+            chat = await session.get_one(Chat, self.chat_id)
+        assert contents == [f"message {i}" for i in range(50)]
+        assert message_ids == sorted(message_ids)
+        assert (chat.status, chat.version_id) == (2, 2)
+        assert (chat.message_count, chat.last_message_id) == (50, max(message_ids))
+
+    async def test_version_matches_chat_activity(self) -> None:
+        """Test that a coalesced append bumps the version as `chat_activity` does."""
+        await self.coalescer.add_message(self.chat_id, "user", "text/plain", "hello")
+        async with self.session_factory() as session:
+            await session.execute(chat_activity(self.chat_id, 1))
+            await session.commit()
+            chat = await session.get_one(Chat, self.chat_id)
+        assert (chat.message_count, chat.version_id) == (2, 3)
+
+    async def test_updates_merge_in_order(self) -> None:
+        """Test that merged updates of a chat keep their order."""
+        await asyncio.gather(
+            self.coalescer.update_chat(self.chat_id, status=2, handsoff="agent"),
+            self.coalescer.update_chat(self.chat_id, status=3),
+        )
+        async with self.session_factory() as session:
+            chat = await session.get_one(Chat, self.chat_id)
+        assert (chat.status, chat.handsoff) == (3, "agent")
+
+    async def test_errors_reach_their_waiters(self) -> None:
+        """Test that only the waiters of a failing chat get its error."""
+        results = await asyncio.gather(
+            self.coalescer.add_message(self.chat_id, "user", "text/plain", "hello"),
+            self.coalescer.add_message("missing", "user", "text/plain", "hello"),
+            self.coalescer.update_chat("other", status=2),
+            return_exceptions=True,
+        )
+        assert isinstance(results[0], str)
+        assert isinstance(results[1], sa.exc.IntegrityError)
+        assert isinstance(results[2], sa.exc.NoResultFound)
+        assert self.coalescer.writes == 1
+
+    async def test_stopped_task_fails_waiters(self) -> None:
+        """Test that the waiters fail, instead of hanging, when the background task dies."""
+        with (
+            patch.object(self.coalescer, "_write", side_effect=RuntimeError("boom")),
+            pytest.raises(RuntimeError, match="stopped before the write was committed"),
+        ):
+            await asyncio.wait_for(self.coalescer.update_chat(self.chat_id, status=2), 1)
+        await self.coalescer.update_chat(self.chat_id, status=3)
+        async with self.session_factory() as session:
+            chat = await session.get_one(Chat, self.chat_id)
+        assert (chat.status, chat.version_id) == (3, 2)
+
+    async def test_closed(self) -> None:
+        """Test that a closed coalescer rejects writes."""
+        await self.coalescer.close()
+        with pytest.raises(RuntimeError, match="closed"):
+            await self.coalescer.update_chat(self.chat_id, status=2)
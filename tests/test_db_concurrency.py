@@ -0,0 +1,205 @@
+"""Test Snap SAAS Base."""
+
+from unittest import TestCase
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+from snap_saas_base.db.concurrency import (
+    VersionConflictError,
+    compare_and_swap,
+    retry_on_conflict,
+    set_optimistic_locking,
+    version_column,
+)
+from snap_saas_base.models.chat import Chat, ChatMessage
+from snap_saas_base.testing.fixtures import add_chat, create_sqlite_engine
+
+
+class Base(so.DeclarativeBase):
+    """Declarative base of the test models."""
+
+
+class Ticket(Base):
+    """A versioned model declaring ``version_id_col``."""
+
+    __tablename__ = "tickets"
+
+    id: so.Mapped[str] = so.mapped_column(primary_key=True)
+    status: so.Mapped[int]
+    version_id: so.Mapped[int] = so.mapped_column(default=1)
+
+    __mapper_args__ = {"version_id_col": version_id}  # noqa: RUF012
+
+
+class VersionColumnTest(TestCase):
+    """Test class for the Chat version column."""
+
+    def test_chat_is_versioned(self) -> None:
+        """Find the version column of Chat."""
+        assert version_column(Chat).name == "version_id"
+
+
+class CompareAndSwapTest(TestCase):
+    """Test class for the compare and swap updates."""
+
+    def setUp(self) -> None:
+        """Create a versioned row in an in-memory database."""
+        self.engine = sa.create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.session = so.Session(self.engine)
+        self.session.add(Ticket(id="t1", status=0))
+        self.session.commit()
+
+    def tearDown(self) -> None:
+        """Close the session."""
+        self.session.close()
+
+    def test_swap(self) -> None:
+        """Update the row and bump its version."""
+        version = compare_and_swap(self.session, Ticket, "t1", 1, status=1)
+        self.session.commit()
+        ticket = self.session.get_one(Ticket, "t1")
+        assert (version, ticket.status, ticket.version_id) == (2, 1, 2)
+
+    def test_conflict(self) -> None:
+        """Refuse to update a row that is no longer at the expected version."""
+        compare_and_swap(self.session, Ticket, "t1", 1, status=1)
+        with pytest.raises(VersionConflictError) as info:
+            compare_and_swap(self.session, Ticket, "t1", 1, status=2)
+        assert info.value.expected_version == 1
+
+    def test_retry(self) -> None:
+        """Retry the operation on fresh data after losing a conflict."""
+        attempts: list[int] = []
+
+        def operation(session: so.Session) -> int:
+            ticket = session.get_one(Ticket, "t1")
+            if not attempts:
+                with so.Session(self.engine) as other:
+                    compare_and_swap(other, Ticket, "t1", ticket.version_id, status=5)
+                    other.commit()
+            attempts.append(ticket.version_id)
+            return compare_and_swap(session, Ticket, "t1", ticket.version_id, status=6)
+
+        version = retry_on_conflict(self.session, operation, backoff=0)
+        assert (version, attempts) == (3, [1, 2])
+
+    def test_retry_exhausted(self) -> None:
+        """Raise the conflict once the attempts are exhausted."""
+
+        def operation(session: so.Session) -> int:
+            return compare_and_swap(session, Ticket, "t1", 0, status=6)
+
+        with pytest.raises(VersionConflictError):
+            retry_on_conflict(self.session, operation, attempts=2, backoff=0)
+
+    def test_orm_flush_conflict(self) -> None:
+        """Check the version of a mapper versioned model on every flush."""
+        ticket = self.session.get_one(Ticket, "t1")
+        with so.Session(self.engine) as other:
+            compare_and_swap(other, Ticket, "t1", 1, status=5)
+            other.commit()
+        ticket.status = 7
+        with pytest.raises(so.exc.StaleDataError):
+            self.session.commit()
+
+
+class ChatOptimisticLockingTest(TestCase):
+    """Test class for the opt-in version checks of Chat flushes."""
+
+    def setUp(self) -> None:
+        """Create a chat in an in-memory database."""
+        self.engine = create_sqlite_engine()
+        self.session = so.Session(self.engine)
+        self.chat = add_chat(self.session)
+        self.session.commit()
+
+    def tearDown(self) -> None:
+        """Close the session and dispose the engine."""
+        self.session.close()
+        self.engine.dispose()
+
+    def concurrent_update(self) -> None:
+        """Update the chat behind the back of the session."""
+        table = Chat.metadata.tables[Chat.__tablename__]
+        self.session.connection().execute(
+            sa.update(table).where(table.c.id == self.chat.id).values(status=5)
+        )
+
+    def add_message(self) -> None:
+        """Add a message to the chat and flush it."""
+        self.session.add(
+            ChatMessage(
+                chat_id=self.chat.id,
+                role="user",
+                content_type="text/plain",
+                content="hello",
+                message_metadata={},
+            )
+        )
+        self.session.flush()
+
+    def test_update_bumps_version(self) -> None:
+        """Bump the version on every update of a chat."""
+        assert self.chat.version_id == 1
+        self.chat.status = 2
+        self.session.commit()
+        versions = [self.chat.version_id]
+        self.concurrent_update()
+        self.session.commit()
+        assert [*versions, self.chat.version_id] == [2, 3]
+
+    def test_unchecked_by_default(self) -> None:
+        """Let the last writer win in sessions that don't opt in."""
+        assert self.chat.version_id == 1
+        self.concurrent_update()
+        self.chat.status = 2
+        self.session.commit()
+        assert (self.chat.status, self.chat.version_id) == (2, 3)
+
+    def test_conflict(self) -> None:
+        """Refuse to flush a chat changed since it was loaded, when opted in."""
+        set_optimistic_locking(self.session)
+        assert self.chat.version_id == 1
+        self.concurrent_update()
+        self.chat.status = 2
+        with pytest.raises(VersionConflictError):
+            self.session.flush()
+        # The rollback also undid the concurrent update, which shared the transaction.
+        self.session.rollback()
+        self.chat.status = 2
+        self.session.commit()
+        assert (self.chat.status, self.chat.version_id) == (2, 2)
+
+    def test_conflict_after_commit(self) -> None:
+        """Check the version loaded before a commit rather than reloading it."""
+        set_optimistic_locking(self.session)
+        assert self.chat.version_id == 1
+        self.session.commit()
+        self.concurrent_update()
+        self.chat.status = 2
+        with pytest.raises(VersionConflictError) as info:
+            self.session.flush()
+        assert info.value.expected_version == 1
+
+    def test_conflict_after_message(self) -> None:
+        """Keep a concurrent update detectable after the activity of a new message."""
+        set_optimistic_locking(self.session)
+        assert self.chat.version_id == 1
+        self.concurrent_update()
+        self.add_message()
+        self.chat.status = 2
+        with pytest.raises(VersionConflictError) as info:
+            self.session.flush()
+        assert info.value.expected_version == 1
+
+    def test_update_after_message(self) -> None:
+        """Follow the version bump of the session's own message activity."""
+        set_optimistic_locking(self.session)
+        assert self.chat.version_id == 1
+        self.add_message()
+        self.chat.status = 2
+        self.session.commit()
+        assert (self.chat.message_count, self.chat.version_id) == (1, 3)
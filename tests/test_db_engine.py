@@ -0,0 +1,104 @@
+"""Test Snap SAAS Base."""
+
+import os
+import tempfile
+from unittest import TestCase
+
+import pytest
+import sqlalchemy as sa
+
+from snap_saas_base.db.engine import (
+    POOL_PROFILES,
+    STATEMENT_TIMEOUT_KEY,
+    PoolMetrics,
+    TimedQueuePool,
+    create_engine,
+    make_sessionmaker,
+    pgbouncer_connect_args,
+    set_statement_timeout,
+)
+
+POOL_TIMEOUT = 0.05
+
+
+class EngineFactoryTest(TestCase):
+    """Test class for the engine and session factories."""
+
+    def setUp(self) -> None:
+        """Create a file database engine with a single connection pool."""
+        print("Setting up engine testcase")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.metrics = PoolMetrics()
+        self.engine = create_engine(
+            f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}",
+            metrics=self.metrics,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=POOL_TIMEOUT,
+        )
+
+    def tearDown(self) -> None:
+        """Dispose the engine and remove the database."""
+        self.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_pool(self) -> None:
+        """Test that file databases get a timed pool with the profile settings."""
+        assert isinstance(self.engine.pool, TimedQueuePool)
+        assert self.engine.pool._pre_ping
+        assert self.engine.pool._recycle == POOL_PROFILES["web"]["pool_recycle"]
+
+    def test_metrics(self) -> None:
+        """Test the checkout and checkin counters."""
+        with self.engine.connect() as connection:
+            connection.execute(sa.text("SELECT 1"))
+            assert self.metrics.checked_out == 1
+        metrics = self.metrics.as_dict
+        assert metrics["checkouts"] == metrics["checkins"] == metrics["connects"] == 1
+        assert metrics["checked_out"] == 0
+
+    def test_pool_exhaustion(self) -> None:
+        """Test that checkout timeouts are counted with their wait."""
+        with self.engine.connect(), pytest.raises(sa.exc.TimeoutError):
+            self.engine.connect()
+        assert self.metrics.timeouts == 1
+        assert self.metrics.wait_max >= POOL_TIMEOUT
+
+    def test_metrics_survive_dispose(self) -> None:
+        """Test that the recreated pool keeps the metrics."""
+        self.engine.dispose()
+        assert getattr(self.engine.pool, "metrics", None) is self.metrics
+
+    def test_unknown_profile(self) -> None:
+        """Test that unknown pool profiles are rejected."""
+        with pytest.raises(ValueError, match="unknown pool profile"):
+            create_engine("sqlite://", profile="api")
+
+    def test_statement_timeout(self) -> None:
+        """Test the session statement timeout, ignored on SQLite."""
+        session = make_sessionmaker(self.engine, statement_timeout=500)()
+        assert session.info == {STATEMENT_TIMEOUT_KEY: 500}
+        set_statement_timeout(session, None)
+        session.execute(sa.text("SELECT 1"))
+        session.close()
+
+
+class PgBouncerTest(TestCase):
+    """Test class for the PgBouncer compatibility mode."""
+
+    def test_asyncpg(self) -> None:
+        """Test that asyncpg statement caches are disabled."""
+        args = pgbouncer_connect_args("postgresql+asyncpg://localhost/db")
+        assert args["statement_cache_size"] == 0
+        assert args["prepared_statement_cache_size"] == 0
+        name = args["prepared_statement_name_func"]
+        assert name() != name()
+
+    def test_psycopg(self) -> None:
+        """Test that psycopg automatic prepares are disabled."""
+        args = pgbouncer_connect_args("postgresql+psycopg://localhost/db")
+        assert args == {"prepare_threshold": None}
+
+    def test_other_drivers(self) -> None:
+        """Test that other drivers need no arguments."""
+        assert pgbouncer_connect_args("sqlite://") == {}
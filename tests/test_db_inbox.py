@@ -0,0 +1,198 @@
+"""Test Snap SAAS Base."""
+
+from datetime import datetime
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import pytest
+import sqlalchemy as sa
+
+from snap_saas_base.db.archive import archive_chat
+from snap_saas_base.db.engine import make_async_sessionmaker
+from snap_saas_base.db.inbox import (
+    backfill_chat_activity,
+    decode_cursor,
+    encode_cursor,
+    load_inbox,
+)
+from snap_saas_base.db.inserts import insert_rows
+from snap_saas_base.models.chat import Chat, ChatMessage
+from snap_saas_base.schemas.chat import ChatSchema
+from snap_saas_base.schemas.common import row_to_json
+from snap_saas_base.testing.fixtures import (
+    add_chat,
+    create_async_sqlite_engine,
+    create_sqlite_engine,
+    rollback_session,
+)
+
+PREVIEW_LENGTH = 120
+
+
+def message(chat_id: str, content: str) -> ChatMessage:
+    """Return a new text message of a chat."""
+    return ChatMessage(
+        chat_id=chat_id,
+        role="user",
+        content_type="text/plain",
+        content=content,
+        message_metadata={},
+    )
+
+
+class ChatActivityTest(TestCase):
+    """Test class for the denormalized chat activity."""
+
+    def setUp(self) -> None:
+        """Create the schema in an in-memory database."""
+        print("Setting up chat activity testcase")
+        self.engine = create_sqlite_engine()
+
+    def tearDown(self) -> None:
+        """Dispose the engine."""
+        self.engine.dispose()
+
+    def activity(self, session, chat_id: str) -> tuple:
+        """Return the message count and last message id of a chat."""
+        return session.execute(
+            sa.select(Chat.message_count, Chat.last_message_id).where(Chat.id == chat_id)
+        ).one()
+
+    def test_orm_flush(self) -> None:
+        """Test that ORM flushes of messages update the activity of their chat."""
+        with rollback_session(self.engine) as session:
+            chat = add_chat(session)
+            assert chat.message_count == 0
+            messages = [message(chat.id, f"message {i}") for i in range(3)]
+            session.add_all(messages)
+            session.flush()
+            assert chat.message_count == len(messages)
+            assert chat.last_message_id == messages[-1].id
+            assert chat.last_message_at == messages[-1].created_at
+            session.delete(messages[0])
+            session.flush()
+            assert self.activity(session, chat.id) == (2, messages[-1].id)
+
+    def test_last_message_only_moves_forward(self) -> None:
+        """Test that an older message doesn't replace the last message."""
+        with rollback_session(self.engine) as session:
+            chat = add_chat(session)
+            newer, older = message(chat.id, "newer"), message(chat.id, "older")
+            older.id, newer.id = sorted([older.id, newer.id])
+            session.add(newer)
+            session.flush()
+            session.add(older)
+            session.flush()
+            assert self.activity(session, chat.id) == (2, newer.id)
+
+    def test_insert_rows(self) -> None:
+        """Test that bulk inserted messages update the activity of their chat."""
+        with rollback_session(self.engine) as session:
+            chat_id = add_chat(session).id
+            rows = [
+                {
+                    "chat_id": chat_id,
+                    "role": "user",
+                    "content_type": "text/plain",
+                    "content": f"message {i}",
+                    "message_metadata": {},
+                }
+                for i in range(4)
+            ]
+            ids = insert_rows(session, ChatMessage, rows, mode="client")
+            assert self.activity(session, chat_id) == (len(rows), ids[-1])
+
+    def test_backfill(self) -> None:
+        """Test that the backfill recomputes the activity from hot and archived messages."""
+        with rollback_session(self.engine) as session:
+            chats = [add_chat(session)]
+            chats += [
+                add_chat(session, workspace_id=chats[0].workspace_id, channel_session_id=f"s{i}")
+                for i in range(2, 4)
+            ]
+            hot, archived, empty = (chat.id for chat in chats)
+            messages = [message(chat_id, "hello") for chat_id in (hot, hot, archived, archived)]
+            session.add_all(messages)
+            session.commit()
+            archive_chat(session, archived)
+            session.execute(
+                sa.update(Chat).values(message_count=0, last_message_id=None, last_message_at=None)
+            )
+            session.commit()
+            assert backfill_chat_activity(session, batch_size=2) == len(chats)
+            assert self.activity(session, hot) == (2, messages[1].id)
+            assert self.activity(session, archived) == (2, messages[3].id)
+            assert self.activity(session, empty) == (0, None)
+            times = dict(session.execute(sa.select(Chat.id, Chat.last_message_at)).tuples().all())
+        assert times[hot] == messages[1].created_at
+        assert times[archived] is not None
+        assert times[empty] is None
+
+
+class AsyncChatActivityTest(IsolatedAsyncioTestCase):
+    """Test class for the chat activity in async sessions."""
+
+    async def asyncSetUp(self) -> None:
+        """Create the schema in an in-memory database."""
+        self.engine = await create_async_sqlite_engine()
+        self.session_factory = make_async_sessionmaker(self.engine)
+
+    async def asyncTearDown(self) -> None:
+        """Dispose the engine."""
+        await self.engine.dispose()
+
+    async def test_read_after_commit(self) -> None:
+        """Test that a loaded chat has its new activity after the commit, without a reload."""
+        async with self.session_factory() as session:
+            chat = await session.run_sync(add_chat)
+            await session.commit()
+            session.add(message(chat.id, "hello"))
+            await session.commit()
+            assert (chat.message_count, chat.version_id) == (1, 2)
+            assert b'"message_count":1' in row_to_json(ChatSchema, chat)
+
+
+class InboxTest(TestCase):
+    """Test class for the inbox listing."""
+
+    def setUp(self) -> None:
+        """Create the schema in an in-memory database."""
+        print("Setting up inbox testcase")
+        self.engine = create_sqlite_engine()
+
+    def tearDown(self) -> None:
+        """Dispose the engine."""
+        self.engine.dispose()
+
+    def test_cursor_round_trip(self) -> None:
+        """Test that a cursor decodes to the chat it was encoded from."""
+        moment = datetime.fromisoformat("2024-03-02T13:28:54.589")
+        assert decode_cursor(encode_cursor(moment, "chat")) == (moment, "chat")
+        with pytest.raises(ValueError, match="invalid inbox cursor"):
+            decode_cursor("not a cursor")
+
+    def test_pages(self) -> None:
+        """Test that pages list the chats by latest activity, without gaps."""
+        with rollback_session(self.engine) as session:
+            workspace_id = add_chat(session).workspace_id
+            chats = [
+                add_chat(session, workspace_id=workspace_id, channel_session_id=f"s{i}")
+                for i in range(2, 7)
+            ]
+            order = [*chats[::2], *chats[1::2]]
+            for chat in order:
+                session.add(message(chat.id, f"hello from {chat.channel_session_id}" * 10))
+                session.flush()
+            expected = [chat.id for chat in reversed(order)]
+            pages, cursor = [], None
+            while True:
+                page = load_inbox(session, workspace_id, limit=2, cursor=cursor)
+                pages.append([entry.chat.id for entry in page.entries])
+                if page.next_cursor is None:
+                    break
+                cursor = page.next_cursor
+            assert [chat_id for page_ids in pages for chat_id in page_ids] == expected
+            assert [len(page_ids) for page_ids in pages] == [2, 2, 1]
+            preview = page.entries[-1].preview
+            assert preview is not None
+            assert preview.startswith("hello from s2")
+            assert len(preview) == PREVIEW_LENGTH
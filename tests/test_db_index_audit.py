@@ -0,0 +1,84 @@
+"""Test Snap SAAS Base."""
+
+import contextlib
+import io
+from unittest import TestCase
+from unittest.mock import patch
+
+import sqlalchemy as sa
+
+from snap_saas_base.db.index_audit import IndexFinding, audit_indexes, main, suggested_ddl
+
+
+class IndexAuditTest(TestCase):
+    """Test class for the index audit."""
+
+    def setUp(self) -> None:
+        """Set up the test case."""
+        print("Setting up index audit testcase")
+        self.metadata = sa.MetaData()
+        parents = sa.Table("parents", self.metadata, sa.Column("id", sa.String, primary_key=True))
+        sa.Table(
+            "children",
+            self.metadata,
+            sa.Column("id", sa.String, primary_key=True),
+            sa.Column("parent_id", sa.ForeignKey(parents.c.id)),
+            sa.Column("owner_id", sa.ForeignKey(parents.c.id)),
+            sa.Column("name", sa.String),
+            sa.Column("tags", sa.JSON),
+            sa.UniqueConstraint("parent_id", "name", name="uq_children_parent_id_name"),
+            sa.Index("ix_children_parent_id", "parent_id"),
+            sa.Index("ix_children_name_a", "name", "id"),
+            sa.Index("ix_children_name_b", "name", "id"),
+            sa.Index("ix_children_open", "parent_id", postgresql_where=sa.text("name IS NULL")),
+            sa.Index("ix_children_tags", "tags", postgresql_using="gin"),
+            sa.Index("ix_children_id", "id", unique=True),
+        )
+
+    def test_findings(self) -> None:
+        """Test that duplicate and prefix indexes and unindexed foreign keys are found."""
+        findings = {finding.name: finding for finding in audit_indexes(self.metadata)}
+        assert findings.keys() == {
+            "ix_children_parent_id",
+            "ix_children_name_a",
+            "ix_children_owner_id",
+        }
+        assert findings["ix_children_parent_id"] == IndexFinding(
+            "prefix",
+            "children",
+            "ix_children_parent_id",
+            ("parent_id",),
+            "uq_children_parent_id_name",
+        )
+        assert findings["ix_children_name_a"].kind == "duplicate"
+        assert findings["ix_children_name_a"].covered_by == "ix_children_name_b"
+        assert findings["ix_children_owner_id"] == IndexFinding(
+            "unindexed_fk", "children", "ix_children_owner_id", ("owner_id",), None
+        )
+
+    def test_suggested_ddl(self) -> None:
+        """Test that the findings turn into DROP and CREATE INDEX statements."""
+        ddl = suggested_ddl(audit_indexes(self.metadata)).splitlines()
+        assert "DROP INDEX CONCURRENTLY IF EXISTS ix_children_parent_id;" in ddl
+        assert (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_children_owner_id ON children (owner_id);"
+            in ddl
+        )
+        assert "CONCURRENTLY" not in suggested_ddl(audit_indexes(self.metadata), concurrently=False)
+
+    def test_models(self) -> None:
+        """Test that the indexes of the models are neither redundant nor missing."""
+        assert audit_indexes() == []
+
+    def test_main(self) -> None:
+        """Test that ``--check`` fails only when there are findings."""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            assert main(["--check"]) == 0
+            with patch(
+                "snap_saas_base.db.index_audit.audit_indexes",
+                return_value=audit_indexes(self.metadata),
+            ):
+                assert main(["--sql"]) == 0
+                assert main(["--check"]) == 1
+        assert "DROP INDEX CONCURRENTLY IF EXISTS ix_children_parent_id;" in output.getvalue()
@@ -0,0 +1,69 @@
+"""Test Snap SAAS Base."""
+
+from collections.abc import Sequence
+from datetime import datetime
+from unittest import TestCase
+
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+from snap_saas_base.db.inserts import InsertMode, get_insert_mode, insert_rows, set_insert_mode
+from snap_saas_base.models.base_model import AbstractModel
+from snap_saas_base.models.user import User
+from snap_saas_base.testing.queries import assert_query_count
+
+
+class InsertRowsTest(TestCase):
+    """Test class for the insert modes."""
+
+    def setUp(self) -> None:
+        """Create the users table in an in-memory database."""
+        self.engine = sa.create_engine("sqlite://")
+        AbstractModel.metadata.create_all(
+            self.engine, tables=[AbstractModel.metadata.tables[User.__tablename__]]
+        )
+        self.session = so.Session(self.engine)
+        self.rows = [
+            {"username": f"user{i}", "email": "u@domain.com", "cell_phone": "1", "full_name": "U"}
+            for i in range(3)
+        ]
+
+    def tearDown(self) -> None:
+        """Close the session."""
+        self.session.close()
+
+    def _inserted(self) -> Sequence[sa.Row[tuple[str, datetime, bool]]]:
+        return self.session.execute(
+            sa.select(User.id, User.created_at, User.is_active).order_by(User.id)
+        ).all()
+
+    def test_session_mode(self) -> None:
+        """Default to the ORM mode unless the session sets another one."""
+        assert get_insert_mode(self.session) is InsertMode.ORM
+        set_insert_mode(self.session, "client")
+        assert get_insert_mode(self.session) is InsertMode.CLIENT
+
+    def test_client_mode(self) -> None:
+        """Insert with a single statement and generate the values in Python."""
+        with assert_query_count(self.engine, 1):
+            ids = insert_rows(self.session, User, self.rows, InsertMode.CLIENT)
+        rows = self._inserted()
+        assert [row.id for row in rows] == ids
+        assert all(row.created_at is not None and row.is_active for row in rows)
+        assert not self.session.identity_map
+
+    def test_server_mode(self) -> None:
+        """Take the timestamps from the database clock."""
+        ids = insert_rows(self.session, User, self.rows, InsertMode.SERVER)
+        rows = self._inserted()
+        assert [row.id for row in rows] == ids
+        assert all(row.created_at is not None for row in rows)
+
+    def test_orm_mode(self) -> None:
+        """Insert through the unit of work."""
+        ids = insert_rows(self.session, User, self.rows)
+        assert [row.id for row in self._inserted()] == ids
+
+    def test_empty(self) -> None:
+        """Run no statement for no rows."""
+        assert insert_rows(self.session, User, [], InsertMode.CLIENT) == []
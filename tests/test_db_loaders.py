@@ -0,0 +1,134 @@
+"""Test Snap SAAS Base."""
+
+from contextlib import ExitStack
+from unittest import TestCase
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+from snap_saas_base.db.loaders import get_profile, load_profile, register_profile
+from snap_saas_base.models.base_model import AbstractModel
+from snap_saas_base.models.chat import Chat, ChatMessage
+from snap_saas_base.models.organization import Organization, OrgMember
+from snap_saas_base.models.user import User
+from snap_saas_base.testing.fixtures import add_chat, create_sqlite_engine, rollback_session
+from snap_saas_base.testing.queries import assert_profile_query_count, assert_query_count
+
+
+class LoaderProfileRegistryTest(TestCase):
+    """Test class for the loader profile registry."""
+
+    def test_builtin_profiles(self) -> None:
+        """Register the built-in profiles on import."""
+        assert get_profile(OrgMember, "member_with_user").options
+        assert get_profile(OrgMember, "member_with_org").model is OrgMember
+
+    def test_unknown_profile(self) -> None:
+        """List the available profiles when a profile is missing."""
+        with pytest.raises(KeyError, match="member_with_user"):
+            get_profile(OrgMember, "missing")
+
+    def test_duplicate_profile(self) -> None:
+        """Refuse to register a profile name twice."""
+        with pytest.raises(ValueError, match="already has a loader profile"):
+            register_profile(OrgMember, "member_with_user")
+
+
+class LoaderProfileQueryTest(TestCase):
+    """Test class for the number of queries run by the loader profiles."""
+
+    def setUp(self) -> None:
+        """Create an organization with members in an in-memory database."""
+        self.engine = sa.create_engine("sqlite://")
+        tables = [
+            AbstractModel.metadata.tables[model.__tablename__]
+            for model in (User, Organization, OrgMember)
+        ]
+        AbstractModel.metadata.create_all(self.engine, tables=tables)
+        self.session = so.Session(self.engine)
+        users = [
+            User(username=f"user{i}", email=f"u{i}@domain.com", cell_phone="1", full_name="U")
+            for i in range(3)
+        ]
+        org = Organization(name="Org", slug="org", bucket="b", created_by=users[0].id)
+        members = [OrgMember(org_id=org.id, member_id=user.id, role="member") for user in users]
+        self.session.add_all([*users, org, *members])
+        self.session.commit()
+        self.session.expunge_all()
+
+    def tearDown(self) -> None:
+        """Close the session."""
+        self.session.close()
+
+    def test_member_with_user(self) -> None:
+        """Load the members and their users in a single statement."""
+        members = assert_profile_query_count(
+            self.session, sa.select(OrgMember), "member_with_user", 1
+        )
+        with assert_query_count(self.engine, 0):
+            assert sorted(member.member.username for member in members) == [
+                "user0",
+                "user1",
+                "user2",
+            ]
+
+    def test_raise_without_profile(self) -> None:
+        """Raise on a relationship that was not loaded."""
+        member = self.session.scalars(sa.select(OrgMember)).first()
+        assert member is not None
+        with pytest.raises(sa.exc.InvalidRequestError):
+            _ = member.member
+
+    def test_member_with_org(self) -> None:
+        """Load the members with their organization."""
+        members = load_profile(self.session, sa.select(OrgMember), "member_with_org")
+        assert {member.org.slug for member in members} == {"org"}
+
+
+class LastMessagesProfileTest(TestCase):
+    """Test class for the ``chat_with_last_messages`` profile."""
+
+    def setUp(self) -> None:
+        """Create chats with 25, 3 and no messages in an in-memory database."""
+        self.engine = create_sqlite_engine()
+        self.stack = ExitStack()
+        self.session = self.stack.enter_context(rollback_session(self.engine))
+        self.messages: dict[str, list[str]] = {}
+        chats = [add_chat(self.session)]
+        chats += [
+            add_chat(self.session, workspace_id=chats[0].workspace_id, channel_session_id=f"s{i}")
+            for i in (2, 3)
+        ]
+        for chat, count in zip(chats, (25, 3, 0), strict=True):
+            messages = [
+                ChatMessage(
+                    chat_id=chat.id,
+                    role="user",
+                    content_type="text/plain",
+                    content=f"message {i}",
+                    message_metadata={},
+                )
+                for i in range(count)
+            ]
+            self.session.add_all(messages)
+            self.messages[chat.id] = [message.id for message in messages]
+        self.session.commit()
+        self.session.expunge_all()
+        # Begin the next savepoint, so only the profile statements are counted.
+        self.session.connection()
+
+    def tearDown(self) -> None:
+        """Roll back the session and dispose the engine."""
+        self.stack.close()
+        self.engine.dispose()
+
+    def test_last_messages(self) -> None:
+        """Load the newest 20 messages of every chat, oldest first, in two statements."""
+        chats = assert_profile_query_count(
+            self.session, sa.select(Chat), "chat_with_last_messages", 2
+        )
+        with assert_query_count(self.engine, 0):
+            loaded = {chat.id: [message.id for message in chat.messages] for chat in chats}
+            assert all(message.chat is chat for chat in chats for message in chat.messages)
+        assert loaded == {chat_id: ids[-20:] for chat_id, ids in self.messages.items()}
@@ -0,0 +1,94 @@
+"""Test Snap SAAS Base."""
+
+import json
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import pytest
+import sqlalchemy.orm as so
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from snap_saas_base.db.projection import (
+    aload_projection,
+    load_projection,
+    projection,
+    projection_query,
+)
+from snap_saas_base.models.chat import Chat, ChatMessageArchive
+from snap_saas_base.schemas.chat import ChatSchema
+from snap_saas_base.schemas.common import row_to_json, rows_to_json
+from snap_saas_base.testing.fixtures import (
+    add_chat,
+    create_async_sqlite_engine,
+    create_sqlite_engine,
+    rollback_session,
+)
+
+
+class ProjectionTest(TestCase):
+    """Test class for the read-only projections."""
+
+    def setUp(self) -> None:
+        """Set up the test case."""
+        print("Setting up projection testcase")
+        self.engine = create_sqlite_engine()
+
+    def tearDown(self) -> None:
+        """Dispose the engine."""
+        self.engine.dispose()
+
+    def test_load(self) -> None:
+        """Test that projections load detached rows that serialize like the models."""
+        with rollback_session(self.engine) as session:
+            chat = add_chat(session)
+            add_chat(session, workspace_id=chat.workspace_id, channel_session_id="s2")
+            expected = json.loads(row_to_json(ChatSchema, chat))
+            session.expunge_all()
+            rows = load_projection(
+                session, projection_query(Chat).where(Chat.id == chat.id).order_by(Chat.id)
+            )
+            assert len(session.identity_map) == 0
+        assert len(rows) == 1
+        assert type(rows[0]) is projection(Chat)
+        assert rows[0].id == chat.id
+        assert rows[0].subject == {"name": "John Doe"}
+        assert json.loads(row_to_json(ChatSchema, rows[0])) == expected
+        assert json.loads(rows_to_json(ChatSchema, rows)) == [expected]
+
+    def test_immutable(self) -> None:
+        """Test that projection rows are immutable and have no instance dictionary."""
+        row = projection(Chat)._make(range(len(projection(Chat)._fields)))
+        assert not hasattr(row, "__dict__")
+        with pytest.raises(AttributeError):
+            row.status = 1
+
+    def test_columns(self) -> None:
+        """Test that projections of a subset of the columns are cached and checked."""
+        assert "payload" not in projection(ChatMessageArchive)._fields
+        assert projection(Chat, ("id", "status")) is projection(Chat, ("id", "status"))
+        with rollback_session(self.engine) as session:
+            chat = add_chat(session)
+            rows = load_projection(session, projection_query(Chat, ["id", "status"]))
+        assert rows == [(chat.id, chat.status)]
+        with pytest.raises(ValueError, match="has no columns"):
+            projection(Chat, ("id", "missing"))
+
+    def test_not_a_projection(self) -> None:
+        """Test that statements not built by projection_query are rejected."""
+        with (
+            so.Session(self.engine) as session,
+            pytest.raises(ValueError, match="not built by projection_query"),
+        ):
+            load_projection(session, Chat.__table__.select())
+
+
+class AsyncProjectionTest(IsolatedAsyncioTestCase):
+    """Test class for the read-only projections on async sessions."""
+
+    async def test_load(self) -> None:
+        """Test that projections load on async sessions."""
+        engine = await create_async_sqlite_engine()
+        async with AsyncSession(engine) as session:
+            chat = await session.run_sync(add_chat)
+            rows = await aload_projection(session, projection_query(Chat, ["id"]))
+        await engine.dispose()
+        assert rows == [(chat.id,)]
@@ -0,0 +1,91 @@
+"""Test Snap SAAS Base."""
+
+from unittest import TestCase
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+from snap_saas_base.db.purge import PurgeJob, PurgeProgress, PurgeRestrictedError
+from snap_saas_base.models.base_model import AbstractModel
+from snap_saas_base.models.organization import Organization, OrgMember
+from snap_saas_base.models.user import User
+from snap_saas_base.models.workspace import Workspace
+
+
+class PurgePlanTest(TestCase):
+    """Test class for the purge plans."""
+
+    def test_workspace_children_first(self) -> None:
+        """Delete child tables before the tables they reference."""
+        job = PurgeJob.workspace("ws")
+        tables = [step.table.name for step in job.steps]
+        assert tables[0] == "chats_messages"
+        assert tables.index("chats_messages") < tables.index("chats")
+        assert tables.index("chats_messages_archive") < tables.index("chats")
+        assert tables[-1] == "workspaces"
+
+    def test_organization_restrict(self) -> None:
+        """Refuse to purge an organization with workspaces unless they are included."""
+        assert PurgeJob.organization("org").restrict is not None
+        job = PurgeJob.organization("org", include_workspaces=True)
+        assert job.restrict is None
+        tables = [step.table.name for step in job.steps]
+        assert tables.index("workspaces") < tables.index("organizations")
+
+    def test_progress_round_trip(self) -> None:
+        """Rebuild the progress from its dictionary."""
+        progress = PurgeProgress(step=2, deleted={"chats": 10}, batches=3)
+        assert PurgeProgress(**progress.as_dict).as_dict == progress.as_dict
+
+
+class PurgeRunTest(TestCase):
+    """Test class for running an organization purge."""
+
+    def setUp(self) -> None:
+        """Create the organization tables in an in-memory database."""
+        self.engine = sa.create_engine("sqlite://")
+        tables = [
+            AbstractModel.metadata.tables[model.__tablename__]
+            for model in (User, Organization, OrgMember, Workspace)
+        ]
+        AbstractModel.metadata.create_all(self.engine, tables=tables)
+        self.session = so.Session(self.engine)
+        user = User(username="john", email="john@domain.com", cell_phone="1", full_name="John")
+        self.org = Organization(name="Org", slug="org", bucket="b", created_by=user.id)
+        members = [
+            OrgMember(org_id=self.org.id, member_id=user.id, role="member") for _ in range(5)
+        ]
+        self.session.add_all([user, self.org, *members])
+        self.session.commit()
+
+    def tearDown(self) -> None:
+        """Close the session."""
+        self.session.close()
+
+    def test_run_in_batches(self) -> None:
+        """Delete the rows in batches, reporting progress after each one."""
+        seen: list[PurgeProgress] = []
+        job = PurgeJob.organization(self.org.id, batch_size=2, on_progress=seen.append)
+        progress = job.run(self.session)
+        assert progress.done
+        assert progress.deleted == {"organizations_members": 5, "organizations": 1}
+        assert (progress.batches, len(seen)) == (4, 4)
+        assert self.session.scalar(sa.select(sa.func.count()).select_from(User)) == 1
+
+    def test_resume(self) -> None:
+        """Resume a purge stopped after ``max_batches``."""
+        progress = PurgeJob.organization(self.org.id, batch_size=2, max_batches=1).run(self.session)
+        assert not progress.done
+        progress = PurgeJob.organization(self.org.id, batch_size=2, progress=progress).run(
+            self.session
+        )
+        assert progress.done
+        assert progress.deleted == {"organizations_members": 5, "organizations": 1}
+
+    def test_restrict(self) -> None:
+        """Refuse to purge an organization that still has workspaces."""
+        self.session.add(Workspace(name="Ws", slug="ws", org_id=self.org.id))
+        self.session.commit()
+        with pytest.raises(PurgeRestrictedError):
+            PurgeJob.organization(self.org.id).run(self.session)
@@ -0,0 +1,110 @@
+"""Test Snap SAAS Base."""
+
+import secrets
+from datetime import datetime, timedelta, timezone
+from unittest import TestCase
+
+import pytest
+import sqlalchemy as sa
+import uuid6
+
+from snap_saas_base.db.timerange import (
+    chats_created_between,
+    id_between,
+    messages_created_between,
+    messages_since,
+    uuid7_max,
+    uuid7_min,
+    uuid7_time,
+)
+from snap_saas_base.models.chat import ChatMessage
+from snap_saas_base.testing.fixtures import add_chat, create_sqlite_engine, rollback_session
+
+
+def uuid7_at(moment: datetime) -> str:
+    """Return a random UUIDv7 id generated at a naive UTC time."""
+    milliseconds = int(uuid7_min(moment).replace("-", "")[:12], 16)
+    return str(uuid6.UUID(int=milliseconds << 80 | secrets.randbits(76), version=7))
+
+
+class Uuid7BoundsTest(TestCase):
+    """Test class for the UUIDv7 bounds."""
+
+    def test_bounds(self) -> None:
+        """Test that the bounds enclose the ids of their millisecond only."""
+        moment = datetime.fromisoformat("2024-03-02T13:28:54.123")
+        message_id = uuid7_at(moment)
+        assert uuid7_min(moment) <= message_id <= uuid7_max(moment)
+        assert uuid7_max(moment - timedelta(milliseconds=1)) < message_id
+        assert message_id < uuid7_min(moment + timedelta(milliseconds=1))
+        assert uuid7_time(message_id) == moment
+
+    def test_aware_datetime(self) -> None:
+        """Test that aware datetimes are converted to UTC."""
+        moment = datetime(2024, 3, 2, 10, 28, 54, tzinfo=timezone(timedelta(hours=-3)))
+        assert uuid7_min(moment) == uuid7_min(datetime.fromisoformat("2024-03-02T13:28:54"))
+
+    def test_out_of_range(self) -> None:
+        """Test that times before the epoch are rejected."""
+        with pytest.raises(ValueError, match="out of the UUIDv7 time range"):
+            uuid7_min(datetime.fromisoformat("1969-12-31T00:00:00"))
+
+    def test_unbounded(self) -> None:
+        """Test that an unbounded window selects everything."""
+        assert str(id_between(ChatMessage.id, None, None)) == "true"
+
+
+class TimeRangeQueryTest(TestCase):
+    """Test class for the time-range queries."""
+
+    def setUp(self) -> None:
+        """Insert messages created an hour apart."""
+        print("Setting up time range testcase")
+        self.engine = create_sqlite_engine()
+        self.start = datetime.fromisoformat("2024-03-02T10:00:00")
+        self.ids = [uuid7_at(self.start + timedelta(hours=i)) for i in range(4)]
+        self.messages = sa.insert(ChatMessage).values(
+            [
+                {
+                    "id": message_id,
+                    "chat_id": "chat",
+                    "role": "user",
+                    "content_type": "text/plain",
+                    "content": "hello",
+                    "message_metadata": {},
+                }
+                for message_id in self.ids
+            ]
+        )
+
+    def tearDown(self) -> None:
+        """Dispose the engine."""
+        self.engine.dispose()
+
+    def query_ids(self, stmt: sa.Select) -> list[str]:
+        """Return the ids of the messages selected by a query."""
+        with rollback_session(self.engine) as session:
+            chat = add_chat(session, id="chat")
+            session.execute(self.messages)
+            return [
+                message.id
+                for message in session.scalars(stmt.where(ChatMessage.chat_id == chat.id))
+            ]
+
+    def test_window(self) -> None:
+        """Test that the window includes its start and excludes its end."""
+        stmt = messages_created_between(
+            "chat", self.start + timedelta(hours=1), self.start + timedelta(hours=3)
+        )
+        assert self.query_ids(stmt) == self.ids[1:3]
+
+    def test_since(self) -> None:
+        """Test the window ending now."""
+        stmt = messages_since("chat", timedelta(hours=1), now=self.start + timedelta(hours=3))
+        assert self.query_ids(stmt) == self.ids[2:]
+
+    def test_chats_sql(self) -> None:
+        """Test that chats are filtered and ordered on their id."""
+        sql = str(chats_created_between("ws", self.start))
+        assert "chats.id >= :id_1" in sql
+        assert "ORDER BY chats.id" in sql
@@ -0,0 +1,162 @@
+"""Test Snap SAAS Base."""
+
+from datetime import datetime, timedelta
+from typing import Any
+from unittest import TestCase
+
+import numpy as np
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+import uuid6
+from sqlalchemy.dialects import postgresql
+
+from snap_saas_base.db.timeseries import (
+    MetricSeries,
+    bucket_query,
+    load_buckets,
+    load_series,
+    percentile_query,
+)
+from snap_saas_base.models.workspace import WorkspaceMetric
+from snap_saas_base.testing.fixtures import add_chat, create_sqlite_engine, rollback_session
+
+
+class MetricSeriesTest(TestCase):
+    """Test class for the columnar metric series."""
+
+    def setUp(self) -> None:
+        """Create a series of one event per minute."""
+        start = datetime.fromisoformat("2024-03-02T00:00:00")
+        rows: list[tuple[datetime, str, float | None]] = [
+            (start + timedelta(minutes=i), "requests" if i % 2 else "tokens", float(i))
+            for i in range(10)
+        ]
+        rows.append((start + timedelta(minutes=10), "tokens", None))
+        self.series = MetricSeries.from_rows(rows, ["value"])
+
+    def test_columns(self) -> None:
+        """Test the column types."""
+        assert len(self.series) == len(range(11))
+        assert self.series["time"].dtype == np.dtype("datetime64[us]")
+        assert np.isnan(self.series["value"][-1])
+
+    def test_resample(self) -> None:
+        """Test the aggregates of fixed time buckets."""
+        times, counts = self.series.resample(timedelta(minutes=5))
+        assert list(counts) == [5, 5, 1]
+        assert times[1] == np.datetime64("2024-03-02T00:05")
+        _, sums = self.series.resample(timedelta(minutes=5), "value", "sum")
+        assert list(sums) == [10, 35, 0]
+        _, means = self.series.resample(timedelta(minutes=5), "value", "mean")
+        assert list(means[:2]) == [2, 7]
+        assert np.isnan(means[2])
+        _, maxima = self.series.resample(timedelta(minutes=5), "value", "max")
+        assert list(maxima[:2]) == [4, 9]
+
+    def test_by_type(self) -> None:
+        """Test that each type is resampled on the same buckets."""
+        series = self.series.by_type(timedelta(minutes=5), "value", "sum")
+        assert list(series["requests"][1]) == [1 + 3, 5 + 7 + 9]
+        assert series["tokens"][0][0] == series["requests"][0][0]
+
+    def test_downsample(self) -> None:
+        """Test that the events fit in the requested number of buckets."""
+        times, means = self.series.downsample(2, "value")
+        assert len(times) == len(means) == len([2.5, 7.5])
+        assert list(means) == [2.5, 7.5]
+
+    def test_percentile(self) -> None:
+        """Test that percentiles ignore NaN values."""
+        assert list(self.series.percentile("value", [50])) == [4.5]
+        assert list(self.series.where("requests").percentile("value", [0, 100])) == [1, 9]
+
+    def test_empty(self) -> None:
+        """Test an empty series."""
+        series = MetricSeries.from_rows([], ["value"])
+        times, counts = series.resample(timedelta(minutes=1))
+        assert len(times) == len(counts) == 0
+        assert np.isnan(series.percentile("value", 50))
+
+
+class MetricQueryTest(TestCase):
+    """Test class for the metric queries."""
+
+    def setUp(self) -> None:
+        """Insert metric events in an in-memory database."""
+        print("Setting up time series testcase")
+        self.engine = create_sqlite_engine()
+        self.start = datetime.fromisoformat("2024-03-02T00:00:00")
+        self.end = self.start + timedelta(hours=1)
+
+    def tearDown(self) -> None:
+        """Dispose the engine."""
+        self.engine.dispose()
+
+    def add_metrics(self, session: so.Session, values: list[Any] | None = None) -> str:
+        """Insert one event a minute, from a minute before the window, and return its workspace."""
+        workspace_id = add_chat(session).workspace_id
+        if values is None:
+            values = list(range(-1, 61))
+        session.execute(
+            sa.insert(WorkspaceMetric),
+            [
+                {
+                    "id": str(uuid6.uuid7()),
+                    "workspace_id": workspace_id,
+                    "specversion": "1.0",
+                    "type": "usage.tokens",
+                    "event_id": str(i),
+                    "time": self.start + timedelta(minutes=i - 1),
+                    "source": "/apikeys/key",
+                    "subject": "key",
+                    "data": {} if value is None else {"count": value},
+                }
+                for i, value in enumerate(values)
+            ],
+        )
+        return workspace_id
+
+    def test_load_series(self) -> None:
+        """Test that the events of the window are loaded as columns."""
+        with rollback_session(self.engine) as session:
+            workspace_id = self.add_metrics(session)
+            series = load_series(session, workspace_id, self.start, self.end, fields=["count"])
+        assert len(series) == len(range(60))
+        assert series["count"].sum() == sum(range(60))
+
+    def test_non_numeric_values(self) -> None:
+        """Test that missing and non-numeric fields are NaN and skipped by the aggregates."""
+        values = [None, 1, "2", True, {"n": 3}, 4.5, None]
+        with rollback_session(self.engine) as session:
+            workspace_id = self.add_metrics(session, values)
+            series = load_series(session, workspace_id, self.start, self.end, fields=["count"])
+            stmt = bucket_query(
+                workspace_id, self.start, self.end, timedelta(hours=1), field="count", how="sum"
+            )
+            columns = load_buckets(session, stmt)
+        assert [value for value in series["count"] if not np.isnan(value)] == [1, 4.5]
+        assert list(columns["value"]) == [1 + 4.5]
+
+    def test_buckets_in_sql(self) -> None:
+        """Test the aggregates of fixed time buckets computed in SQL."""
+        with rollback_session(self.engine) as session:
+            workspace_id = self.add_metrics(session)
+            stmt = bucket_query(
+                workspace_id,
+                self.start,
+                self.end,
+                timedelta(minutes=15),
+                field="count",
+                how="sum",
+            )
+            columns = load_buckets(session, stmt)
+        assert columns["bucket"][1] == np.datetime64("2024-03-02T00:15")
+        assert list(columns["value"]) == [sum(range(i, i + 15)) for i in range(0, 60, 15)]
+
+    def test_percentile_sql(self) -> None:
+        """Test that percentiles are computed with percentile_cont on numeric fields."""
+        stmt = percentile_query("ws", self.start, self.end, "latency", [50, 99.9])
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        assert "percentile_cont(%(percentile_cont_1)s) WITHIN GROUP (ORDER BY CASE" in sql
+        assert "jsonb_typeof(workspaces_metrics.data -> %(param_1)s) = 'number'" in sql
+        assert "p99_9" in sql
@@ -0,0 +1,131 @@
+"""Test Snap SAAS Base."""
+
+from unittest import TestCase
+from unittest.mock import patch
+
+import pytest
+import sqlalchemy as sa
+
+from snap_saas_base.db.engine import create_engine
+from snap_saas_base.json_codec import (
+    STDLIB,
+    compress,
+    decompress,
+    default_codec,
+    engine_json_options,
+    get_codec,
+)
+from snap_saas_base.models.types import CompressedJSON
+
+
+def history(turns: int) -> dict:
+    """Return a chat history document of ``turns`` messages."""
+    return {
+        "turns": [
+            {"role": "user" if i % 2 else "assistant", "content": f"message {i} é", "n": i}
+            for i in range(turns)
+        ]
+    }
+
+
+class JsonCodecTest(TestCase):
+    """Test class for the JSON codecs."""
+
+    def test_codecs(self) -> None:
+        """Test that both codecs round trip documents the same way."""
+        value = {"a": [1, 2.5, None, True], "b": "é"}
+        for name in ("orjson", "stdlib"):
+            codec = get_codec(name)
+            assert codec.name == name
+            assert codec.loads(codec.dumps(value)) == value
+            assert codec.loads(codec.dumps({1: "x"})) == {"1": "x"}
+        assert default_codec().name == "orjson"
+        with pytest.raises(ValueError, match="unknown JSON codec"):
+            get_codec("simplejson")
+
+    def test_fallback(self) -> None:
+        """Test that the standard library is the default without orjson."""
+        with patch("snap_saas_base.json_codec._orjson", return_value=None):
+            assert default_codec() is STDLIB
+
+    def test_engine(self) -> None:
+        """Test that engines use the codec for their JSON columns."""
+        assert engine_json_options("stdlib") == {
+            "json_serializer": STDLIB.dumps,
+            "json_deserializer": STDLIB.loads,
+        }
+        engine = create_engine("sqlite://", json_codec=STDLIB)
+        assert vars(engine.dialect)["_json_serializer"] is STDLIB.dumps
+        engine = create_engine("sqlite://")
+        assert vars(engine.dialect)["_json_deserializer"] is get_codec("orjson").loads
+
+    def test_compress(self) -> None:
+        """Test that data is compressed with zstd, or zlib without zstandard."""
+        data = b"x" * 10_000
+        codec, payload = compress(data)
+        assert codec == "zstd"
+        assert decompress(codec, payload) == data
+        with patch("snap_saas_base.json_codec._zstandard", return_value=None):
+            codec, payload = compress(data)
+        assert codec == "zlib"
+        assert decompress("zlib", payload) == data
+        with pytest.raises(ValueError, match="unknown compression codec"):
+            decompress("lz4", payload)
+
+
+class CompressedJSONTest(TestCase):
+    """Test class for the compressed JSON column type."""
+
+    def setUp(self) -> None:
+        """Create a table with a compressed JSON column."""
+        print("Setting up compressed JSON testcase")
+        metadata = sa.MetaData()
+        self.table = sa.Table(
+            "documents",
+            metadata,
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("body", CompressedJSON(threshold=1024)),
+        )
+        self.engine = create_engine("sqlite://")
+        metadata.create_all(self.engine)
+
+    def tearDown(self) -> None:
+        """Dispose the engine."""
+        self.engine.dispose()
+
+    def stored(self, connection: sa.Connection, document_id: int) -> bytes:
+        """Return the stored bytes of a document."""
+        return connection.scalar(
+            sa.text("SELECT body FROM documents WHERE id = :id"), {"id": document_id}
+        )
+
+    def test_roundtrip(self) -> None:
+        """Test that small documents are stored as is and large ones compressed."""
+        small, large = history(2), history(1000)
+        with self.engine.begin() as connection:
+            connection.execute(
+                self.table.insert(),
+                [{"id": 1, "body": small}, {"id": 2, "body": large}, {"id": 3, "body": None}],
+            )
+            assert self.stored(connection, 1)[:1] == b"\x00"
+            assert self.stored(connection, 2)[:1] == b"\x02"
+            assert len(self.stored(connection, 2)) < len(default_codec().dumps(large)) / 5
+            rows = dict(
+                connection.execute(sa.select(self.table.c.id, self.table.c.body)).tuples().all()
+            )
+        assert rows == {1: small, 2: large, 3: None}
+
+    def test_zlib(self) -> None:
+        """Test that zlib compressed documents are read back."""
+        with self.engine.begin() as connection:
+            with patch("snap_saas_base.json_codec._zstandard", return_value=None):
+                connection.execute(self.table.insert(), {"id": 1, "body": history(1000)})
+            assert self.stored(connection, 1)[:1] == b"\x01"
+            assert connection.scalar(sa.select(self.table.c.body)) == history(1000)
+
+    def test_unknown_header(self) -> None:
+        """Test that values with an unknown header are rejected."""
+        with self.engine.begin() as connection:
+            connection.execute(sa.text("INSERT INTO documents VALUES (1, x'07')"))
+            with pytest.raises(ValueError, match="unknown CompressedJSON header"):
+                connection.scalar(sa.select(self.table.c.body))
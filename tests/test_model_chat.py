@@ -2,7 +2,7 @@
 
 from unittest import TestCase
 
-from snap_saas_base.models.chat import Chat, ChatMessage
+from snap_saas_base.models.chat import Chat, ChatMessage, ChatMessageArchive
 
 
 class ChatModelTest(TestCase):
@@ -31,3 +31,19 @@ class ChatMessageModelTest(TestCase):
         print("Test model object creation")
         assert isinstance(self.model_data.as_dict, dict)
         assert self.model_data.id is not None
+
+
+class ChatMessageArchiveModelTest(TestCase):
+    """Test class for ChatMessageArchive model."""
+
+    def setUp(self) -> None:
+        """Create instance of class to test."""
+        print("Setting up model testcase")
+        self.model_data = ChatMessageArchive(payload=b"")
+
+    def test_creation(self) -> None:
+        """Test that the manifest of a segment leaves the payload out."""
+        print("Test model object creation")
+        assert isinstance(self.model_data.as_dict, dict)
+        assert "payload" not in self.model_data.as_dict
+        assert self.model_data.id is not None
@@ -0,0 +1,76 @@
+"""Test Snap SAAS Base."""
+
+from unittest import TestCase
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.schema import CreateIndex
+
+from snap_saas_base.models.jsonb import (
+    enable_jsonb_indexes,
+    jsonb_contains,
+    jsonb_gin_index,
+    jsonb_key_equals,
+    jsonb_path_contains,
+)
+
+
+def _sql(clause) -> str:
+    return str(clause.compile(dialect=postgresql.dialect()))
+
+
+class JsonbIndexTest(TestCase):
+    """Test class for the opt-in JSONB indexes."""
+
+    def setUp(self) -> None:
+        """Create a standalone table so the model metadata is left untouched."""
+        self.table = sa.Table(
+            "docs",
+            sa.MetaData(),
+            sa.Column("id", sa.String, primary_key=True),
+            sa.Column("doc", JSONB),
+        )
+
+    def test_gin_index(self) -> None:
+        """Declare a ``jsonb_path_ops`` GIN index on the column's table."""
+        index = jsonb_gin_index(self.table.c.doc)
+        assert index in self.table.indexes
+        assert _sql(CreateIndex(index)) == (
+            "CREATE INDEX ix_docs_doc_gin ON docs USING gin (doc jsonb_path_ops)"
+        )
+
+    def test_enable_is_idempotent(self) -> None:
+        """Declare each index once when enabled twice."""
+        first = enable_jsonb_indexes([self.table.c.doc], {self.table.c.doc: ["customer"]})
+        second = enable_jsonb_indexes([self.table.c.doc], {self.table.c.doc: ["customer"]})
+        assert first == second
+        assert len(self.table.indexes) == len(first)
+        assert "((doc ->> 'customer'))" in _sql(CreateIndex(first[1]))
+
+
+class JsonbPredicateTest(TestCase):
+    """Test class for the JSONB containment predicates."""
+
+    def setUp(self) -> None:
+        """Create a standalone JSONB column."""
+        self.column = sa.Table("docs", sa.MetaData(), sa.Column("doc", JSONB)).c.doc
+
+    def test_contains(self) -> None:
+        """Compile a containment predicate with the document as parameter."""
+        compiled = jsonb_contains(self.column, {"tier": "gold"}).compile(
+            dialect=postgresql.dialect()
+        )
+        assert "@>" in str(compiled)
+        assert list(compiled.params.values()) == [{"tier": "gold"}]
+
+    def test_path_contains(self) -> None:
+        """Nest a dotted path into the containment document."""
+        compiled = jsonb_path_contains(self.column, "customer.tier", "gold").compile(
+            dialect=postgresql.dialect()
+        )
+        assert list(compiled.params.values()) == [{"customer": {"tier": "gold"}}]
+
+    def test_key_equals(self) -> None:
+        """Compile a key equality predicate."""
+        assert "->>" in _sql(jsonb_key_equals(self.column, "customer", "42"))
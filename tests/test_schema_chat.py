@@ -0,0 +1,74 @@
+"""Test Snap SAAS Base."""
+
+import json
+from datetime import datetime
+from unittest import TestCase
+
+from snap_saas_base.models.chat import Chat, ChatMessage
+from snap_saas_base.schemas.chat import ChatMessageSchema, ChatSchema
+from snap_saas_base.schemas.common import list_adapter, row_to_json, rows_to_json
+
+
+class ChatSchemaTest(TestCase):
+    """Test class for Chat schema."""
+
+    def setUp(self) -> None:
+        """Create instance of model to serialize."""
+        print("Setting up schema testcase")
+        self.state = {"step": "greeting", "turns": [1, 2, 3]}
+        self.chat = Chat(
+            workspace_id="ws",
+            channel="whatsapp",
+            channel_plugin="twilio",
+            channel_id="c1",
+            channel_session_id="s1",
+            channel_contact_uid="+5527999884321",
+            subject={"name": "John Doe"},
+            agi_id="agi",
+            status=1,
+            state=self.state,
+            contact_id="contact",
+            handsoff_data={},
+            slots={},
+            session_metadata={},
+            history={},
+            version_id=1,
+            created_at=datetime.fromisoformat("2024-03-02T13:28:54"),
+            updated_at=datetime.fromisoformat("2024-03-02T13:28:54"),
+        )
+
+    def test_creation(self) -> None:
+        """Validate a schema from a model instance."""
+        print("Test schema object creation")
+        new_obj = ChatSchema.model_validate(self.chat)
+        assert new_obj.id == self.chat.id
+        assert new_obj.state is self.state
+
+    def test_json(self) -> None:
+        """Serialize a row with the JSONB fields passed through."""
+        document = json.loads(row_to_json(ChatSchema, self.chat))
+        assert document["state"] == self.state
+        assert document["created_at"] == "2024-03-02T13:28:54"
+
+
+class ChatMessageSchemaTest(TestCase):
+    """Test class for ChatMessage schema."""
+
+    def test_list_json(self) -> None:
+        """Serialize a list of rows to a JSON array."""
+        print("Test schema list serialization")
+        messages = [
+            ChatMessage(
+                chat_id="chat",
+                role="user",
+                content_type="text/plain",
+                content=f"message {i}",
+                message_metadata={"i": i},
+                created_at=None,
+                updated_at=None,
+            )
+            for i in range(3)
+        ]
+        document = json.loads(rows_to_json(ChatMessageSchema, messages))
+        assert [message["message_metadata"]["i"] for message in document] == [0, 1, 2]
+        assert list_adapter(ChatMessageSchema) is list_adapter(ChatMessageSchema)
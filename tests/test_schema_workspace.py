@@ -0,0 +1,72 @@
+"""Test Snap SAAS Base."""
+
+import json
+from datetime import datetime
+from unittest import TestCase
+
+from snap_saas_base.models.workspace import Workspace, WorkspaceMetric
+from snap_saas_base.schemas.workspace import (
+    WorkspaceMetricSchema,
+    WorkspaceSchema,
+    metric_to_cloudevent,
+    metrics_to_cloudevents,
+)
+
+
+class WorkspaceSchemaTest(TestCase):
+    """Test class for Workspace schema."""
+
+    def test_creation(self) -> None:
+        """Validate a schema from a model instance."""
+        print("Test schema object creation")
+        workspace = Workspace(
+            name="Support", slug="support", org_id="org", created_at=None, updated_at=None
+        )
+        new_obj = WorkspaceSchema.model_validate(workspace)
+        assert new_obj.id == workspace.id
+        assert new_obj.bucket is None
+
+
+class WorkspaceMetricSchemaTest(TestCase):
+    """Test class for WorkspaceMetric schemas."""
+
+    def setUp(self) -> None:
+        """Create instance of model to serialize."""
+        print("Setting up schema testcase")
+        self.metric = WorkspaceMetric(
+            workspace_id="ws",
+            specversion="1.0",
+            type="chat.message.created",
+            event_id="event-1",
+            time=datetime.fromisoformat("2024-03-02T13:28:54"),
+            source="/chats",
+            subject="chat-1",
+            data={"count": 1},
+            created_at=None,
+            updated_at=None,
+        )
+
+    def test_creation(self) -> None:
+        """Validate a schema from a model instance."""
+        new_obj = WorkspaceMetricSchema.model_validate(self.metric)
+        assert new_obj.event_id == "event-1"
+
+    def test_cloudevent(self) -> None:
+        """Serialize a metric as a structured mode CloudEvent."""
+        event = json.loads(metric_to_cloudevent(self.metric))
+        assert event == {
+            "specversion": "1.0",
+            "id": "event-1",
+            "source": "/chats",
+            "type": "chat.message.created",
+            "subject": "chat-1",
+            "time": "2024-03-02T13:28:54Z",
+            "datacontenttype": "application/json",
+            "workspaceid": "ws",
+            "data": {"count": 1},
+        }
+
+    def test_cloudevents_batch(self) -> None:
+        """Serialize metrics as a batched mode CloudEvents array."""
+        events = json.loads(metrics_to_cloudevents([self.metric, self.metric]))
+        assert [event["id"] for event in events] == ["event-1", "event-1"]
@@ -0,0 +1,126 @@
+"""Test Snap SAAS Base."""
+
+import asyncio
+import threading
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import pytest
+
+from snap_saas_base.models.user import User
+from snap_saas_base.services.credentials import (
+    BcryptHasher,
+    CredentialService,
+    CredentialsOverloadedError,
+    Pbkdf2Hasher,
+)
+
+MAX_PENDING = 2
+
+
+class BlockingHasher(Pbkdf2Hasher):
+    """A cheap hasher whose hashes wait until they are released."""
+
+    def __init__(self) -> None:
+        super().__init__(iterations=1)
+        self.release = threading.Event()
+
+    def hash(self, password: str) -> str:
+        """Wait for the release, then hash the password."""
+        self.release.wait(5)
+        return super().hash(password)
+
+
+class HasherTest(TestCase):
+    """Test class for the password hashers."""
+
+    def test_bcrypt(self) -> None:
+        """Test that bcrypt hashes verify and record their cost."""
+        hasher = BcryptHasher(rounds=4)
+        hashed = hasher.hash("secret")
+        assert hashed.startswith("$2b$04$")
+        assert hasher.identify(hashed)
+        assert hasher.verify("secret", hashed)
+        assert not hasher.verify("wrong", hashed)
+        assert not hasher.verify("secret", "$2b$04$malformed")
+        assert not hasher.needs_rehash(hashed)
+        assert BcryptHasher(rounds=5).needs_rehash(hashed)
+        long_password = "x" * 100
+        assert hasher.verify(long_password, hasher.hash(long_password))
+
+    def test_pbkdf2(self) -> None:
+        """Test that PBKDF2 hashes verify and record their iterations."""
+        hasher = Pbkdf2Hasher(iterations=1000)
+        hashed = hasher.hash("secret")
+        assert hashed.startswith("$pbkdf2-sha256$1000$")
+        assert hasher.identify(hashed)
+        assert hasher.verify("secret", hashed)
+        assert not hasher.verify("wrong", hashed)
+        assert not hasher.verify("secret", "$pbkdf2-sha256$1000$bad")
+        assert Pbkdf2Hasher(iterations=2000).needs_rehash(hashed)
+        assert not BcryptHasher().identify(hashed)
+
+
+class CredentialServiceTest(IsolatedAsyncioTestCase):
+    """Test class for the credential service."""
+
+    async def asyncSetUp(self) -> None:
+        """Create a service with cheap hashes."""
+        print("Setting up credential service testcase")
+        self.service = CredentialService(
+            BcryptHasher(rounds=5), legacy=[BcryptHasher(rounds=4), Pbkdf2Hasher(1000)]
+        )
+
+    async def asyncTearDown(self) -> None:
+        """Shut down the service."""
+        self.service.close()
+
+    async def test_verify(self) -> None:
+        """Test that only the right password verifies against a current hash."""
+        hashed = await self.service.hash_password("secret")
+        assert await self.service.verify_password("secret", hashed) == (True, None)
+        assert await self.service.verify_password("wrong", hashed) == (False, None)
+        assert await self.service.verify_password("secret", None) == (False, None)
+        assert await self.service.verify_password("secret", "plain") == (False, None)
+        assert self.service.rehashed == 0
+
+    async def test_rehash(self) -> None:
+        """Test that hashes with another cost or algorithm are replaced on success."""
+        legacy = (BcryptHasher(rounds=4), Pbkdf2Hasher(1000))
+        for old in legacy:
+            result = await self.service.verify_password("secret", old.hash("secret"))
+            assert result.valid
+            assert result.new_hash is not None
+            assert result.new_hash.startswith("$2b$05$")
+            assert await self.service.verify_password("secret", result.new_hash) == (True, None)
+        assert self.service.rehashed == len(legacy)
+
+    async def test_authenticate(self) -> None:
+        """Test that a successful login upgrades the stored hash of the user."""
+        user = User(username="john", email="john@domain.com", cell_phone="1", full_name="John")
+        user.password = Pbkdf2Hasher(1000).hash("secret")
+        assert not await self.service.authenticate(user, "wrong")
+        assert user.password.startswith("$pbkdf2-sha256$")
+        assert await self.service.authenticate(user, "secret")
+        assert user.password.startswith("$2b$05$")
+        assert not await self.service.authenticate(None, "secret")
+
+    async def test_shed_load(self) -> None:
+        """Test that hashes past the in-flight limit are rejected right away."""
+        hasher = BlockingHasher()
+        service = CredentialService(hasher, max_workers=1, max_pending=MAX_PENDING)
+        try:
+            tasks = [
+                asyncio.create_task(service.hash_password("secret")) for _ in range(MAX_PENDING)
+            ]
+            await asyncio.sleep(0)
+            with pytest.raises(CredentialsOverloadedError, match="password hashes") as context:
+                await service.hash_password("secret")
+            assert context.value.limit == MAX_PENDING
+            assert service.shed == 1
+            hasher.release.set()
+            for hashed in await asyncio.gather(*tasks):
+                assert hasher.verify("secret", hashed)
+            assert hasher.identify(await service.hash_password("secret"))
+        finally:
+            hasher.release.set()
+            service.close()
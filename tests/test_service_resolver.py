@@ -0,0 +1,203 @@
+"""Test Snap SAAS Base."""
+
+import asyncio
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from snap_saas_base.models.workspace import Workspace
+from snap_saas_base.services.resolver import (
+    InMemorySharedCache,
+    LocalCache,
+    ResolvedWorkspace,
+    WorkspaceResolver,
+)
+from snap_saas_base.testing.fixtures import add_chat, create_async_sqlite_engine
+
+
+class Clock:
+    """A clock returning a settable time."""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+class GatedSharedCache(InMemorySharedCache):
+    """A shared cache whose reads wait for a gate to open."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.gate = asyncio.Event()
+
+    async def get(self, key: str) -> bytes | None:
+        """Return the value of a key once the gate is open."""
+        await self.gate.wait()
+        return await super().get(key)
+
+
+class LocalCacheTest(TestCase):
+    """Test class for the local LRU cache."""
+
+    def setUp(self) -> None:
+        """Create a small cache with a controlled clock."""
+        self.clock = Clock(0.0)
+        self.cache = LocalCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def test_lru(self) -> None:
+        """Test that the least recently used entry is evicted."""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        assert self.cache.get("a") == 1
+        self.cache.set("c", 3)
+        assert self.cache.get("b") is None
+        assert len(self.cache) == self.cache.maxsize
+
+    def test_ttl(self) -> None:
+        """Test that entries expire."""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2, ttl=20)
+        self.clock.now = 10
+        assert self.cache.get("a", "missing") == "missing"
+        assert [self.cache.get("b")] == [2]
+
+    def test_pop_matching(self) -> None:
+        """Test that the entries matching a predicate are removed."""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        assert self.cache.pop_matching(lambda value: value > 1) == [2]
+        assert (self.cache.get("a"), self.cache.get("b")) == (1, None)
+
+
+class WorkspaceResolverTest(IsolatedAsyncioTestCase):
+    """Test class for the workspace resolver."""
+
+    async def asyncSetUp(self) -> None:
+        """Create a workspace in an in-memory database."""
+        print("Setting up resolver testcase")
+        self.engine = await create_async_sqlite_engine()
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+        async with self.session_factory() as session:
+            chat = await session.run_sync(add_chat)
+            self.workspace_id = chat.workspace_id
+            await session.commit()
+        self.resolver = WorkspaceResolver(self.session_factory)
+
+    async def asyncTearDown(self) -> None:
+        """Remove the session hooks and dispose the engine."""
+        self.resolver.unwatch()
+        await self.engine.dispose()
+
+    async def test_resolve(self) -> None:
+        """Test that a resolved workspace is cached."""
+        resolved = await self.resolver.resolve("org", "support")
+        assert isinstance(resolved, ResolvedWorkspace)
+        assert resolved.workspace_id == self.workspace_id
+        assert resolved.bucket == "b"
+        assert await self.resolver.resolve("org", "support") == resolved
+        assert (self.resolver.loads, self.resolver.hits) == (1, 1)
+
+    async def test_single_flight(self) -> None:
+        """Test that concurrent misses share a single query."""
+        results = await asyncio.gather(
+            *(self.resolver.resolve("org", "support") for _ in range(10))
+        )
+        assert len(set(results)) == 1
+        assert self.resolver.loads == 1
+
+    async def test_cancelled_leader(self) -> None:
+        """Test that cancelling the first caller doesn't fail the callers waiting for it."""
+        shared = GatedSharedCache()
+        resolver = WorkspaceResolver(self.session_factory, shared=shared)
+        leader = asyncio.create_task(resolver.resolve("org", "support"))
+        follower = asyncio.create_task(resolver.resolve("org", "support"))
+        await asyncio.sleep(0)
+        leader.cancel()
+        shared.gate.set()
+        resolved = await follower
+        assert resolved is not None
+        assert resolved.workspace_id == self.workspace_id
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert resolver.loads == 1
+
+    async def test_negative_cache(self) -> None:
+        """Test that unknown slugs are cached, within the local cache size."""
+        assert await self.resolver.resolve("org", "sales") is None
+        assert await self.resolver.resolve("org", "sales") is None
+        assert self.resolver.loads == 1
+        resolver = WorkspaceResolver(self.session_factory, maxsize=2)
+        for slug in ("a", "b", "c"):
+            assert await resolver.resolve("org", slug) is None
+        assert len(resolver.local) == resolver.local.maxsize
+
+    async def test_shared_cache(self) -> None:
+        """Test that invalidating ids drops the shared entries written by other processes."""
+        shared = InMemorySharedCache()
+        first = WorkspaceResolver(self.session_factory, shared=shared)
+        second = WorkspaceResolver(self.session_factory, shared=shared)
+        resolved = await first.resolve("org", "support")
+        assert resolved is not None
+        assert await second.resolve("org", "support") == resolved
+        assert (second.loads, second.shared_hits) == (0, 1)
+        for invalidation in (
+            {"org_ids": [resolved.org_id]},
+            {"workspace_ids": [self.workspace_id]},
+        ):
+            await first.resolve("org", "support")
+            # A third process, which never cached the entry, invalidates it.
+            await WorkspaceResolver(self.session_factory, shared=shared).invalidate(**invalidation)
+            other = WorkspaceResolver(self.session_factory, shared=shared)
+            assert await other.resolve("org", "support") == resolved
+            assert (other.loads, other.shared_hits) == (1, 0)
+
+    async def test_invalidation_on_commit(self) -> None:
+        """Test that a commit changing a slug invalidates the local and shared entries."""
+        shared = InMemorySharedCache()
+        self.resolver = WorkspaceResolver(self.session_factory, shared=shared)
+        self.resolver.watch()
+        assert await self.resolver.resolve("org", "sales") is None
+        assert await self.resolver.resolve("org", "support") is not None
+        async with self.session_factory() as session:
+            workspace = await session.get_one(Workspace, self.workspace_id)
+            workspace.slug = "sales"
+            await session.commit()
+        await asyncio.sleep(0)
+        other = WorkspaceResolver(self.session_factory, shared=shared)
+        assert await other.resolve("org", "support") is None
+        assert other.loads == 1
+        assert await self.resolver.resolve("org", "support") is None
+        resolved = await self.resolver.resolve("org", "sales")
+        assert resolved is not None
+        assert resolved.workspace_slug == "sales"
+        assert self.resolver.loads == len(["sales", "support", "support", "sales"])
+
+    async def test_savepoint_rollback(self) -> None:
+        """Test that a rolled back savepoint keeps the changes flushed before it."""
+        self.resolver.watch()
+        await self.resolver.resolve("org", "support")
+        async with self.session_factory() as session:
+            workspace = await session.get_one(Workspace, self.workspace_id)
+            workspace.slug = "sales"
+            await session.flush()
+            savepoint = await session.begin_nested()
+            await savepoint.rollback()
+            await session.commit()
+        assert await self.resolver.resolve("org", "support") is None
+        assert self.resolver.loads == len(["support", "support"])
+
+    async def test_rollback_keeps_cache(self) -> None:
+        """Test that a rolled back change keeps the cached entries."""
+        self.resolver.watch()
+        await self.resolver.resolve("org", "support")
+        async with self.session_factory() as session:
+            workspace = await session.get_one(Workspace, self.workspace_id)
+            workspace.slug = "sales"
+            await session.flush()
+            await session.rollback()
+        assert await self.resolver.resolve("org", "support") is not None
+        assert self.resolver.hits == 1
@@ -0,0 +1,152 @@
+"""Test Snap SAAS Base."""
+
+import threading
+from contextlib import ExitStack
+from unittest import TestCase
+from unittest.mock import patch
+
+import pytest
+import sqlalchemy as sa
+
+from snap_saas_base.models.workspace import WorkspaceMetric
+from snap_saas_base.services.usage import UsageCounters, UsageDelta
+from snap_saas_base.testing.fixtures import add_chat, create_sqlite_engine, rollback_session
+
+
+class Clock:
+    """A clock returning a settable time."""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        """Return the current time."""
+        return self.now
+
+
+class UsageCountersTest(TestCase):
+    """Test class for the usage counters."""
+
+    def setUp(self) -> None:
+        """Create counters with a controlled clock."""
+        self.clock = Clock(1_000_020.0)
+        self.counters = UsageCounters(window=60, shards=4, instance_id="test", clock=self.clock)
+
+    def test_total(self) -> None:
+        """Test that the usage of a key is summed over its counts."""
+        self.counters.add("ws", "key", "requests")
+        self.counters.add("ws", "key", "requests", 2)
+        self.counters.add("ws", "other", "requests")
+        assert self.counters.total("ws", "key", "requests") == 3  # noqa: PLR2004
+
+    def test_allow(self) -> None:
+        """Test the fixed window limit."""
+        assert self.counters.allow("ws", "key", "requests", limit=2)
+        assert self.counters.allow("ws", "key", "requests", limit=2)
+        assert not self.counters.allow("ws", "key", "requests", limit=2)
+        self.clock.now += 60
+        assert self.counters.allow("ws", "key", "requests", limit=2)
+
+    def test_drain_closed_windows(self) -> None:
+        """Test that only the closed windows are drained by default."""
+        self.counters.add("ws", "key", "requests", 5)
+        assert self.counters.drain() == []
+        self.clock.now += 60
+        self.counters.add("ws", "key", "requests")
+        assert self.counters.drain() == [UsageDelta("ws", "key", "requests", 1_000_020, 5)]
+        assert self.counters.total("ws", "key", "requests") == 1
+        assert [delta.amount for delta in self.counters.drain(include_open=True)] == [1]
+
+    def test_events(self) -> None:
+        """Test that event ids only depend on the instance, the generation and the key."""
+        delta = UsageDelta("ws", "key", "tokens", 1_000_020, 42)
+        first = self.counters.events([delta])[0]
+        assert first["type"] == "usage.tokens"
+        assert first["source"] == "/apikeys/key"
+        assert first["data"]["count"] == delta.amount
+        counters = UsageCounters(instance_id="test")
+        assert counters.events([delta])[0]["event_id"] == first["event_id"]
+        assert UsageCounters().events([delta])[0]["event_id"] != first["event_id"]
+
+    def test_threads_spread_across_shards(self) -> None:
+        """Test that concurrent threads count in different shards."""
+        barrier = threading.Barrier(8)
+
+        def count(key: str) -> None:
+            barrier.wait()
+            self.counters.add("ws", key, "requests")
+
+        threads = [threading.Thread(target=count, args=(f"key{i}",)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert [len(counts) for counts, _ in self.counters._shards] == [2, 2, 2, 2]
+
+
+class UsageFlushTest(TestCase):
+    """Test class for the usage flushes on SQLite."""
+
+    def setUp(self) -> None:
+        """Create a session with a workspace."""
+        stack = ExitStack()
+        self.addCleanup(stack.close)
+        engine = create_sqlite_engine()
+        stack.callback(engine.dispose)
+        self.session = stack.enter_context(rollback_session(engine))
+        self.workspace_id = add_chat(self.session).workspace_id
+        self.session.commit()
+        self.clock = Clock(1_000_020.0)
+        self.counters = UsageCounters(window=60, instance_id="test", clock=self.clock)
+
+    def metrics(self) -> list[tuple[str, int]]:
+        """Return the flushed event ids and counts."""
+        rows = self.session.execute(
+            sa.select(WorkspaceMetric.event_id, WorkspaceMetric.data).order_by(WorkspaceMetric.time)
+        )
+        return [(event_id, data["count"]) for event_id, data in rows]
+
+    def test_flush(self) -> None:
+        """Test that the closed windows are written once."""
+        self.counters.add(self.workspace_id, "key", "requests", 3)
+        assert self.counters.flush(self.session) == 0
+        self.clock.now += 60
+        assert self.counters.flush(self.session) == 1
+        assert self.counters.flush(self.session) == 0
+        assert [count for _, count in self.metrics()] == [3]
+
+    def test_failed_flush_is_retried_with_the_same_events(self) -> None:
+        """Test that replaying a committed batch writes a single row per event."""
+        self.counters.add(self.workspace_id, "key", "requests", 3)
+        self.counters.add(self.workspace_id, "key", "tokens", 40)
+        commit = self.session.commit
+
+        def lost_commit() -> None:
+            # The batch is committed, but the acknowledgement is lost.
+            commit()
+            raise sa.exc.OperationalError("COMMIT", {}, Exception("connection reset"))
+
+        with (
+            patch.object(self.session, "commit", side_effect=lost_commit),
+            pytest.raises(sa.exc.OperationalError),
+        ):
+            self.counters.flush(self.session, include_open=True)
+        first = self.metrics()
+        self.clock.now += 60
+        self.counters.add(self.workspace_id, "key", "requests", 1)
+        assert self.counters.flush(self.session, include_open=True) == len(first) + 1
+        metrics = self.metrics()
+        assert metrics[: len(first)] == first
+        assert sorted(count for _, count in metrics) == [1, 3, 40]
+        assert len({event_id for event_id, _ in metrics}) == len(metrics)
+
+    def test_unsupported_dialect(self) -> None:
+        """Test that flushing to a database without ON CONFLICT raises and keeps the events."""
+        self.counters.add(self.workspace_id, "key", "requests", 3)
+        with (
+            patch.object(self.session.get_bind().dialect, "name", "mssql"),
+            pytest.raises(ValueError, match="not supported on mssql"),
+        ):
+            self.counters.flush(self.session, include_open=True)
+        assert self.counters.flush(self.session, include_open=True) == 1
+        assert [count for _, count in self.metrics()] == [3]
@@ -0,0 +1,94 @@
+"""Test Snap SAAS Base."""
+
+from typing import ClassVar
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.orm as so
+
+from snap_saas_base.models.chat import Chat, ChatMessage
+from snap_saas_base.testing.fixtures import (
+    add_chat,
+    create_async_sqlite_engine,
+    create_sqlite_engine,
+    rollback_session,
+)
+
+
+class SqliteFixturesTest(TestCase):
+    """Test class for the embedded SQLite database."""
+
+    engine: ClassVar[sa.Engine]
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Create the schema in an in-memory database."""
+        cls.engine = create_sqlite_engine()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Dispose the engine."""
+        cls.engine.dispose()
+
+    def test_json_round_trip(self) -> None:
+        """Test that JSON columns round trip on SQLite."""
+        with rollback_session(self.engine) as session:
+            chat = add_chat(session, session_metadata={"tags": ["vip"]})
+            session.commit()
+            session.expire_all()
+            assert session.get_one(Chat, chat.id).session_metadata == {"tags": ["vip"]}
+
+    def test_rollback(self) -> None:
+        """Test that committed changes are rolled back on exit."""
+        with rollback_session(self.engine) as session:
+            add_chat(session)
+            session.commit()
+        with rollback_session(self.engine) as session:
+            assert session.scalar(sa.select(sa.func.count()).select_from(Chat)) == 0
+
+    def test_foreign_keys(self) -> None:
+        """Test that foreign keys are enforced."""
+        with rollback_session(self.engine) as session:
+            message = ChatMessage(
+                chat_id="missing",
+                role="user",
+                content_type="text/plain",
+                content="hello",
+                message_metadata={},
+            )
+            session.add(message)
+            with pytest.raises(sa.exc.IntegrityError):
+                session.commit()
+
+
+class SqliteSessionFixtureTest(TestCase):
+    """Test class for the pytest fixtures of the embedded SQLite database."""
+
+    @pytest.fixture(autouse=True)
+    def _sqlite_session(self, sqlite_session: so.Session) -> None:
+        self.session = sqlite_session
+
+    def test_commit(self) -> None:
+        """Test that the session commits and is rolled back after the test."""
+        add_chat(self.session)
+        self.session.commit()
+        assert self.session.scalar(sa.select(sa.func.count()).select_from(Chat)) == 1
+
+    def test_commit_again(self) -> None:
+        """Test that the chat of the other test, with the same unique key, is gone."""
+        add_chat(self.session)
+        self.session.commit()
+        assert self.session.scalar(sa.select(sa.func.count()).select_from(Chat)) == 1
+
+
+class AsyncSqliteFixturesTest(IsolatedAsyncioTestCase):
+    """Test class for the embedded SQLite async database."""
+
+    async def test_schema(self) -> None:
+        """Test that the async engine has the schema."""
+        engine = await create_async_sqlite_engine()
+        async with engine.connect() as connection:
+            tables = await connection.run_sync(lambda conn: sa.inspect(conn).get_table_names())
+        await engine.dispose()
+        assert "chats_messages" in tables